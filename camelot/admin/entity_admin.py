@@ -23,12 +23,15 @@
 #  ============================================================================
 
 import logging
+import threading
 logger = logging.getLogger('camelot.admin.entity_admin')
 
 import sqlalchemy.sql.expression
 
-from camelot.admin.object_admin import ObjectAdmin
+from camelot.admin.object_admin import ObjectAdmin, DYNAMIC_FIELD_ATTRIBUTES
 from camelot.view.model_thread import post, model_function, gui_function
+from camelot.view.completions import get_completion_cache
+from camelot.view.proxy.row_count import get_row_count_cache
 from camelot.core.utils import ugettext_lazy, ugettext
 from camelot.admin.validator.entity_validator import EntityValidator
 
@@ -75,11 +78,44 @@ list_filter attribute apply
 Defaults to True, meaning that by default all searchable fields should be
 searched.  If this is set to False, one should explicitely set the list_search
 attribute to enable search.
+
+.. attribute:: full_text_search
+
+Defaults to False.  If this is set to True, the text columns of the entity
+are searched through a full text index instead of with like clauses, which
+need to scan the whole table.  Depending on the database, a full text index
+is created in the database or kept in memory, see
+:mod:`camelot.view.search_backend`.  A full text index matches the beginning
+of the words in a column, instead of any part of the column.
+
+**Performance**
+
+.. attribute:: list_projection
+
+Defaults to False.  If this is set to True, the table view selects only the
+primary key and the columns in list_display from the database, instead of
+complete objects.  The complete object is only loaded when a row is edited or
+a form is opened.  This is useful for entities with large columns that are
+not displayed in the table view.  The columns are only selected this way
+when all fields in list_display are columns of the entity and none of them
+has dynamic field attributes, otherwise complete objects are selected.
+
+.. attribute:: preload_completions
+
+Defaults to False.  If this is set to True, all objects are loaded in memory
+the first time the user types in a many2one field for this entity, and the
+completions are searched in memory instead of in the database.  This is
+useful for small lookup tables, such as countries or currencies.  The
+text is matched against the text fields that are searched in the database,
+see list_search and search_all_fields.
  
     """
 
     list_search = []
     search_all_fields = True
+    full_text_search = False
+    list_projection = False
+    preload_completions = False
     validator = EntityValidator
 
     def __init__(self, app_admin, entity):
@@ -94,6 +130,24 @@ attribute to enable search.
             logger.error(u'%s is not a mapped class, configured mappers include %s'%(self.entity, u','.join(mapped_entities)),
                          exc_info=exception)
             raise exception
+        self._search_backend = None
+        self._search_backend_lock = threading.Lock()
+
+    @model_function
+    def get_search_backend(self):
+        """:return: the SearchBackend used to search through the objects of
+        this entity.  Overwrite this method to use a specific backend.
+        """
+        if self._search_backend == None:
+            # multiple model threads might use the admin at the same time
+            self._search_backend_lock.acquire()
+            try:
+                if self._search_backend == None:
+                    from camelot.view.search_backend import create_search_backend
+                    self._search_backend = create_search_backend(self)
+            finally:
+                self._search_backend_lock.release()
+        return self._search_backend
 
     @model_function
     def get_query(self):
@@ -103,6 +157,76 @@ attribute to enable search.
         """
         return self.entity.query
 
+    @model_function
+    def get_projection(self, field_names, list_projection=None):
+        """:param field_names: the names of the fields displayed in the table
+        view
+        :param list_projection: overrides the list_projection attribute of the
+        admin if not None
+        :return: a list of (key, attribute) tuples with the attributes to
+        select when only the displayed columns should be selected, starting
+        with the primary key, or None if complete objects should be selected
+        """
+        from sqlalchemy import orm
+        from sqlalchemy.exceptions import InvalidRequestError
+        if list_projection == None:
+            list_projection = self.list_projection
+        if not list_projection or self.mapper.inherits:
+            return None
+        keys = [self.mapper.get_property_by_column(column).key for column in self.mapper.primary_key]
+        for field_name in field_names:
+            try:
+                property = self.mapper.get_property(field_name)
+            except InvalidRequestError:
+                return None
+            if not isinstance(property, orm.properties.ColumnProperty):
+                return None
+            for name, value in self.get_field_attributes(field_name).items():
+                if name in DYNAMIC_FIELD_ATTRIBUTES and callable(value):
+                    return None
+            if field_name not in keys:
+                keys.append(field_name)
+        return [(key, getattr(self.entity, key)) for key in keys]
+
+    @model_function
+    def get_loader_options(self, field_names, streaming=False):
+        """:param field_names: the names of the fields displayed in the table
+        view
+        :param streaming: True if the query will be read in chunks with
+        yield_per, an additional query would then load the related objects of
+        all rows at once, so those are not loaded in advance
+        :return: a list of query options to load everything needed to display
+        those fields in the same queries as the objects themselves, instead of
+        one query per object and field.  The related objects of many to one
+        fields are loaded with a join, or with an additional query when they
+        use inheritance, and deferred columns are undeferred.
+        """
+        from sqlalchemy import orm
+        from sqlalchemy.exceptions import InvalidRequestError
+        options = []
+        for field_name in field_names:
+            try:
+                property = self.mapper.get_property(
+                    field_name,
+                    resolve_synonyms=True
+                )
+            except InvalidRequestError:
+                continue
+            field_attributes = self.get_field_attributes(field_name)
+            if isinstance(property, orm.properties.ColumnProperty):
+                if property.deferred:
+                    options.append(orm.undefer(property.key))
+            elif isinstance(property, orm.properties.PropertyLoader):
+                if field_attributes.get('direction') != orm.interfaces.MANYTOONE:
+                    continue
+                target = property._get_target()
+                if target.inherits or target.polymorphic_on is not None:
+                    if not streaming:
+                        options.append(orm.subqueryload(property.key))
+                else:
+                    options.append(orm.joinedload(property.key))
+        return options
+
     @model_function
     def get_verbose_identifier(self, obj):
         if obj:
@@ -511,6 +635,11 @@ attribute to enable search.
                 session.flush( [entity_instance] )
                 if history:
                     Session.object_session( history ).flush( [history] )
+                get_completion_cache().invalidate( self.entity )
+                self.get_search_backend().remove( entity_instance )
+                from camelot.view.filters import get_filter_options_cache
+                get_filter_options_cache().invalidate( self.entity )
+                get_row_count_cache().invalidate( type( entity_instance ) )
 
     @model_function
     def flush(self, entity_instance):
@@ -521,6 +650,11 @@ attribute to enable search.
             logger.error('Programming Error : entity %s cannot be flushed because it has no session'%(unicode(entity_instance)))
         else:
             session.flush( [entity_instance] )
+            get_completion_cache().invalidate( self.entity )
+            self.get_search_backend().update( entity_instance )
+            from camelot.view.filters import get_filter_options_cache
+            get_filter_options_cache().invalidate( self.entity )
+            get_row_count_cache().invalidate( type( entity_instance ) )
 
     @model_function
     def refresh(self, entity_instance):
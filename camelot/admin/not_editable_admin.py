@@ -86,6 +86,12 @@ def notEditableAdmin(original_admin, actions=False, editable_fields=None):
                     dynamic_fa = self._original_admin.get_dynamic_field_attributes(obj, fn1)
                     return [self._process_field_attributes(name, attributes) for name,attributes in zip(fn2, dynamic_fa)]
                     
+                def get_dynamic_field_attributes_of_objects(self, objects, field_names):
+                    field_names = list(field_names)
+                    objects_fa = self._original_admin.get_dynamic_field_attributes_of_objects(objects, field_names)
+                    return [[self._process_field_attributes(name, attributes) for name,attributes in zip(field_names, dynamic_fa)]
+                            for dynamic_fa in objects_fa]
+                    
                 def get_static_field_attributes(self, field_names):
                     fn1, fn2 = tee(field_names, 2)
                     static_fa = self._original_admin.get_static_field_attributes(fn1)
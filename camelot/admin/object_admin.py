@@ -25,6 +25,7 @@
 """Admin class for Plain Old Python Object"""
 
 import logging
+import threading
 logger = logging.getLogger('camelot.view.object_admin')
 
 from camelot.view.model_thread import gui_function, model_function
@@ -52,6 +53,25 @@ DYNAMIC_FIELD_ATTRIBUTES = FieldAttributesList(['tooltip', 'color', 'background_
                                                 'prefix', 'suffix', 'arrow',
                                                 'new_message', 'default'])
 
+def batch_field_attribute(function):
+    """Decorator for a dynamic field attribute function that takes a list
+    of objects instead of a single object, and returns a list with the value
+    of the field attribute for each object.  This allows a field attribute to
+    be computed for all rows of a table view with a single query ::
+
+    @batch_field_attribute
+    def background_color(books):
+        late = set(Loan.late_books(books))
+        return [QtGui.QColor('red') if book in late else None for book in books]
+    """
+    function.batch = True
+    return function
+
+# the values of the batch field attribute functions computed by 
+# get_dynamic_field_attributes_of_objects, by (id(function), id(obj)), for
+# use by get_dynamic_field_attributes in the same thread
+_batch_values_ = threading.local()
+
 
 class ObjectAdmin(object):
     """The ObjectAdmin class describes the interface that will be used
@@ -163,6 +183,9 @@ class Movie(Entity):
 The :ref:`doc-admin-field_attributes` documentation describes the various keys
 that can be used in the field attributes class attribute of an ObjectAdmin or EntityAdmin.
 
+Dynamic field attributes that are computed for many objects at once, should
+be decorated with :func:`batch_field_attribute`.
+
 **Window state**
 
 .. attribute:: form_state
@@ -386,13 +409,59 @@ The QWidget class to be used when a table view is needed
                 if callable(value):
                     return_value = None
                     try:
-                        return_value = value(obj)
+                        if getattr(value, 'batch', False):
+                            batch_values = getattr(_batch_values_, 'values', {})
+                            key = (id(value), id(obj))
+                            if key in batch_values:
+                                return_value = batch_values[key]
+                            else:
+                                return_value = value([obj])[0]
+                        else:
+                            return_value = value(obj)
                     except (ValueError, Exception, RuntimeError, TypeError, NameError), exc:
                         logger.error(u'error in field_attribute function of %s'%name, exc_info=exc)
                     finally:
                         dynamic_field_attributes[name] = return_value
             yield dynamic_field_attributes
 
+    def get_dynamic_field_attributes_of_objects(self, objects, field_names):
+        """
+        Get the dynamic field attributes of a list of objects at once, this
+        method is called for each range of rows fetched by a table view.
+        Field attribute functions decorated with batch_field_attribute are
+        called once for all objects, after which get_dynamic_field_attributes
+        is called for each object, so overwriting get_dynamic_field_attributes
+        is enough to change the dynamic field attributes in a table view.
+
+        :param objects: a list of objects
+        :param field_names: a list of field names
+        :return: a list with for each object the list of dictionaries
+        returned by get_dynamic_field_attributes for that object
+        """
+        objects = list(objects)
+        field_names = list(field_names)
+        batch_values = dict()
+        for field_name in field_names:
+            field_attributes = self.get_field_attributes(field_name)
+            for name, value in field_attributes.items():
+                if name not in DYNAMIC_FIELD_ATTRIBUTES or not callable(value):
+                    continue
+                if not getattr(value, 'batch', False):
+                    continue
+                return_values = [None] * len(objects)
+                try:
+                    return_values = list(value(objects))
+                except (ValueError, Exception, RuntimeError, TypeError, NameError), exc:
+                    logger.error(u'error in field_attribute function of %s'%name, exc_info=exc)
+                for obj, return_value in zip(objects, return_values):
+                    batch_values[(id(value), id(obj))] = return_value
+        previous_batch_values = getattr(_batch_values_, 'values', {})
+        _batch_values_.values = batch_values
+        try:
+            return [list(self.get_dynamic_field_attributes(obj, field_names)) for obj in objects]
+        finally:
+            _batch_values_.values = previous_batch_values
+
     def get_field_attributes(self, field_name):
         """
         Get the attributes needed to visualize the field field_name.  This
@@ -29,7 +29,7 @@ logger = logging.getLogger('camelot.admin.validator.object_validator')
 from PyQt4 import QtCore
 
 from camelot.view.fifo import Fifo
-from camelot.view.model_thread import post
+from camelot.view.model_thread import post, PRIORITY_LOW
 from camelot.core.utils import ugettext as _
 
 
@@ -58,7 +58,7 @@ class ObjectValidator(QtCore.QObject):
         self._invalid_rows = set()
 
         if initial_validation:
-            post(self.validate_all_rows)
+            post(self.validate_all_rows, priority=PRIORITY_LOW)
 
     def validate_all_rows(self):
         """Force validation of all rows in the model"""
@@ -71,7 +71,7 @@ class ObjectValidator(QtCore.QObject):
 
     @QtCore.pyqtSlot()
     def layout_changed(self):
-        post(self.validate_invalid_rows)
+        post(self.validate_invalid_rows, priority=PRIORITY_LOW)
 
     @QtCore.pyqtSlot( QtCore.QModelIndex, QtCore.QModelIndex )
     def data_changed(self, from_index, thru_index):
@@ -84,7 +84,8 @@ class ObjectValidator(QtCore.QObject):
 
             return validity_updater
 
-        post(create_validity_updater(from_index.row(), thru_index.row()))
+        post(create_validity_updater(from_index.row(), thru_index.row()),
+             priority=PRIORITY_LOW)
 
     def objectValidity(self, entity_instance):
         """:return: list of messages explaining invalid data
@@ -24,11 +24,25 @@
 import logging
 
 import sqlalchemy
+from sqlalchemy.interfaces import PoolListener
 
 from camelot.core.utils import ugettext as _
 
 logger = logging.getLogger('camelot.core.backup')
 
+class PragmaListener(PoolListener):
+    """Pool listener that sets pragmas on each new sqlite connection"""
+    
+    def __init__(self, pragmas):
+        """:param pragmas: a list of (name, value) tuples"""
+        self.pragmas = pragmas
+        
+    def connect(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in self.pragmas:
+            cursor.execute('PRAGMA %s = %s'%(name, value))
+        cursor.close()
+
 class BackupMechanism(object):
     """Create a backup of the current database to an sqlite database stored in 
     a file.
@@ -39,8 +53,19 @@ class BackupMechanism(object):
     from the the database to backup.  When a restore is done, the schema of the
     database is not touched, but the tables are emptied and the data from the
     backup is copied into the existing schema.
+    
+    The data of a table is copied in batches of batch_size rows, each batch is
+    inserted in its own transaction, so the memory needed does not depend on
+    the size of the table.  While a backup is made, the backup_pragmas are 
+    set on the connections to the backup file, to speed up the inserts at the
+    cost of durability, which is of no use for a temporary file.
     """
     
+    batch_size = 1000
+    backup_pragmas = [('journal_mode', 'MEMORY'),
+                      ('synchronous', 'OFF'),
+                      ('cache_size', 10000)]
+    
     def __init__(self, filename, storage=None):
         """Backup and restore to a file using it as an sqlite database.
         :param filename: the name of the file in which to store the backup, this
@@ -145,7 +170,8 @@ class BackupMechanism(object):
         logger.info("preparing backup to '%s'"%temp_file_name)
         if os.path.exists(self._filename):
             os.remove(self._filename)
-        to_engine   = create_engine( u'sqlite:///%s'%temp_file_name, poolclass=NullPool )
+        to_engine   = create_engine( u'sqlite:///%s'%temp_file_name, poolclass=NullPool,
+                                     listeners=[PragmaListener(self.backup_pragmas)] )
         to_meta_data = MetaData()
         to_meta_data.bind = to_engine
         #
@@ -255,12 +281,30 @@ class BackupMechanism(object):
         to_connection.close()
         
     def copy_table_data(self, from_table, to_table):
+        """Copy the data of from_table to to_table, the rows are read with a
+        server side cursor when the database supports it, and inserted in 
+        batches of batch_size rows.
+        """
         from_connection = from_table.bind.connect()
-        query = sqlalchemy.select([from_table])
-        table_data = [row for row in from_connection.execute(query).fetchall()]
-        from_connection.close()
-        if len(table_data):
-            to_connection = to_table.bind.connect()
-            to_connection.execute(to_table.insert(), table_data)
+        to_connection = to_table.bind.connect()
+        try:
+            query = sqlalchemy.select([from_table])
+            result = from_connection.execution_options(stream_results=True).execute(query)
+            try:
+                while True:
+                    table_data = result.fetchmany(self.batch_size)
+                    if not len(table_data):
+                        break
+                    transaction = to_connection.begin()
+                    try:
+                        to_connection.execute(to_table.insert(), table_data)
+                        transaction.commit()
+                    except Exception:
+                        transaction.rollback()
+                        raise
+            finally:
+                result.close()
+        finally:
             to_connection.close()
+            from_connection.close()
 
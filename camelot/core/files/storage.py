@@ -55,7 +55,6 @@ class StoredImage( StoredFile ):
 
     def __init__( self, storage, name ):
         super(StoredImage, self).__init__( storage, name )
-        self._thumbnails = dict()
         
     @model_function
     def checkout_image( self ):
@@ -66,19 +65,11 @@ class StoredImage( StoredFile ):
 
     @model_function
     def checkout_thumbnail( self, width, height ):
-        """Checkout a thumbnail for this image from the storage
+        """Checkout a thumbnail for this image from the storage, the
+        thumbnails are kept in a cache shared by all images
         :return: a QImage"""
-        key = (width, height)
-        try:
-            thumbnail_image = self._thumbnails[key]
-            return thumbnail_image
-        except KeyError:
-            pass
-        from PyQt4.QtCore import Qt
-        original_image = self.checkout_image()
-        thumbnail_image = original_image.scaled( width, height, Qt.KeepAspectRatio )
-        self._thumbnails[key] = thumbnail_image
-        return thumbnail_image
+        from camelot.core.files.thumbnails import get_thumbnail_cache
+        return get_thumbnail_cache().checkout_thumbnail( self, width, height )
 
 class Storage( object ):
     """Helper class that opens and saves StoredFile objects
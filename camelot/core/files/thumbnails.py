@@ -0,0 +1,154 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""Cache of thumbnails of StoredImage objects, shared by all images in the
+process.
+
+The thumbnails are kept in memory for the most recently used images, and are
+saved on disk, so they don't have to be created again when the application is
+restarted.  A thumbnail is identified by the path of the image, its
+modification time, its size and the size of the thumbnail, so when an image
+changes, a new thumbnail is created.
+
+The directory in which the thumbnails are saved can be set with the
+CAMELOT_THUMBNAIL_ROOT setting, and defaults to a directory in the temporary
+directory of the system.
+"""
+
+import logging
+
+logger = logging.getLogger( 'camelot.core.files.thumbnails' )
+
+from camelot.view.model_thread import model_function
+
+class ThumbnailCache( object ):
+    """In memory and on disk cache of thumbnails.  The methods of this class
+    load and scale images, so they should not be used within the GUI thread.
+    """
+
+    def __init__( self, root = None, max_entries = 200 ):
+        """:param root: the directory in which to save the thumbnails, None to
+        use the CAMELOT_THUMBNAIL_ROOT setting or the default directory
+        :param max_entries: the maximum number of thumbnails to keep in memory
+        """
+        from camelot.view.fifo import Fifo
+        self._root = root
+        self._memory = Fifo( max_entries )
+        
+    @property
+    def root( self ):
+        if self._root == None:
+            import os
+            import tempfile
+            import settings
+            self._root = getattr( settings, 'CAMELOT_THUMBNAIL_ROOT', None ) or \
+                         os.path.join( tempfile.gettempdir(), 'camelot-thumbnails' )
+        return self._root
+
+    def _key( self, stored_image, width, height ):
+        """:return: the key of the thumbnail and the path of the image"""
+        import os
+        path = os.path.abspath( stored_image.storage.checkout( stored_image ) )
+        stat = os.stat( path )
+        return ( path, stat.st_mtime, stat.st_size, width, height ), path
+
+    def _thumbnail_path( self, key ):
+        import hashlib
+        import os
+        return os.path.join( self.root, '%s.png'%hashlib.sha1( repr( key ) ).hexdigest() )
+
+    def _load( self, key ):
+        """:return: the thumbnail saved on disk, None if there is no such
+        thumbnail"""
+        import os
+        from PyQt4.QtGui import QImage
+        thumbnail_path = self._thumbnail_path( key )
+        if os.path.exists( thumbnail_path ):
+            thumbnail_image = QImage( thumbnail_path )
+            if not thumbnail_image.isNull():
+                return thumbnail_image
+        return None
+
+    def _save( self, key, thumbnail_image ):
+        """Save the thumbnail on disk, failure to do so is not an error, since
+        the thumbnail can be created again"""
+        import os
+        import tempfile
+        temporary_path = None
+        try:
+            if not os.path.exists( self.root ):
+                os.makedirs( self.root )
+            # write to a temporary file first, so other processes never read
+            # a partial thumbnail
+            handle, temporary_path = tempfile.mkstemp( suffix = '.png', dir = self.root )
+            os.close( handle )
+            if thumbnail_image.save( temporary_path, 'PNG' ):
+                thumbnail_path = self._thumbnail_path( key )
+                # on windows, rename fails if the thumbnail was saved in 
+                # the mean time by another view
+                if os.path.exists( thumbnail_path ):
+                    os.remove( thumbnail_path )
+                os.rename( temporary_path, thumbnail_path )
+                temporary_path = None
+        except Exception, e:
+            logger.warn( 'could not save thumbnail in %s'%self.root, exc_info = e )
+        if temporary_path and os.path.exists( temporary_path ):
+            try:
+                os.remove( temporary_path )
+            except OSError, e:
+                logger.warn( 'could not remove %s'%temporary_path, exc_info = e )
+
+    @model_function
+    def checkout_thumbnail( self, stored_image, width, height ):
+        """Get a thumbnail of a stored image, from memory, from disk or by
+        scaling the image itself.
+        :return: a QImage"""
+        from PyQt4.QtCore import Qt
+        from PyQt4.QtGui import QImage
+        try:
+            key, path = self._key( stored_image, width, height )
+        except OSError, e:
+            logger.warn( 'could not access image %s'%stored_image.name, exc_info = e )
+            return QImage()
+        try:
+            return self._memory.get_data_at_row( key )
+        except KeyError:
+            pass
+        thumbnail_image = self._load( key )
+        if thumbnail_image is None:
+            original_image = QImage( path )
+            thumbnail_image = original_image.scaled( width, height, Qt.KeepAspectRatio )
+            if not thumbnail_image.isNull():
+                self._save( key, thumbnail_image )
+        self._memory.add_data( key, key, thumbnail_image )
+        return thumbnail_image
+
+_thumbnail_cache_ = None
+
+def get_thumbnail_cache():
+    """Get the thumbnail cache shared by all images"""
+    global _thumbnail_cache_
+    if _thumbnail_cache_ == None:
+        _thumbnail_cache_ = ThumbnailCache()
+    return _thumbnail_cache_
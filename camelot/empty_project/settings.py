@@ -43,7 +43,8 @@ CAMELOT_BACKUP_FILENAME_TEMPLATE = 'default-backup-%(text)s.' + CAMELOT_BACKUP_E
 
 
 def ENGINE():
-    """This function should return a connection to the database"""
+    """This function should return a connection to the database, to profile
+    the sql statements, see camelot.view.model_thread.profiler"""
     from sqlalchemy import create_engine
     return create_engine('sqlite:///model-data.sqlite')
 
@@ -0,0 +1,56 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+
+"""test module for the 'camelot/core/backup.py' module"""
+
+import unittest
+
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, Unicode, select, func
+
+from camelot.core.backup import BackupMechanism, PragmaListener
+
+
+class BackupMechanismTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.from_meta_data = MetaData()
+        self.from_meta_data.bind = create_engine('sqlite:///:memory:')
+        self.to_meta_data = MetaData()
+        self.to_meta_data.bind = create_engine('sqlite:///:memory:',
+                                               listeners=[PragmaListener(BackupMechanism.backup_pragmas)])
+        self.from_table = Table('person', self.from_meta_data,
+                                Column('id', Integer, primary_key=True),
+                                Column('name', Unicode(50)))
+        self.from_meta_data.create_all()
+        self.to_table = self.from_table.tometadata(self.to_meta_data)
+        self.to_meta_data.create_all()
+
+    def test_copy_table_data(self):
+        self.from_table.insert().execute([dict(id=i, name=u'person %i'%i) for i in range(7)])
+        backup_mechanism = BackupMechanism(u'backup.db')
+        backup_mechanism.batch_size = 3
+        backup_mechanism.copy_table_data(self.from_table, self.to_table)
+        self.assertEqual(7, select([func.count(self.to_table.c.id)]).scalar())
+        self.assertEqual(u'person 6', select([self.to_table.c.name], self.to_table.c.id==6).scalar())
@@ -0,0 +1,68 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""test module for the 'camelot/view/proxy/collection_proxy.py' module"""
+
+from PyQt4.QtCore import Qt
+
+from camelot.test import ModelThreadTestCase
+from camelot.admin.application_admin import ApplicationAdmin
+from camelot.admin.object_admin import ObjectAdmin
+from camelot.view.proxy.collection_proxy import CollectionProxy
+
+
+class Book(object):
+
+    def __init__(self, title):
+        self.title = title
+
+class BookAdmin(ObjectAdmin):
+    list_display = ['title']
+
+class CollectionProxyTestCase(ModelThreadTestCase):
+
+    def setUp(self):
+        super(CollectionProxyTestCase, self).setUp()
+        self.admin = BookAdmin(ApplicationAdmin(), Book)
+        self.books = [Book(u'b'), Book(u'd'), Book(u'c')]
+        self.proxy = CollectionProxy(self.admin, lambda:self.books,
+                                     self.admin.get_columns,
+                                     flush_changes=False)
+        self.process()
+
+    def test_insert_with_active_sort(self):
+        self.proxy.sort(0, Qt.AscendingOrder)
+        self.process()
+        book = Book(u'a')
+        row = self.proxy.insertEntityInstance(0, book)
+        self.assertEqual(0, row)
+        self.assertEqual(set([0]), self.proxy.unflushed_rows)
+        self.assertEqual(book, self.proxy._get_object(row))
+
+    def test_insert_with_active_filter(self):
+        self.proxy.set_filter(lambda book:book.title != u'a')
+        self.process()
+        row = self.proxy.insertEntityInstance(0, Book(u'a'))
+        self.assertEqual(None, row)
+        self.assertEqual(set(), self.proxy.unflushed_rows)
@@ -0,0 +1,89 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""test module for the 'camelot/view/completions.py' module"""
+
+import unittest
+from camelot.view.completions import CompletionCache
+
+
+class Country(object):
+    pass
+
+class Admin(object):
+    entity = Country
+
+class NameSearchPlan(object):
+    """Search plan that searches the names of countries, and their number
+    if the text is a number"""
+
+    def matches_text_only(self, text):
+        for c in text:
+            if c.isdigit():
+                return False
+        return True
+
+    def get_search_strings(self, obj):
+        return [obj.lower()]
+
+class NameCompletionCache(CompletionCache):
+
+    def get_search_plan(self, admin):
+        return NameSearchPlan()
+
+class CompletionCacheTestCase(unittest.TestCase):
+
+    def test_get_and_narrow(self):
+        cache = NameCompletionCache()
+        admin = Admin()
+        self.assertEqual(None, cache.get(admin, u'be', 20, timestamp=0))
+        cache.set(admin, u'Be', [u'Belgium', u'Benin', u'Bermuda'], True, timestamp=0)
+        self.assertEqual([u'Belgium', u'Benin', u'Bermuda'], cache.get(admin, u'be', 20, timestamp=0))
+        self.assertEqual([u'Belgium'], cache.get(admin, u'bel', 20, timestamp=0))
+        # numbers cannot be narrowed
+        self.assertEqual(None, cache.get(admin, u'be1', 20, timestamp=0))
+        self.assertEqual(None, cache.get(admin, u'be', 20, timestamp=cache.max_age + 1))
+
+    def test_full_text_search(self):
+        cache = NameCompletionCache()
+        admin = Admin()
+        admin.full_text_search = True
+        cache.set(admin, u'be', [u'Belgium', u'Benin'], True, timestamp=0)
+        self.assertEqual([u'Belgium', u'Benin'], cache.get(admin, u'be', 20, timestamp=0))
+        # a full text index matches words, not parts of a text
+        self.assertEqual(None, cache.get(admin, u'bel', 20, timestamp=0))
+
+    def test_incomplete(self):
+        cache = NameCompletionCache()
+        admin = Admin()
+        cache.set(admin, u'be', [u'Belgium', u'Benin'], False, timestamp=0)
+        self.assertEqual([u'Belgium'], cache.get(admin, u'be', 1, timestamp=0))
+        self.assertEqual(None, cache.get(admin, u'ben', 20, timestamp=0))
+
+    def test_invalidate(self):
+        cache = NameCompletionCache()
+        admin = Admin()
+        cache.set(admin, u'be', [u'Belgium'], True, timestamp=0)
+        cache.invalidate(Country)
+        self.assertEqual(None, cache.get(admin, u'be', 20, timestamp=0))
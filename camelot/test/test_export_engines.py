@@ -0,0 +1,114 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""test module for the 'camelot/view/export/engines.py' module"""
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from xml.dom import minidom
+
+from camelot.view.export.engines import CsvEngine, XlsxEngine, \
+                                        ColumnarEngine, export_data, \
+                                        column_letters, get_export_filename
+
+
+columns = [('name', dict(name=u'Name', python_type=str)),
+           ('amount', dict(name=u'Amount', python_type=float, precision=2)),
+           ('born', dict(name=u'Born', python_type=datetime.date, format='dd/MM/yyyy'))]
+
+rows = [(u'Jos\xe9 <&>', 1.5, datetime.date(2010, 1, 1)),
+        (None, None, None),
+        ([u'A', u'B'], 2.0, datetime.date(1900, 3, 1))]
+
+class ExportEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_column_letters(self):
+        self.assertEqual(['A', 'Z', 'AA', 'ZZ'], [column_letters(i) for i in (0, 25, 26, 701)])
+
+    def test_csv(self):
+        filename = os.path.join(self.directory, 'export.csv')
+        self.assertTrue(export_data(CsvEngine(filename), u'title', columns, iter(rows), chunk_size=2))
+        lines = open(filename, 'rb').read().decode('utf-8-sig').splitlines()
+        self.assertEqual([u'Name,Amount,Born', u'Jos\xe9 <&>,1.50,2010-01-01', u',,', u'A.B,2.00,1900-03-01'], lines)
+
+    def test_xlsx(self):
+        filename = os.path.join(self.directory, 'export.xlsx')
+        self.assertTrue(export_data(XlsxEngine(filename), u'title', columns, iter(rows), chunk_size=2))
+        workbook = zipfile.ZipFile(filename)
+        for name in workbook.namelist():
+            minidom.parseString(workbook.read(name))
+        sheet = workbook.read('xl/worksheets/sheet1.xml')
+        self.assertTrue('<c r="C6" s="3"><v>61.0</v></c>' in sheet)
+
+    def test_cancel(self):
+        filename = os.path.join(self.directory, 'export.csv')
+        self.assertFalse(export_data(CsvEngine(filename), u'title', columns, iter(rows), 
+                                     progress=lambda written, total:False, chunk_size=1))
+        self.assertFalse(os.path.exists(filename))
+
+    def test_xlsx_parts(self):
+        filename = os.path.join(self.directory, 'export.xlsx')
+        engine = XlsxEngine(filename)
+        engine.start(u'title', columns)
+        for i, part_rows in enumerate([rows[:2], rows[2:]]):
+            part_filename = os.path.join(self.directory, '%i.xml'%i)
+            part = XlsxEngine(part_filename)
+            part.start_part(columns, i * 2)
+            part.write_rows(part_rows)
+            part.finish_part()
+            engine.append_part(part_filename, part.rows_written)
+        engine.finish()
+        self.assertEqual(3, engine.rows_written)
+        workbook = zipfile.ZipFile(filename)
+        sheet = workbook.read('xl/worksheets/sheet1.xml')
+        minidom.parseString(sheet)
+        self.assertTrue('<c r="C6" s="3"><v>61.0</v></c>' in sheet)
+
+    @unittest.skipIf(not ColumnarEngine.is_available(), 'numpy 1.7 is not installed')
+    def test_columnar(self):
+        import numpy
+        filename = os.path.join(self.directory, 'export.npz')
+        self.assertTrue(export_data(ColumnarEngine(filename), u'title', columns, iter(rows), chunk_size=2))
+        arrays = numpy.load(filename)
+        self.assertEqual([u'Name', u'Amount', u'Born'], list(arrays['columns']))
+        self.assertEqual([u'Jos\xe9 <&>', u''], list(arrays['0.0']))
+        self.assertEqual(2.0, arrays['1.1'][0])
+        self.assertTrue(numpy.isnan(arrays['1.0'][1]))
+        self.assertEqual(numpy.datetime64('1900-03-01'), arrays['2.1'][0])
+        self.assertEqual('NaT', str(arrays['2.0'][1]))
+
+    def test_export_filename(self):
+        self.assertEqual(u'export.csv', get_export_filename(u'export.csv', u'Excel 2007 workbook (*.xlsx)'))
+        self.assertEqual(u'export.tsv', get_export_filename(u'export', u'Tab separated values (*.tsv)'))
+        self.assertEqual(u'export.xlsx', get_export_filename(u'export'))
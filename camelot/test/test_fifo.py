@@ -0,0 +1,87 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""test module for the 'camelot/view/fifo.py' module"""
+
+import unittest
+from camelot.view.fifo import Fifo
+
+
+class FifoTestCase(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = Fifo(2)
+        cache.add_data(0, 'a', [1])
+        cache.add_data(1, 'b', [2])
+        self.assertEqual([1], cache.get_data_at_row(0))
+        cache.add_data(2, 'c', [3])
+        self.assertTrue(cache.has_data_at_row(0))
+        self.assertFalse(cache.has_data_at_row(1))
+        self.assertTrue(cache.has_data_at_row(2))
+        self.assertEqual(1, cache.evictions)
+        self.assertEqual(['a', 'c'], cache.entities)
+
+    def test_entity_moves_to_other_row(self):
+        cache = Fifo(10)
+        cache.add_data(0, 'a', [1])
+        cache.add_data(3, 'a', [1])
+        self.assertFalse(cache.has_data_at_row(0))
+        self.assertEqual(3, cache.get_row_by_entity('a'))
+        cache.add_data(3, 'b', [2])
+        self.assertRaises(KeyError, cache.get_row_by_entity, 'a')
+        self.assertEqual('b', cache.get_entity_at_row(3))
+        self.assertEqual(1, len(cache))
+
+    def test_delete(self):
+        cache = Fifo(10)
+        cache.add_data(0, 'a', [1])
+        cache.add_data(1, 'b', [2])
+        self.assertEqual(0, cache.delete_by_entity('a'))
+        self.assertEqual(None, cache.delete_by_entity('a'))
+        self.assertEqual(1, cache.delete_by_row(1))
+        self.assertRaises(KeyError, cache.delete_by_row, 1)
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.size)
+
+    def test_statistics(self):
+        cache = Fifo(10)
+        cache.add_data(0, 'a', [1])
+        cache.get_data_at_row(0)
+        self.assertRaises(KeyError, cache.get_data_at_row, 1)
+        statistics = cache.get_statistics()
+        self.assertEqual(1, statistics['hits'])
+        self.assertEqual(1, statistics['misses'])
+        self.assertEqual(1, statistics['rows'])
+
+    def test_memory_budget(self):
+        cache = Fifo(1000, max_size=1)
+        cache.add_data(0, 'a', [u'x'*1000])
+        cache.add_data(1, 'b', [u'y'*1000])
+        # the most recent row is kept, even if it exceeds the budget
+        self.assertEqual(1, len(cache))
+        self.assertTrue(cache.has_data_at_row(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+
+"""test module for the 'camelot/admin/object_admin.py' module"""
+
+from camelot.test import ModelThreadTestCase
+from camelot.admin.application_admin import ApplicationAdmin
+from camelot.admin.object_admin import ObjectAdmin, batch_field_attribute
+from camelot.admin.not_editable_admin import notEditableAdmin
+
+
+class Book(object):
+
+    def __init__(self, title):
+        self.title = title
+
+calls = []
+
+@batch_field_attribute
+def background_color(books):
+    calls.append(len(books))
+    return ['red' if book.title == 'late' else None for book in books]
+
+class BookAdmin(ObjectAdmin):
+    list_display = ['title']
+    field_attributes = dict(title=dict(editable=lambda book:True,
+                                       tooltip=lambda book:book.title,
+                                       background_color=background_color))
+
+class LibraryAdmin(ObjectAdmin):
+
+    def get_related_entity_admin(self, entity):
+        return BookAdmin(self.app_admin, entity)
+
+class ObjectAdminTestCase(ModelThreadTestCase):
+
+    def setUp(self):
+        super(ObjectAdminTestCase, self).setUp()
+        self.app_admin = ApplicationAdmin()
+        self.books = [Book('late'), Book('in time')]
+        del calls[:]
+
+    def test_dynamic_field_attributes_of_objects(self):
+        admin = BookAdmin(self.app_admin, Book)
+        objects_field_attributes = admin.get_dynamic_field_attributes_of_objects(self.books, ['title'])
+        self.assertEqual([2], calls)
+        self.assertEqual(['red', None], [fa[0]['background_color'] for fa in objects_field_attributes])
+        self.assertEqual(['late', 'in time'], [fa[0]['tooltip'] for fa in objects_field_attributes])
+        self.assertEqual(objects_field_attributes[0], 
+                         list(admin.get_dynamic_field_attributes(self.books[0], ['title'])))
+
+    def test_decorated_admin(self):
+        admin = notEditableAdmin(LibraryAdmin)(self.app_admin, Book).get_related_entity_admin(Book)
+        objects_field_attributes = admin.get_dynamic_field_attributes_of_objects(self.books, ['title'])
+        self.assertEqual([False, False], [fa[0]['editable'] for fa in objects_field_attributes])
+        self.assertEqual(['red', None], [fa[0]['background_color'] for fa in objects_field_attributes])
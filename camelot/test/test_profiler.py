@@ -0,0 +1,71 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""test module for the 'camelot/view/model_thread/profiler.py' module"""
+
+import unittest
+from camelot.view.model_thread.profiler import ModelThreadProfiler, percentile, \
+                                              create_sql_timing_proxy
+
+
+class ModelThreadProfilerTestCase(unittest.TestCase):
+
+    def test_percentile(self):
+        self.assertEqual(None, percentile([], 50))
+        values = range(101)
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(90, percentile(values, 90))
+        self.assertEqual(100, percentile(values, 100))
+
+    def test_record_tasks(self):
+        profiler = ModelThreadProfiler()
+        for i in range(3):
+            record = profiler.task_started('get_data', 'test', profiler.started)
+            profiler.sql_executed(0.5)
+            profiler.task_finished(record)
+        # sql executed outside a task is ignored
+        profiler.sql_executed(0.5)
+        summary = profiler.get_summary()
+        self.assertEqual(1, len(summary))
+        self.assertEqual('get_data', summary[0]['name'])
+        self.assertEqual(3, summary[0]['count'])
+        self.assertEqual(0.5, summary[0]['sql_p90'])
+        slowest = profiler.get_slowest_tasks(2)
+        self.assertEqual(2, len(slowest))
+        self.assertEqual(1, slowest[0].sql_statements)
+        events = profiler.get_trace_events()
+        self.assertEqual(6, len(events))
+        self.assertEqual(set(['queue', 'task']), set(e['cat'] for e in events))
+
+    def test_sql_timing(self):
+        from sqlalchemy import create_engine
+        from camelot.view.model_thread.profiler import _sql_profilers_
+        engine = create_engine('sqlite:///:memory:', proxy=create_sql_timing_proxy())
+        profiler = ModelThreadProfiler()
+        profiler.install_sql_timing()
+        self.addCleanup(_sql_profilers_.remove, profiler)
+        record = profiler.task_started('select', 'test', profiler.started)
+        engine.execute('select 1')
+        profiler.task_finished(record)
+        self.assertEqual(1, record.sql_statements)
@@ -0,0 +1,67 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+
+"""test module for the 'camelot/view/proxy/queryproxy.py' module"""
+
+import unittest
+
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, select
+
+from camelot.view.proxy.queryproxy import KeysetIndex
+
+
+class KeysetIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        meta_data = MetaData()
+        meta_data.bind = create_engine('sqlite:///:memory:')
+        self.table = Table('value', meta_data,
+                           Column('id', Integer, primary_key=True),
+                           Column('value', Integer, nullable=True))
+        meta_data.create_all()
+        self.table.insert().execute([dict(id=i, value=v) for i, v in enumerate([3, None, 1, None, 3, 2])])
+
+    def assert_seek(self, descending):
+        column_value = self.table.c.value
+        column_id = self.table.c.id
+        ordering = [(column_value, lambda row:row[1], descending),
+                    (column_id, lambda row:row[0], descending)]
+        # sqlite sorts NULL values first
+        index = KeysetIndex(ordering, nulls_last=False)
+        if descending:
+            order_by = [column_value.desc(), column_id.desc()]
+        else:
+            order_by = [column_value, column_id]
+        rows = list(select([column_id, column_value], order_by=order_by).execute())
+        for i, row in enumerate(rows):
+            index.add(i, row)
+            query = select([column_id, column_value], index._after(index._keys[i]), order_by=order_by)
+            self.assertEqual(rows[i+1:], list(query.execute()))
+
+    def test_seek_ascending(self):
+        self.assert_seek(False)
+
+    def test_seek_descending(self):
+        self.assert_seek(True)
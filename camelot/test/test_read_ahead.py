@@ -0,0 +1,78 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""test module for the 'camelot/view/proxy/read_ahead.py' module"""
+
+import unittest
+from camelot.view.proxy.read_ahead import ReadAheadPolicy, rows_to_ranges
+
+
+class RowsToRangesTestCase(unittest.TestCase):
+
+    def test_rows_to_ranges(self):
+        self.assertEqual([], rows_to_ranges([]))
+        self.assertEqual([(3, 3)], rows_to_ranges([5, 3, 4]))
+        self.assertEqual([(0, 2), (10, 1)], rows_to_ranges([0, 1, 10]))
+        self.assertEqual([(0, 11)], rows_to_ranges([0, 1, 10], max_gap=8))
+        self.assertEqual([(0, 2), (10, 1)], rows_to_ranges([0, 1, 10], max_gap=7))
+
+
+class ReadAheadPolicyTestCase(unittest.TestCase):
+
+    def test_nothing_visible(self):
+        policy = ReadAheadPolicy()
+        self.assertEqual((0, 0), policy.rows_to_prefetch(1000))
+
+    def test_scroll_down(self):
+        policy = ReadAheadPolicy(minimal_page_size=10, maximal_page_size=500)
+        policy.viewport_changed(0, 19, timestamp=0.0)
+        self.assertEqual((20, 20), policy.rows_to_prefetch(1000))
+        policy.viewport_changed(10, 29, timestamp=0.1)
+        offset, limit = policy.rows_to_prefetch(1000)
+        self.assertEqual(30, offset)
+        # scrolling at 100 rows per second fetches more than a page
+        self.assertTrue(limit > 20)
+        # never fetch beyond the end
+        self.assertEqual((30, 5), policy.rows_to_prefetch(35))
+
+    def test_scroll_up(self):
+        policy = ReadAheadPolicy(minimal_page_size=10, maximal_page_size=500)
+        policy.viewport_changed(100, 119, timestamp=0.0)
+        policy.viewport_changed(90, 109, timestamp=1.0)
+        self.assertEqual((65, 25), policy.rows_to_prefetch(1000))
+        policy.viewport_changed(5, 24, timestamp=2.0)
+        self.assertEqual((0, 5), policy.rows_to_prefetch(1000))
+
+    def test_jump_resets_speed(self):
+        policy = ReadAheadPolicy(minimal_page_size=10, maximal_page_size=50)
+        policy.viewport_changed(0, 19, timestamp=0.0)
+        policy.viewport_changed(10, 29, timestamp=0.01)
+        self.assertEqual(50, policy.page_size())
+        policy.viewport_changed(5000, 5019, timestamp=0.02)
+        self.assertEqual(0.0, policy.speed)
+        self.assertEqual(20, policy.page_size())
+
+
+if __name__ == '__main__':
+    unittest.main()
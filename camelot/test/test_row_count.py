@@ -0,0 +1,67 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""test module for the 'camelot/view/proxy/row_count.py' module"""
+
+import unittest
+from camelot.view.proxy.row_count import RowCountCache
+
+
+class A(object):
+    pass
+
+class B(A):
+    pass
+
+class RowCountCacheTestCase(unittest.TestCase):
+
+    def test_get_and_expire(self):
+        cache = RowCountCache()
+        self.assertEqual(None, cache.get('q', timestamp=0))
+        cache.set(A, 'q', 10, timestamp=0)
+        self.assertEqual(10, cache.get('q', timestamp=cache.max_age))
+        self.assertEqual(None, cache.get('q', timestamp=cache.max_age + 1))
+
+    def test_adjust(self):
+        cache = RowCountCache()
+        cache.adjust('q', 1)
+        self.assertEqual(None, cache.get('q', timestamp=0))
+        cache.set(A, 'q', 1, timestamp=0)
+        cache.adjust('q', 1)
+        self.assertEqual(2, cache.get('q', timestamp=0))
+        cache.adjust('q', -5)
+        self.assertEqual(0, cache.get('q', timestamp=0))
+
+    def test_invalidate(self):
+        cache = RowCountCache()
+        cache.set(A, 'a1', 1, timestamp=0)
+        cache.set(A, 'a2', 2, timestamp=0)
+        cache.set(B, 'b', 3, timestamp=0)
+        cache.invalidate(B, keep='a1')
+        self.assertEqual(1, cache.get('a1', timestamp=0))
+        self.assertEqual(None, cache.get('a2', timestamp=0))
+        self.assertEqual(None, cache.get('b', timestamp=0))
+        cache.set(B, 'b', 3, timestamp=0)
+        cache.invalidate(A)
+        self.assertEqual(3, cache.get('b', timestamp=0))
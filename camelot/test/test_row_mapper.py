@@ -0,0 +1,82 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""test module for the 'camelot/view/proxy/row_mapper.py' module"""
+
+import unittest
+from camelot.view.proxy.row_mapper import SortingRowMapper
+
+
+class SortingRowMapperTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = [(1, 'b'), (0, 'a'), (1, 'a'), (0, 'b')]
+        self.mapper = SortingRowMapper()
+
+    def test_identity(self):
+        self.assertEqual(4, self.mapper.update(self.collection))
+        self.assertEqual([0, 1, 2, 3], [self.mapper[i] for i in range(4)])
+
+    def test_multi_column_sort(self):
+        self.mapper.sort('letter', lambda o:o[1])
+        self.mapper.sort('number', lambda o:o[0], descending=True)
+        self.assertEqual(4, self.mapper.update(self.collection))
+        self.assertEqual([(1, 'a'), (1, 'b'), (0, 'a'), (0, 'b')],
+                         [self.collection[self.mapper[i]] for i in range(4)])
+        # sorting again on a key makes it the most significant
+        self.mapper.sort('letter', lambda o:o[1])
+        self.mapper.update(self.collection)
+        self.assertEqual([(1, 'a'), (0, 'a'), (1, 'b'), (0, 'b')],
+                         [self.collection[self.mapper[i]] for i in range(4)])
+
+    def test_filter_and_appended_rows(self):
+        self.mapper.filter = lambda o:o[1] == 'b'
+        self.assertEqual(2, self.mapper.update(self.collection))
+        self.assertEqual([0, 3], [self.mapper[i] for i in range(2)])
+        self.collection.append((2, 'c'))
+        self.assertEqual(4, self.mapper[2])
+
+    def test_get_row(self):
+        self.assertEqual(2, self.mapper.get_row(2))
+        self.mapper.sort('letter', lambda o:o[1])
+        self.mapper.filter = lambda o:o[0] == 1
+        self.mapper.update(self.collection)
+        self.assertEqual(1, self.mapper.get_row(0))
+        self.assertEqual(0, self.mapper.get_row(2))
+        self.assertEqual(None, self.mapper.get_row(1))
+        self.collection.append((2, 'c'))
+        self.assertEqual(2, self.mapper.get_row(4))
+
+    def test_cached_keys(self):
+        calls = []
+        def key(o):
+            calls.append(o)
+            return o[0]
+        self.mapper.sort('number', key)
+        self.mapper.update(self.collection)
+        self.mapper.update(self.collection)
+        self.assertEqual(4, len(calls))
+        self.mapper.invalidate_keys()
+        self.mapper.update(self.collection)
+        self.assertEqual(8, len(calls))
@@ -0,0 +1,63 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""test module for the 'camelot/view/search.py' module"""
+
+import unittest
+
+from sqlalchemy import orm, MetaData, Table, Column, Integer, Unicode
+
+from camelot.view.search import get_search_plan
+
+
+class Country(object):
+    pass
+
+Country.table = Table('country', MetaData(),
+                      Column('id', Integer, primary_key=True),
+                      Column('name', Unicode(50)),
+                      Column('code', Unicode(3)))
+orm.mapper(Country, Country.table)
+
+class Admin(object):
+    entity = Country
+
+    def __init__(self):
+        self.list_search = ['name']
+        self.search_all_fields = False
+
+class SearchPlanTestCase(unittest.TestCase):
+
+    def test_cached_plan(self):
+        admin = Admin()
+        plan = get_search_plan(admin)
+        self.assertTrue(plan is get_search_plan(admin))
+        self.assertEqual([['name']], plan.text_paths)
+        admin.list_search = ['name', 'code']
+        list_search_plan = get_search_plan(admin)
+        self.assertFalse(list_search_plan is plan)
+        self.assertEqual([['name'], ['code']], list_search_plan.text_paths)
+        self.assertTrue(list_search_plan is get_search_plan(admin))
+        admin.search_all_fields = True
+        self.assertFalse(get_search_plan(admin) is list_search_plan)
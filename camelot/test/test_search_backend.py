@@ -0,0 +1,59 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""test module for the 'camelot/view/search_backend.py' module"""
+
+import unittest
+from camelot.view.search_backend import InvertedIndexSearchBackend, split_words
+
+
+class Entity(object):
+    table = None
+
+class Admin(object):
+    entity = Entity
+
+class InvertedIndexSearchBackendTestCase(unittest.TestCase):
+
+    def test_split_words(self):
+        self.assertEqual([u'jean', u'luc', u'picard'], split_words(u'Jean-Luc Picard'))
+
+    def test_search(self):
+        backend = InvertedIndexSearchBackend(Admin())
+        backend.build([(1, u'Belgium', u'Brussels'),
+                       (2, u'Benin', None),
+                       (3, u'Bermuda', u'Hamilton')], timestamp=0)
+        self.assertEqual(set([1, 2, 3]), backend.search([u'be']))
+        self.assertEqual(set([1]), backend.search([u'bel', u'bru']))
+        self.assertEqual(set(), backend.search([u'bel', u'ham']))
+        self.assertEqual(set(), backend.search([u'x']))
+
+    def test_max_keys(self):
+        backend = InvertedIndexSearchBackend(Admin())
+        backend._build_from_table = lambda:None
+        backend.max_keys = 2
+        backend.get_primary_key_column = lambda:None
+        backend.build([(1, u'Belgium'), (2, u'Benin'), (3, u'Bermuda')], timestamp=0)
+        # too many keys match to use an IN clause
+        self.assertEqual(None, backend.create_index_clause([u'be']))
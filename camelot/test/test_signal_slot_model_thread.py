@@ -0,0 +1,64 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""test module for the 'camelot/view/model_thread/signal_slot_model_thread.py' module"""
+
+import unittest
+
+from PyQt4 import QtCore
+
+from camelot.test import get_application
+from camelot.view.model_thread.signal_slot_model_thread import SignalSlotModelThread
+
+class Receiver(QtCore.QObject):
+
+    def __init__(self):
+        QtCore.QObject.__init__(self)
+        self.responses = []
+
+    @QtCore.pyqtSlot(object)
+    def receive(self, response):
+        self.responses.append(response)
+
+class SignalSlotModelThreadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = get_application()
+        self.mt = SignalSlotModelThread(lambda:None)
+        # retain only a few tasks, to have tasks reused as well as deleted
+        self.mt.max_retained_tasks = 5
+        self.mt.start()
+
+    def tearDown(self):
+        self.mt.quit()
+        self.mt.wait()
+
+    def test_every_response_arrives(self):
+        receiver = Receiver()
+        for i in range(500):
+            self.mt.post(lambda i=i:i, receiver.receive)
+        self.mt.wait_on_work()
+        self.assertEqual(range(500), sorted(receiver.responses))
+        statistics = self.mt.get_task_statistics()
+        self.assertEqual(0, statistics['live'])
@@ -0,0 +1,186 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""Cache of the completions shown by the Many2OneEditor while the user types.
+
+The completions found for a text are cached per admin.  When the user extends
+a text for which all matching objects are in the cache, the completions are
+narrowed from the cached objects instead of querying the database again.
+
+For small lookup tables, the admin can ask to preload all objects in an
+in-memory index, after which no queries are needed at all to complete a text,
+see the preload_completions attribute of the EntityAdmin.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger('camelot.view.completions')
+
+class CompletionCache(object):
+    """Cache of the objects that match a search text, per admin.  All methods
+    should be called within the model thread.
+
+    .. attribute:: max_age
+
+    the number of seconds completions remain valid, to take into account
+    changes to the database made by other applications
+    
+    .. attribute:: max_texts
+    
+    the maximum number of texts for which completions are kept per admin
+    """
+
+    max_age = 60
+    max_texts = 50
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # admin : { text : (timestamp, complete, [(search_strings, obj)]) }
+        self._completions = dict()
+        # admin : (timestamp, [(search_strings, obj)])
+        self._indexes = dict()
+
+    def can_narrow(self, admin, text):
+        """:return: True if the objects that match text can be found among
+        the objects that match a part of text, by searching their search 
+        strings.  This is not the case when the admin uses a full text 
+        index, which matches words instead of parts of a text, or when other 
+        columns than text columns are searched, eg. numbers and dates that are
+        matched on equality."""
+        if getattr(admin, 'full_text_search', False):
+            return False
+        return self.get_search_plan(admin).matches_text_only(text)
+
+    def get_search_plan(self, admin):
+        """:return: the SearchPlan used to search the objects of admin"""
+        from camelot.view.search import get_search_plan
+        return get_search_plan(admin)
+
+    @staticmethod
+    def _narrow(candidates, text, limit):
+        objects = []
+        for search_strings, obj in candidates:
+            for search_string in search_strings:
+                if text in search_string:
+                    objects.append(obj)
+                    break
+            if len(objects) >= limit:
+                break
+        return objects
+
+    def get_search_strings(self, admin, obj):
+        """:return: the lower case texts of obj in which to search"""
+        return self.get_search_plan(admin).get_search_strings(obj)
+
+    def get(self, admin, text, limit, timestamp=None):
+        """:return: the list of at most limit objects that match text, or None
+        if those are not known without querying the database"""
+        if timestamp == None:
+            timestamp = time.time()
+        text = text.strip().lower()
+        self._lock.acquire()
+        try:
+            if admin in self._indexes:
+                created, candidates = self._indexes[admin]
+                if timestamp - created <= self.max_age:
+                    if self.can_narrow(admin, text):
+                        return self._narrow(candidates, text, limit)
+                else:
+                    del self._indexes[admin]
+            completions = self._completions.get(admin, {})
+            for i in range(len(text), 0, -1):
+                prefix = text[:i]
+                if prefix not in completions:
+                    continue
+                created, complete, candidates = completions[prefix]
+                if timestamp - created > self.max_age:
+                    del completions[prefix]
+                    continue
+                if prefix == text:
+                    return [obj for _search_strings, obj in candidates[:limit]]
+                if complete and self.can_narrow(admin, text):
+                    logger.debug('narrow completions of %s'%prefix)
+                    return self._narrow(candidates, text, limit)
+            return None
+        finally:
+            self._lock.release()
+
+    def set(self, admin, text, objects, complete, timestamp=None):
+        """Store the objects that match a text
+        :param complete: True if objects contains all the objects that match
+        the text, and not only the first ones
+        """
+        if timestamp == None:
+            timestamp = time.time()
+        candidates = [(self.get_search_strings(admin, obj), obj) for obj in objects]
+        self._lock.acquire()
+        try:
+            completions = self._completions.setdefault(admin, {})
+            if len(completions) >= self.max_texts:
+                oldest = min(completions.items(), key=lambda item:item[1][0])
+                del completions[oldest[0]]
+            completions[text.strip().lower()] = (timestamp, complete, candidates)
+        finally:
+            self._lock.release()
+
+    def preload(self, admin, timestamp=None):
+        """Load all objects of the admin in an in-memory index, if this was
+        not yet done"""
+        if timestamp == None:
+            timestamp = time.time()
+        self._lock.acquire()
+        try:
+            if admin in self._indexes:
+                created, _candidates = self._indexes[admin]
+                if timestamp - created <= self.max_age:
+                    return
+        finally:
+            self._lock.release()
+        logger.debug('preload completions of %s'%admin.get_verbose_name())
+        candidates = [(self.get_search_strings(admin, obj), obj) for obj in admin.get_query().all()]
+        self._lock.acquire()
+        try:
+            self._indexes[admin] = (timestamp, candidates)
+        finally:
+            self._lock.release()
+
+    def invalidate(self, entity):
+        """Remove the completions that might have changed because objects of
+        class entity have been changed, created or deleted"""
+        self._lock.acquire()
+        try:
+            for cache in (self._completions, self._indexes):
+                for admin in cache.keys():
+                    if issubclass(entity, admin.entity) or issubclass(admin.entity, entity):
+                        del cache[admin]
+        finally:
+            self._lock.release()
+
+_completion_cache_ = CompletionCache()
+
+def get_completion_cache():
+    """Get the completion cache shared by all editors"""
+    return _completion_cache_
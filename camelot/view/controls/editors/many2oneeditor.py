@@ -30,7 +30,7 @@ from camelot.view.art import Icon
 from camelot.view.model_thread import post
 from camelot.view.model_thread import gui_function
 from camelot.view.model_thread import model_function
-from camelot.view.search import create_entity_search_query_decorator
+from camelot.view.completions import get_completion_cache
 from camelot.view.controls.decorated_line_edit import DecoratedLineEdit
 
 from camelot.core.utils import ugettext as _
@@ -45,10 +45,22 @@ logger = logging.getLogger('camelot.view.controls.editors.many2oneeditor')
 
 
 class Many2OneEditor(CustomEditor, AbstractManyToOneEditor):
-    """Widget for editing many 2 one relations"""
+    """Widget for editing many 2 one relations
+
+    .. attribute:: completion_delay
+
+    the number of milliseconds to wait after the user stopped typing before
+    searching for completions
+
+    .. attribute:: completion_limit
+
+    the maximum number of completions shown
+    """
 
     new_icon = Icon('tango/16x16/actions/document-new.png')
     search_icon = Icon('tango/16x16/actions/system-search.png')
+    completion_delay = 150
+    completion_limit = 20
 
     class CompletionsModel(QtCore.QAbstractListModel):
 
@@ -132,6 +144,13 @@ class Many2OneEditor(CustomEditor, AbstractManyToOneEditor):
         self.completer.highlighted[QtCore.QModelIndex].connect(self.completion_highlighted)
         self.search_input.setCompleter(self.completer)
 
+        # only search for completions when the user stops typing
+        self._completion_text = u''
+        self.completion_timer = QtCore.QTimer(self)
+        self.completion_timer.setSingleShot(True)
+        self.completion_timer.setInterval(self.completion_delay)
+        self.completion_timer.timeout.connect(self.post_search_completions)
+
         # Setup layout
         self.layout.addWidget(self.search_input)
         self.layout.addWidget(self.search_button)
@@ -149,16 +168,21 @@ class Many2OneEditor(CustomEditor, AbstractManyToOneEditor):
 
     def textEdited(self, text):
         self._last_highlighted_entity_getter = None
-        text = self.search_input.user_input()
+        self._completion_text = unicode(self.search_input.user_input())
+        self.completion_timer.start()
+        self.completer.complete()
+
+    @QtCore.pyqtSlot()
+    def post_search_completions(self):
 
         def create_search_completion(text):
             return lambda: self.search_completions(text)
 
         post(
-            create_search_completion(unicode(text)),
-            self.display_search_completions
+            create_search_completion(self._completion_text),
+            self.display_search_completions,
+            supersede=(self, 'search_completions')
         )
-        self.completer.complete()
 
     @model_function
     def search_completions(self, text):
@@ -166,16 +190,28 @@ class Many2OneEditor(CustomEditor, AbstractManyToOneEditor):
 
         :return: a list of tuples of (object_representation, object_getter)
         """
-        search_decorator = create_entity_search_query_decorator(
-            self.admin, text
-        )
-        if search_decorator:
-            sresult = [
-                (unicode(e), create_constant_function(e))
-                for e in search_decorator(self.admin.entity.query).limit(20)
-            ]
-            return text, sresult
-        return text, []
+        if not len(text.strip()):
+            return text, []
+        cache = get_completion_cache()
+        if self.admin.preload_completions:
+            cache.preload(self.admin)
+        objects = cache.get(self.admin, text, self.completion_limit)
+        if objects == None:
+            search_decorator = self.admin.get_search_backend().create_query_decorator(
+                text
+            )
+            if not search_decorator:
+                return text, []
+            query = search_decorator(self.admin.entity.query)
+            # query one more object, to know if all matches are in the cache
+            objects = list(query.limit(self.completion_limit + 1))
+            complete = len(objects) <= self.completion_limit
+            objects = objects[:self.completion_limit]
+            cache.set(self.admin, text, objects, complete)
+        sresult = [
+            (unicode(e), create_constant_function(e)) for e in objects
+        ]
+        return text, sresult
 
     @gui_function
     def display_search_completions(self, prefix_and_completions):
@@ -32,7 +32,8 @@ from wideeditor import WideEditor
 from customeditor import CustomEditor
 
 from camelot.view.art import Icon
-from camelot.view.model_thread import gui_function, model_function, post
+from camelot.view.model_thread import gui_function, model_function, post, \
+                                      PRIORITY_LOW
 from camelot.core.utils import ugettext as _
 from camelot.view import register
 
@@ -129,16 +130,23 @@ class One2ManyEditor(CustomEditor, WideEditor):
         layout.addLayout( button_layout )
 
     def exportToExcel( self ):
-        from camelot.view.export.excel import open_data_with_excel
+        from camelot.view.export.excel import save_data, ask_export_filename
+        from camelot.view.controls.progress_dialog import ProgressDialog
+        filename = ask_export_filename( self, _('Export to spreadsheet') )
+        if not filename:
+            return
+        progress = ProgressDialog(_('Export to spreadsheet'), cancelable=True)
 
         def export():
             title = self.admin.get_verbose_name_plural()
             columns = self.admin.get_columns()
             if self.model:
-                data = list( self.model.getData() )
-                open_data_with_excel( title, columns, data )
+                save_data( filename, title, columns, self.model.getData(),
+                           progress.progress, self.model.getRowCount() )
+            return True
 
-        post( export )
+        post( export, progress.finished, progress.exception, priority = PRIORITY_LOW )
+        progress.exec_()
 
     def getModel( self ):
         return self.model
@@ -171,8 +179,11 @@ class One2ManyEditor(CustomEditor, WideEditor):
 # The segfault seems no longer there after disabling the
 # editor before setting a new model, but the code below
 # seems to have no effect.
+        if _row == None:
+            # the new object is filtered out
+            return
         index = self.model.index( _row, 0 )
-        self.table.scrollToBottom()
+        self.table.scrollTo( index )
         self.table.setCurrentIndex( index )
         self.table.edit( index )
 
@@ -0,0 +1,114 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""A view showing the tasks of the model thread that take the most time,
+as recorded by the model thread profiler"""
+
+from PyQt4 import QtGui, QtCore
+from PyQt4.QtCore import Qt
+
+from camelot.core.utils import ugettext as _
+from camelot.core.utils import ugettext_lazy
+from camelot.view.model_thread import post
+
+class ModelThreadMonitor(QtGui.QWidget):
+    """Widget that shows the percentiles of the run time of each task of the
+    model thread, updated every second"""
+
+    columns = [ ('name', ugettext_lazy('Task')),
+                ('count', ugettext_lazy('Count')),
+                ('p50', ugettext_lazy('Median (ms)')),
+                ('p90', ugettext_lazy('90% (ms)')),
+                ('p99', ugettext_lazy('99% (ms)')),
+                ('max', ugettext_lazy('Maximum (ms)')),
+                ('sql_p90', ugettext_lazy('SQL 90% (ms)')) ]
+
+    def __init__(self, profiler, parent = None):
+        """:param profiler: the ModelThreadProfiler of the model thread"""
+        QtGui.QWidget.__init__(self, parent)
+        self.setWindowTitle(_('Model thread monitor'))
+        self._profiler = profiler
+        layout = QtGui.QVBoxLayout()
+        self.queue_label = QtGui.QLabel()
+        layout.addWidget(self.queue_label)
+        self.table = QtGui.QTableWidget(0, len(self.columns))
+        self.table.setHorizontalHeaderLabels([unicode(header) for _key, header in self.columns])
+        self.table.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table)
+        export_button = QtGui.QPushButton(_('Export trace'))
+        export_button.clicked.connect(self.export_trace)
+        layout.addWidget(export_button)
+        self.setLayout(layout)
+        self._timer = self.startTimer(1000)
+        self.update_statistics()
+
+    def timerEvent(self, event):
+        self.update_statistics()
+
+    def closeEvent(self, event):
+        self.killTimer(self._timer)
+        QtGui.QWidget.closeEvent(self, event)
+
+    @QtCore.pyqtSlot()
+    def update_statistics(self):
+        """Show the latest statistics of the profiler"""
+
+        def milliseconds(value):
+            if value == None:
+                return u''
+            return u'%.1f'%(value * 1000)
+
+        queue_times = self._profiler.get_queue_time_percentiles()
+        self.queue_label.setText(_('Time waiting in the queue (ms) : median %s, 90%% %s, 99%% %s')%(
+            milliseconds(queue_times['p50']),
+            milliseconds(queue_times['p90']),
+            milliseconds(queue_times['p99'])))
+        summary = self._profiler.get_summary()
+        self.table.setRowCount(len(summary))
+        for row, task_summary in enumerate(summary):
+            for column, (key, _header) in enumerate(self.columns):
+                value = task_summary[key]
+                if key == 'name':
+                    text = value
+                elif key == 'count':
+                    text = unicode(value)
+                else:
+                    text = milliseconds(value)
+                item = QtGui.QTableWidgetItem(text)
+                if key != 'name':
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+    @QtCore.pyqtSlot()
+    def export_trace(self):
+        """Ask for a file name and export the recorded tasks in the Chrome
+        trace event format"""
+        filename = QtGui.QFileDialog.getSaveFileName(self,
+                                                     _('Export trace'),
+                                                     'trace.json',
+                                                     _('Trace files (*.json)'))
+        if filename:
+            profiler = self._profiler
+            filename = unicode(filename)
+            post(lambda:profiler.export_chrome_trace(filename))
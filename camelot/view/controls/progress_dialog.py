@@ -39,14 +39,48 @@ class ProgressDialog(QtGui.QProgressDialog):
     post(my_function, p.finished, p.exception)
     d.exec_()
     
+    my_function can call the progress method of the dialog to show how
+    far it got.  If the dialog is cancelable, the progress method returns
+    False when the user pressed the cancel button, after which my_function
+    should stop.
     """
 
-    def __init__(self, name, icon=Icon('tango/32x32/actions/appointment-new.png')):
+    update_progress_signal = QtCore.pyqtSignal(int, int)
+    
+    def __init__(self, name, icon=Icon('tango/32x32/actions/appointment-new.png'), cancelable=False):
         QtGui.QProgressDialog.__init__( self, QtCore.QString(), QtCore.QString(), 0, 0 )
         label = QtGui.QLabel(unicode(name))
         #label.setPixmap(icon.getQPixmap())
         self.setLabel(label)
         self.setWindowTitle( _('Please wait') )
+        self.setAutoClose( False )
+        self.setAutoReset( False )
+        self.was_canceled = False
+        if cancelable:
+            self.setCancelButtonText( _('Cancel') )
+            self.canceled.connect( self.cancel_requested )
+        self.update_progress_signal.connect( self.update_progress )
+        
+    @QtCore.pyqtSlot()
+    def cancel_requested(self):
+        self.was_canceled = True
+        
+    @QtCore.pyqtSlot(int, int)
+    def update_progress(self, value, maximum):
+        self.setMaximum( maximum )
+        self.setValue( value )
+        
+    def progress(self, value, maximum=None):
+        """Update the progress, this method can be called from within the
+        model thread.
+        :param value: the number of steps done
+        :param maximum: the total number of steps, None if unknown
+        :return: False if the user canceled the progress dialog
+        """
+        if maximum == None:
+            maximum = 0
+        self.update_progress_signal.emit( min(value, maximum), maximum )
+        return not self.was_canceled
 
     def finished(self, success):
         self.close()
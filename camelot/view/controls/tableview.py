@@ -100,6 +100,7 @@ and above the text.
         self.setVerticalScrollMode(QtGui.QAbstractItemView.ScrollPerPixel)
         self.horizontalHeader().sectionClicked.connect(
             self.horizontal_section_clicked )
+        self.verticalScrollBar().valueChanged.connect( self._vertical_scroll )
         if columns_frozen:
             frozen_table_view = FrozenTableWidget(self, columns_frozen)
             frozen_table_view.setObjectName( 'frozen_table_view' )
@@ -141,6 +142,25 @@ and above the text.
     def resizeEvent(self, event):
         super(TableWidget, self).resizeEvent(event)
         self._update_frozen_table()
+        self._update_viewport()
+
+    @QtCore.pyqtSlot(int)
+    def _vertical_scroll(self, value):
+        self._update_viewport()
+
+    def _update_viewport(self):
+        """Inform the model about the rows that are visible, to enable
+        it to fetch the rows that will become visible next"""
+        model = self.model()
+        if not model or not hasattr( model, 'set_viewport' ):
+            return
+        first_row = self.rowAt( 0 )
+        if first_row < 0:
+            return
+        last_row = self.rowAt( self.viewport().height() - 1 )
+        if last_row < 0:
+            last_row = model.rowCount() - 1
+        model.set_viewport( first_row, last_row )
 
     def moveCursor(self, cursorAction, modifiers):
         current = super(TableWidget, self).moveCursor(cursorAction, modifiers)
@@ -232,6 +252,7 @@ and above the text.
             self._update_frozen_table()
         register.register( model, self )
         self.selectionModel().currentChanged.connect( self.activated )
+        self._update_viewport()
 
     @QtCore.pyqtSlot(QtCore.QModelIndex, QtCore.QModelIndex)
     def activated( self, selectedIndex, previousSelectedIndex ):
@@ -395,6 +416,7 @@ class TableView( AbstractView  ):
     def __init__( self, admin, search_text = None, parent = None ):
         super(TableView, self).__init__( parent )
         self.admin = admin
+        self.search_text = None
         post( self.get_title, self.change_title )
         widget_layout = QtGui.QVBoxLayout()
         if self.header_widget:
@@ -429,7 +451,6 @@ class TableView( AbstractView  ):
         splitter.addWidget( table_widget )
         splitter.addWidget( filters_widget )
         self.setLayout( widget_layout )
-        self.search_filter = lambda q: q
         shortcut = QtGui.QShortcut(QtGui.QKeySequence(QtGui.QKeySequence.Find), self)
         shortcut.activated.connect( self.activate_search )
         if self.header_widget:
@@ -592,6 +613,41 @@ class TableView( AbstractView  ):
         for d in self._table_model.getData():
             yield d
 
+    @model_function
+    def get_row_count( self ):
+        return self._table_model.getRowCount()
+
+    @model_function
+    def export_to_excel( self, progress = None, filename = None ):
+        """Export the data of the view to excel or to filename, when
+        settings.EXPORT_PROCESSES is larger than 1, large queries that are not
+        sorted are exported by a pool of processes, see
+        camelot.view.export.parallel"""
+        from camelot.view.export import parallel
+        from camelot.view.export.engines import XlsxEngine, get_export_engine
+        engine_class = XlsxEngine
+        if filename:
+            engine_class = get_export_engine( filename )
+        if engine_class and parallel.get_export_processes() > 1 and isinstance( self._table_model, QueryTableProxy ):
+            query_getter = self._table_model.get_query_getter()
+            columns = self.getColumns()
+            total = self.get_row_count()
+            query = query_getter and query_getter()
+            if query and total > parallel.partition_size and \
+               parallel.can_export_query( self.admin, engine_class, columns, query ):
+                from camelot.view.export.excel import open_file_with_excel, XlsEngine
+                if not filename:
+                    import os
+                    import tempfile
+                    xlsx_fd, filename = tempfile.mkstemp( suffix = XlsxEngine.suffix )
+                    os.close( xlsx_fd )
+                if parallel.export_query( engine_class( filename ), self.getTitle(), columns,
+                                          self.admin, query, progress, total ):
+                    if engine_class.suffix in ( XlsEngine.suffix, XlsxEngine.suffix ):
+                        open_file_with_excel( filename )
+                return
+        super( TableView, self ).export_to_excel( progress, filename )
+
     def getTitle( self ):
         """return the name of the entity managed by the admin attribute"""
         return self.admin.get_verbose_name()
@@ -631,6 +687,7 @@ class TableView( AbstractView  ):
     def rebuild_query( self ):
         """resets the table model query"""
         from filterlist import FilterList
+        search_text = self.search_text
 
         def rebuild_query():
             query = self.admin.get_query()
@@ -640,26 +697,29 @@ class TableView( AbstractView  ):
             filters = self.findChild(FilterList, 'filters')
             if filters:
                 query = filters.decorate_query( query )
-            if self.search_filter:
-                query = self.search_filter( query )
+            if search_text:
+                search_filter = self.admin.get_search_backend().create_query_decorator( search_text )
+                if search_filter:
+                    query = search_filter( query )
             query_getter = lambda:query
             return query_getter
 
-        post( rebuild_query, self._set_query )
+        # only the last query matters when the search text is changed
+        # repeatedly, so pending rebuilds are superseded
+        post( rebuild_query, self._set_query, supersede = ( self, 'rebuild_query' ) )
 
     @QtCore.pyqtSlot(str)
     def startSearch( self, text ):
         """rebuilds query based on filtering text"""
-        from camelot.view.search import create_entity_search_query_decorator
         logger.debug( 'search %s' % text )
-        self.search_filter = create_entity_search_query_decorator( self.admin, unicode(text) )
+        self.search_text = unicode(text)
         self.rebuild_query()
 
     @QtCore.pyqtSlot()
     def cancelSearch( self ):
         """resets search filtering to default"""
         logger.debug( 'cancel search' )
-        self.search_filter = lambda q: q
+        self.search_text = None
         self.rebuild_query()
 
     @model_function
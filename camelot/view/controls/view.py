@@ -71,12 +71,31 @@ class AbstractView(QtGui.QWidget):
         open_html_in_word(html)
 
     @model_function
-    def export_to_excel(self):
-        from camelot.view.export.excel import open_data_with_excel
+    def get_row_count(self):
+        """:return: the number of rows returned by getData, None if this
+        is not known"""
+        return None
+
+    @model_function
+    def export_to_excel(self, progress=None, filename=None):
+        """Export the data of the view to excel, the data is written while
+        it is read, so it does not need to be in memory at once
+        :param progress: a function that is called with the number of rows
+        exported and the total number of rows, and returns False if the export
+        should be canceled, eg. the progress method of a ProgressDialog
+        :param filename: the name of the file to export to, its suffix
+        determines the format, see camelot.view.export.engines.  When None,
+        the data is exported to a temporary spreadsheet.
+        """
+        from camelot.view.export.excel import open_data_with_excel, save_data
         title = self.getTitle()
         columns = self.getColumns()
-        data = [d for d in self.getData()]
-        open_data_with_excel(title, columns, data)
+        if filename:
+            save_data(filename, title, columns, self.getData(),
+                      progress, self.get_row_count())
+        else:
+            open_data_with_excel(title, columns, self.getData(), 
+                                 progress, self.get_row_count())
 
     @model_function
     def export_to_mail(self):
@@ -119,8 +138,8 @@ class TabView(AbstractView):
         for view, title in views_and_titles:
             self._tab_widget.addTab(view, title)
 
-    def export_to_excel(self):
-        return self._tab_widget.currentWidget().export_to_excel()
+    def export_to_excel(self, progress=None, filename=None):
+        return self._tab_widget.currentWidget().export_to_excel(progress, filename)
 
     def export_to_word(self):
         return self._tab_widget.currentWidget().export_to_word()
@@ -0,0 +1,549 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""Engines that write exported data to a file in a specific format.
+
+An engine is created for a file, and receives the title and the columns
+first, then the rows in chunks, so the data does not need to be in memory
+at once.  The type of each column is determined once from its field
+attributes, after which each value is converted with the writer of its
+column.
+
+The available engines are :
+
+ * XlsEngine : Excel 97 files, limited to 65536 rows, using xlwt
+ * XlsxEngine : Excel 2007 files, written as xml without any limit on the
+   number of rows
+ * CsvEngine and TsvEngine : comma or tab separated text files
+ * ColumnarEngine : a zip file with a numpy array per column and per chunk
+   of rows, that can be read with numpy.load, for big dumps that are
+   analyzed column by column.  This engine requires numpy.
+"""
+
+import codecs
+import csv
+import datetime
+import logging
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+LOGGER = logging.getLogger('camelot.view.export.engines')
+
+def get_column_type(field_attributes):
+    """:return: the python type used to export the values of a field, one of
+    float, int, bool, datetime.date, datetime.datetime or unicode"""
+    python_type = field_attributes.get('python_type')
+    delegate = field_attributes.get('delegate')
+    if python_type in (float, int, bool):
+        return python_type
+    if delegate:
+        from camelot.view.controls import delegates
+        if issubclass(delegate, delegates.DateDelegate):
+            return datetime.date
+        if issubclass(delegate, delegates.DateTimeDelegate):
+            return datetime.datetime
+    if python_type in (datetime.date, datetime.datetime):
+        return python_type
+    return unicode
+
+def value_to_unicode(value):
+    """Convert a value that is not of the type of its column to unicode"""
+    # this is to handle fields of type code
+    if isinstance(value, list):
+        return u'.'.join(value)
+    return unicode(value)
+
+class ExportEngine(object):
+    """Base class for export engines.
+
+    .. attribute:: suffix
+
+    the suffix of the files written by the engine
+
+    .. attribute:: description
+
+    the name of the file format, as shown to the user when choosing the
+    format
+
+    .. attribute:: max_rows
+
+    the maximum number of rows the engine can write, None if there is no
+    such limit
+
+    .. attribute:: parts
+
+    True if the engine can write parts of a file separately, with the
+    start_part and finish_part methods, after which those parts are added
+    to the complete file in order with the append_part method
+    """
+
+    suffix = None
+    description = None
+    max_rows = None
+    parts = False
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.rows_written = 0
+
+    @classmethod
+    def is_available(cls):
+        """:return: True if the libraries needed by the engine are
+        installed"""
+        return True
+
+    def start(self, title, columns):
+        """Start writing the file
+        :param title: the title of the exported data
+        :param columns: a list of (field_name, field_attributes) tuples
+        """
+        raise NotImplementedError()
+
+    def write_rows(self, rows):
+        """Write a chunk of rows, each row is a list of values"""
+        if self.max_rows != None and self.rows_written + len(rows) > self.max_rows:
+            raise Exception('The %s format cannot contain more than %i rows'%(self.suffix, self.max_rows))
+        self.rows_written += len(rows)
+
+    def finish(self):
+        """Finish writing the file"""
+        raise NotImplementedError()
+
+    def start_part(self, columns, offset):
+        """Start writing a part of a file
+        :param columns: a list of (field_name, field_attributes) tuples
+        :param offset: the number of rows before this part in the file
+        """
+        raise NotImplementedError()
+
+    def finish_part(self):
+        """Finish writing a part of a file"""
+        raise NotImplementedError()
+
+    def append_part(self, filename, rows):
+        """Add a part written by another engine to the file
+        :param filename: the file with the part
+        :param rows: the number of rows in the part
+        """
+        raise NotImplementedError()
+
+    def abort(self):
+        """Stop writing the file, and remove what was written"""
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+class CsvEngine(ExportEngine):
+    """Write comma separated values, encoded as UTF-8, with a byte order mark
+    to make spreadsheets recognize the encoding.  The first row contains the
+    names of the columns."""
+
+    suffix = '.csv'
+    description = 'Comma separated values'
+    delimiter = ','
+    parts = True
+
+    def start_part(self, columns, offset):
+        self._file = open(self.filename, 'wb')
+        self._writer = csv.writer(self._file, delimiter=self.delimiter)
+        self._converters = [self.create_converter(attributes) for _name, attributes in columns]
+
+    def start(self, title, columns):
+        self.start_part(columns, 0)
+        self._file.write(codecs.BOM_UTF8)
+        self._writer.writerow([unicode(attributes['name']).encode('utf-8') for _name, attributes in columns])
+
+    def append_part(self, filename, rows):
+        part = open(filename, 'rb')
+        try:
+            shutil.copyfileobj(part, self._file)
+        finally:
+            part.close()
+        self.rows_written += rows
+
+    def create_converter(self, field_attributes):
+        """:return: a function that converts a value of a column to a utf-8
+        encoded string"""
+        column_type = get_column_type(field_attributes)
+        if column_type == float:
+            format_string = u'%%.%if'%field_attributes.get('precision', 2)
+            return lambda value:format_string%value
+        elif column_type in (int, bool):
+            return lambda value:str(int(value))
+        elif column_type in (datetime.date, datetime.datetime):
+            return lambda value:value.isoformat()
+        return lambda value:value_to_unicode(value).encode('utf-8')
+
+    def write_rows(self, rows):
+        super(CsvEngine, self).write_rows(rows)
+        converters = self._converters
+        writerow = self._writer.writerow
+        for row in rows:
+            writerow([('' if value == None else converter(value)) for converter, value in zip(converters, row)])
+
+    def finish(self):
+        self._file.close()
+
+    finish_part = finish
+
+    def abort(self):
+        self._file.close()
+        super(CsvEngine, self).abort()
+
+class TsvEngine(CsvEngine):
+    """Write tab separated values"""
+
+    suffix = '.tsv'
+    description = 'Tab separated values'
+    delimiter = '\t'
+
+_invalid_xml_characters_ = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_excel_epoch_ = datetime.datetime(1899, 12, 30)
+
+def column_letters(column):
+    """:return: the letters of a column in a spreadsheet, starting from 0"""
+    letters = ''
+    column = column + 1
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def excel_serial_number(value):
+    """:return: the number representing a date or a datetime in a spreadsheet"""
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+    delta = value - _excel_epoch_
+    return delta.days + (delta.seconds + delta.microseconds / 1000000.0) / 86400.0
+
+class XlsxEngine(ExportEngine):
+    """Write an Excel 2007 workbook with a single sheet.  The rows of the
+    sheet are written to a temporary file while exporting, which is
+    compressed into the workbook when the export is finished.  Strings are
+    written inline, so no table with all strings needs to be kept in memory.
+    """
+
+    suffix = '.xlsx'
+    description = 'Excel 2007 workbook'
+    max_rows = 1048576 - 3
+    font_name = 'Arial'
+    font_size = 10
+    parts = True
+
+    def _start_sheet(self, sheet, columns, offset):
+        self._sheet = sheet
+        # the number formats used, the style of a format is its index + 2,
+        # style 0 is the default style and style 1 is the bold style
+        self._number_formats = []
+        self._cell_writers = [self.create_cell_writer(i, attributes) for i, (_name, attributes) in enumerate(columns)]
+        # the data starts after the title and the header
+        self._row = offset + 3
+
+    def start_part(self, columns, offset):
+        self._sheet_filename = self.filename
+        self._start_sheet(open(self.filename, 'wb'), columns, offset)
+
+    def finish_part(self):
+        self._sheet.close()
+
+    def append_part(self, filename, rows):
+        part = open(filename, 'rb')
+        try:
+            shutil.copyfileobj(part, self._sheet)
+        finally:
+            part.close()
+        self.rows_written += rows
+
+    def start(self, title, columns):
+        sheet_fd, self._sheet_filename = tempfile.mkstemp(suffix='.xml')
+        self._start_sheet(os.fdopen(sheet_fd, 'wb'), columns, 0)
+        self._row = 0
+        self._sheet.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                          '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                          '<cols>')
+        for i, (_name, attributes) in enumerate(columns):
+            self._sheet.write('<col min="%i" max="%i" width="%i" customWidth="1"/>'%(i+1, i+1, max(len(unicode(attributes['name'])) + 2, 10)))
+        self._sheet.write('</cols><sheetData>')
+        # the layout is the same as the one of the xls export, with the
+        # title in the first row and the header in the third row
+        self._write_row([self._create_text_cell(0, title, 1)])
+        self._row += 1
+        self._write_row([self._create_text_cell(i, attributes['name'], 1) for i, (_name, attributes) in enumerate(columns)])
+
+    def _create_text_cell(self, column, value, style=0):
+        text = _invalid_xml_characters_.sub(u'', unicode(value))
+        return u'<c r="%s%i" t="inlineStr" s="%i"><is><t xml:space="preserve">%s</t></is></c>'%(column_letters(column), self._row + 1, style, escape(text))
+
+    def _write_row(self, cells):
+        self._row += 1
+        self._sheet.write((u'<row r="%i">%s</row>'%(self._row, u''.join(cells))).encode('utf-8'))
+
+    def _get_style(self, number_format):
+        if number_format not in self._number_formats:
+            self._number_formats.append(number_format)
+        return self._number_formats.index(number_format) + 2
+
+    def create_cell_writer(self, column, field_attributes):
+        """:return: a function that takes a value of a column, and returns
+        the xml of its cell"""
+        column_type = get_column_type(field_attributes)
+        letters = column_letters(column)
+        if column_type == float:
+            style = self._get_style('0.' + '0' * field_attributes.get('precision', 2))
+            return lambda value:u'<c r="%s%i" s="%i"><v>%r</v></c>'%(letters, self._row + 1, style, float(value))
+        elif column_type == int:
+            return lambda value:u'<c r="%s%i"><v>%i</v></c>'%(letters, self._row + 1, value)
+        elif column_type == bool:
+            return lambda value:u'<c r="%s%i" t="b"><v>%i</v></c>'%(letters, self._row + 1, bool(value))
+        elif column_type in (datetime.date, datetime.datetime):
+            number_format = field_attributes.get('format')
+            if not number_format:
+                from camelot.view.utils import local_date_format
+                number_format = local_date_format()
+            style = self._get_style(number_format)
+            return lambda value:u'<c r="%s%i" s="%i"><v>%r</v></c>'%(letters, self._row + 1, style, excel_serial_number(value))
+        return lambda value:self._create_text_cell(column, value_to_unicode(value))
+
+    def write_rows(self, rows):
+        super(XlsxEngine, self).write_rows(rows)
+        cell_writers = self._cell_writers
+        for row in rows:
+            self._write_row([cell_writer(value) for cell_writer, value in zip(cell_writers, row) if value != None])
+
+    def _get_styles(self):
+        number_formats = u''.join(u'<numFmt numFmtId="%i" formatCode=%s/>'%(i+164, quoteattr(number_format)) for i, number_format in enumerate(self._number_formats))
+        number_format_styles = u''.join(u'<xf numFmtId="%i" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'%(i+164) for i in range(len(self._number_formats)))
+        return (u'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                u'<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                u'<numFmts count="%i">%s</numFmts>'
+                u'<fonts count="2"><font><sz val="%i"/><name val=%s/></font><font><b/><sz val="%i"/><name val=%s/></font></fonts>'
+                u'<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+                u'<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+                u'<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+                u'<cellXfs count="%i"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+                u'<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>%s</cellXfs>'
+                u'<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+                u'</styleSheet>')%(len(self._number_formats), number_formats,
+                                   self.font_size, quoteattr(self.font_name),
+                                   self.font_size, quoteattr(self.font_name),
+                                   len(self._number_formats) + 2, number_format_styles)
+
+    def finish(self):
+        self._sheet.write('</sheetData></worksheet>')
+        self._sheet.close()
+        try:
+            workbook = zipfile.ZipFile(self.filename, 'w', zipfile.ZIP_DEFLATED, True)
+            try:
+                workbook.writestr('[Content_Types].xml',
+                                  '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                                  '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                                  '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                                  '<Default Extension="xml" ContentType="application/xml"/>'
+                                  '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                                  '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                                  '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                                  '</Types>')
+                workbook.writestr('_rels/.rels',
+                                  '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                                  '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                                  '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+                                  '</Relationships>')
+                workbook.writestr('xl/workbook.xml',
+                                  '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                                  '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                                  'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+                                  '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>'
+                                  '</workbook>')
+                workbook.writestr('xl/_rels/workbook.xml.rels',
+                                  '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                                  '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                                  '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+                                  '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+                                  '</Relationships>')
+                workbook.writestr('xl/styles.xml', self._get_styles().encode('utf-8'))
+                workbook.write(self._sheet_filename, 'xl/worksheets/sheet1.xml')
+            finally:
+                workbook.close()
+        finally:
+            os.remove(self._sheet_filename)
+
+    def abort(self):
+        self._sheet.close()
+        os.remove(self._sheet_filename)
+        super(XlsxEngine, self).abort()
+
+class ColumnarEngine(ExportEngine):
+    """Write a zip file with a numpy array for each column and each chunk of
+    rows, named after the index of the column and the chunk, eg. 
+    '3.0.npy' for the first chunk of the fourth column.  The zip file can
+    be read with numpy.load.  The names of the columns are stored in
+    the 'columns' array.  Numbers are stored as floats, with NaN for
+    empty values, dates as datetime64, and other values as unicode.
+    """
+
+    suffix = '.npz'
+    description = 'Numpy arrays'
+    parts = True
+
+    @classmethod
+    def is_available(cls):
+        """datetime64 arrays can only be created since numpy 1.7"""
+        try:
+            import numpy
+        except ImportError:
+            return False
+        version = tuple(int(v) for v in numpy.__version__.split('.')[:2])
+        return version >= (1, 7)
+
+    def start_part(self, columns, offset):
+        import numpy
+        self._numpy = numpy
+        self._archive = zipfile.ZipFile(self.filename, 'w', zipfile.ZIP_DEFLATED, True)
+        self._chunk = 0
+        self._converters = [self.create_converter(attributes) for _name, attributes in columns]
+
+    def start(self, title, columns):
+        self.start_part(columns, 0)
+        names = [unicode(attributes['name']) for _name, attributes in columns]
+        self._write_array('columns', self._numpy.array(names, dtype=unicode))
+
+    def append_part(self, filename, rows):
+        part = zipfile.ZipFile(filename, 'r')
+        try:
+            chunks = 0
+            for name in part.namelist():
+                column, chunk, suffix = name.split('.')
+                chunks = max(chunks, int(chunk) + 1)
+                self._archive.writestr('%s.%i.%s'%(column, self._chunk + int(chunk), suffix), part.read(name))
+            self._chunk += chunks
+        finally:
+            part.close()
+        self.rows_written += rows
+
+    def _write_array(self, name, array):
+        array_fd, array_filename = tempfile.mkstemp(suffix='.npy')
+        try:
+            array_file = os.fdopen(array_fd, 'wb')
+            try:
+                self._numpy.lib.format.write_array(array_file, array)
+            finally:
+                array_file.close()
+            self._archive.write(array_filename, name + '.npy')
+        finally:
+            os.remove(array_filename)
+
+    def create_converter(self, field_attributes):
+        """:return: a function that converts a list of values of a column to
+        a numpy array"""
+        numpy = self._numpy
+        column_type = get_column_type(field_attributes)
+        if column_type in (float, int, bool):
+            return lambda values:numpy.array([(numpy.nan if value == None else float(value)) for value in values], dtype=float)
+        elif column_type == datetime.date:
+            return lambda values:numpy.array([(value.isoformat() if value != None else 'NaT') for value in values], dtype='datetime64[D]')
+        elif column_type == datetime.datetime:
+            return lambda values:numpy.array([(value.isoformat() if value != None else 'NaT') for value in values], dtype='datetime64[us]')
+        return lambda values:numpy.array([(value_to_unicode(value) if value != None else u'') for value in values], dtype=unicode)
+
+    def write_rows(self, rows):
+        super(ColumnarEngine, self).write_rows(rows)
+        if not len(rows):
+            return
+        for i, (converter, values) in enumerate(zip(self._converters, zip(*rows))):
+            self._write_array('%i.%i'%(i, self._chunk), converter(values))
+        self._chunk += 1
+
+    def finish(self):
+        self._archive.close()
+
+    finish_part = finish
+
+    def abort(self):
+        self._archive.close()
+        super(ColumnarEngine, self).abort()
+
+def get_export_engines():
+    """:return: a list with the available engine classes, the default
+    engine first"""
+    from camelot.view.export.excel import XlsEngine
+    return [engine for engine in (XlsxEngine, XlsEngine, CsvEngine, TsvEngine, ColumnarEngine) if engine.is_available()]
+
+def get_export_engine(filename):
+    """:return: the available engine class to write a file, based on the
+    suffix of its name, None if there is no such engine"""
+    suffix = os.path.splitext(filename)[1].lower()
+    for engine in get_export_engines():
+        if engine.suffix == suffix:
+            return engine
+
+def get_file_filter():
+    """:return: the filter for a file dialog, with the file formats of the
+    available engines"""
+    return u';;'.join(u'%s (*%s)'%(engine.description, engine.suffix) for engine in get_export_engines())
+
+def get_export_filename(filename, selected_filter=None):
+    """:param selected_filter: the entry of the file filter selected in
+    the file dialog
+    :return: filename, with the suffix of the selected engine appended when
+    it has no suffix of an available engine"""
+    if get_export_engine(filename) != None:
+        return filename
+    engines = get_export_engines()
+    for engine in engines:
+        if selected_filter and selected_filter.endswith(u'(*%s)'%engine.suffix):
+            return filename + engine.suffix
+    return filename + engines[0].suffix
+
+def export_data(engine, title, columns, data, progress=None, total=None, chunk_size=1000):
+    """Export data through an engine, in chunks of rows
+    :param engine: an ExportEngine
+    :param columns: a list of (field_name, field_attributes) tuples
+    :param data: an iterator over the rows to export
+    :param progress: a function that is called with the number of rows
+    written and the total number of rows, and returns False if the export
+    should be canceled
+    :param total: the total number of rows in data, None if unknown
+    :return: True if the file was written, False if the export was canceled
+    """
+    engine.start(title, columns)
+    try:
+        rows = []
+        for row in data:
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                engine.write_rows(rows)
+                rows = []
+                if progress and not progress(engine.rows_written, total):
+                    LOGGER.info(u'export canceled : %s'%title)
+                    engine.abort()
+                    return False
+        engine.write_rows(rows)
+        engine.finish()
+    except Exception:
+        engine.abort()
+        raise
+    return True
@@ -24,11 +24,14 @@
 
 import logging
 import datetime
+import os
 import settings
 LOGGER = logging.getLogger('camelot.view.export.excel')
 
-from camelot.view.controls import delegates
 from camelot.view.utils import local_date_format
+from camelot.view.export.engines import ExportEngine, XlsxEngine, \
+                                        export_data, get_column_type, \
+                                        value_to_unicode, get_export_engine
 
 # previously used pyExcelerator, but this gave errors opening the generated documents in Excel 2010
 from xlwt import Font, Borders, XFStyle, Pattern, Workbook, ExcelFormula
@@ -145,11 +148,63 @@ headerStyle.pattern = pat1
 topleftCellStyle.pattern = pat1
 toprightCellStyle.pattern = pat1
 
-def open_data_with_excel(title, headerList, dataList):
-    import sys
+# the number of rows after which the progress is reported, and the rows
+# written are serialized to free their memory
+chunk_size = 1000
+
+def open_data_with_excel(title, headerList, dataList, progress=None, total=None):
+    """Export data to excel and open the resulting file, the xls format is
+    used if it can contain all rows, otherwise the xlsx format is used
+    :param progress: a function that is called with the number of rows
+    written and the total number of rows, and returns False if the export
+    should be canceled
+    :param total: the total number of rows in dataList, None if unknown
+    """
     import tempfile
-    _xls_fd, xls_fn = tempfile.mkstemp(suffix='.xls')
-    write_data_to_excel(xls_fn, title, headerList, dataList)
+    if total != None and total <= XlsEngine.max_rows:
+        engine_class = XlsEngine
+    else:
+        engine_class = XlsxEngine
+    xls_fd, xls_fn = tempfile.mkstemp(suffix=engine_class.suffix)
+    os.close(xls_fd)
+    if not export_data(engine_class(xls_fn), title, headerList, dataList, progress, total, chunk_size):
+        return
+    open_file_with_excel(xls_fn)
+
+def save_data(filename, title, headerList, dataList, progress=None, total=None):
+    """Export data to a file, in the format that matches the suffix of the
+    filename, spreadsheets are opened after they were written
+    :param progress: a function that is called with the number of rows
+    written and the total number of rows, and returns False if the export
+    should be canceled
+    :param total: the total number of rows in dataList, None if unknown
+    """
+    engine_class = get_export_engine(filename)
+    if engine_class == None:
+        raise Exception('Cannot export to a %s file'%os.path.splitext(filename)[1])
+    if not export_data(engine_class(filename), title, headerList, dataList, progress, total, chunk_size):
+        return
+    if engine_class.suffix in (XlsEngine.suffix, XlsxEngine.suffix):
+        open_file_with_excel(filename)
+
+def ask_export_filename(parent, caption):
+    """Show a file dialog to choose the name and the format of the file to
+    export to
+    :return: the name of the file, None if the dialog was canceled"""
+    from PyQt4 import QtGui, QtCore
+    from camelot.view.export.engines import get_file_filter, \
+                                            get_export_filename
+    filename, selected_filter = QtGui.QFileDialog.getSaveFileNameAndFilter(
+        parent, caption, QtCore.QString(), get_file_filter()
+    )
+    if not filename:
+        return None
+    return get_export_filename(unicode(filename), unicode(selected_filter))
+
+def open_file_with_excel(xls_fn):
+    """Open an exported file with excel, or with the default application
+    on other platforms than windows"""
+    import sys
     from PyQt4 import QtGui, QtCore
     if not 'win' in sys.platform:
         QtGui.QDesktopServices.openUrl(QtCore.QUrl('file://%s' % xls_fn))
@@ -161,114 +216,144 @@ def open_data_with_excel(title, headerList, dataList):
         excel_app.Visible = True
         excel_app.Workbooks.Open(xls_fn)
 
-def write_data_to_excel(filename, title, headerList, data_list):
+def _create_style(font, borders, format_str):
+    style = XFStyle()
+    style.font = font
+    style.borders = borders
+    style.num_format_str = format_str
+    return style
+
+def create_column_writer(ws, column, number_of_columns, field_attributes):
+    """Create a function that writes the values of a column, the format and
+    the style of the column are determined once, instead of for each cell.
+    
+    :return: a function that takes a row, a value and a boolean indicating
+    if this is the last row, and returns the number of characters written
+    """
+    column_type = get_column_type(field_attributes)
+    format_str = '0'
+    length = None
+    if column_type == float:
+        format_str = '0.' + '0' * field_attributes.get('precision', 2)
+    elif column_type in (datetime.date, datetime.datetime):
+        format_str = field_attributes.get('format') or local_date_format()
+    elif field_attributes['python_type'] == str:
+        length = field_attributes.get('length')
+    to_date = (column_type == datetime.date)
+    if column == 0:
+        borders, bottom_borders = brdLeft, brdBottomLeft
+    elif column == number_of_columns - 1:
+        borders, bottom_borders = brdRight, brdBottomRight
+    else:
+        borders, bottom_borders = cellStyle.borders, brdBottom
+    style = _create_style(cellFont, borders, format_str)
+    bottom_style = _create_style(cellFont, bottom_borders, format_str)
+    # the cells without a value keep the default format
+    empty_style = _create_style(cellFont, borders, '0')
+    empty_bottom_style = _create_style(cellFont, bottom_borders, '0')
+    write = ws.write
+    basic_types = (str, unicode, int, float, datetime.datetime, datetime.time,
+                   datetime.date, ExcelFormula.Formula)
+
+    def column_writer(row, val, last):
+        if val == None:
+            write(row, column, ' ', empty_bottom_style if last else empty_style)
+            return 1
+        if not isinstance(val, basic_types):
+            val = value_to_unicode(val)
+        if length != None and len(val) > length:
+            val = val[0:length]
+        elif to_date:
+            val = datetime.datetime(day = val.day, year = val.year, month = val.month)
+        write(row, column, val, bottom_style if last else style)
+        return len(unicode(val))
+
+    return column_writer
+
+class XlsEngine(ExportEngine):
+    """Write an Excel 97 workbook through xlwt, with a title and a header
+    with borders around the data.  The rows are serialized after each chunk
+    to free their memory."""
+    
+    suffix = '.xls'
+    description = 'Excel 97 workbook'
+    max_rows = 65536 - 3
+    
+    def start(self, title, headerList):
+        LOGGER.debug(u'write data to excel : %s'%title)
+        self._workbook = Workbook()
+        self._ws = ws = self._workbook.add_sheet('Sheet1')
+        ## Writing Title
+        ws.write(0, 0, title, titleStyle)                   # Writing Title
+        ws.col(0).width = len(title) * 400                  # Setting cell width
+        ## Writing Header
+        number_of_columns = len(headerList)
+        self._column_writers = []
+        # the width of the columns, and the number of characters added by the format
+        self._widths = []
+        self._added_sizes = []
+        for n,desc in enumerate(headerList):
+            lst =  desc[1]
+            if n==0:
+                ws.write(2, n, unicode(lst['name']), topleftCellStyle)
+            elif n==len(headerList)-1:
+                ws.write(2, n, unicode(lst['name']), toprightCellStyle)
+            else:
+                ws.write(2, n, unicode(lst['name']), headerStyle)
+            if len(unicode(lst['name'])) < 8:
+                self._widths.append(8 *  375)
+            else:
+                self._widths.append(len(unicode(lst['name'])) *  375)
+            if lst['python_type'] == float:
+                self._added_sizes.append(len('0.') + lst.get('precision', 2))
+            else:
+                self._added_sizes.append(0)
+            self._column_writers.append(create_column_writer(ws, n, number_of_columns, lst))
+        self._columns = range(number_of_columns)
+        self._lengths = [0] * number_of_columns
+        self._row = 3
+        # keep one row in memory, to know which one is the last row
+        self._pending_data = None
+        
+    def _write_row(self, data, last):
+        lengths = self._lengths
+        column_writers = self._column_writers
+        for column, val in zip(self._columns, data):
+            length = column_writers[column](self._row, val, last)
+            if length > lengths[column]:
+                lengths[column] = length
+        self._row += 1
+        
+    def write_rows(self, rows):
+        super(XlsEngine, self).write_rows(rows)
+        for data in rows:
+            if self._pending_data != None:
+                self._write_row(self._pending_data, False)
+            self._pending_data = data
+        if hasattr(self._ws, 'flush_row_data'):
+            self._ws.flush_row_data()
+        
+    def finish(self):
+        if self._pending_data != None:
+            self._write_row(self._pending_data, True)
+        for column in self._columns:
+            if self._widths[column] < self._lengths[column] * 300:
+                self._widths[column] = (self._lengths[column] + self._added_sizes[column]) * 300
+            self._ws.col(column).width = self._widths[column]
+        self._workbook.save(self.filename)
+
+def write_data_to_excel(filename, title, headerList, data_list, progress=None, total=None):
     """
     @param filename: the file to which to save the exported excel
     @param title: title to put in the first row of the genarated excel file
     @param headerList: list of header definitions
-    @param data_list: list or generator with the row data
+    @param data_list: list or generator with the row data, the rows are
+    written while iterating over the generator, so not all rows need to be
+    in memory at the same time
+    @param progress: a function that is called with the number of rows
+    written and the total number of rows, and returns False if the export
+    should be canceled
+    @param total: the total number of rows in data_list, None if unknown
+    @return: True if the file was written, False if the export was canceled
     """
-    LOGGER.debug(u'write data to excel : %s'%title)
-    w = Workbook()
-    ws = w.add_sheet('Sheet1')
-    ## Writing Title
-    ws.write(0, 0, title, titleStyle)                   # Writing Title
-    ws.col(0).width = len(title) * 400                  # Setting cell width
-    ## Writing Header
-    myDataTypeDict = {}            # dictionary of datatype, {columnnumber, Datatype}
-    myPrecisionDict = {}        # dictionary of precision , {columnnumber, Precision}
-    myLengthDict = {}           # dictionary of length , {columnnumber, length}
-    myFormatDict = {}           # dictionary of dateformat , {columnnumber, format}
-    header_delegates = {}
-    number_of_columns = len(headerList)
-    for n,desc in enumerate(headerList):
-        lst =  desc[1]
-        header_delegates[n] = lst['delegate']
-        if n==0:
-            ws.write(2, n, unicode(lst['name']), topleftCellStyle)
-        elif n==len(headerList)-1:
-            ws.write(2, n, unicode(lst['name']), toprightCellStyle)
-        else:
-            ws.write(2, n, unicode(lst['name']), headerStyle)
-        if len(unicode(lst['name'])) < 8:
-            ws.col(n).width = 8 *  375
-        else:
-            ws.col(n).width = len(unicode(lst['name'])) *  375
-        myDataTypeDict[ n ] = lst["python_type"]
-        if lst["python_type"] == float:
-            myPrecisionDict [ n ] = lst["precision"]    #Populating precision dictionary
-        elif lst["python_type"] == datetime.date or issubclass(lst['delegate'], delegates.DateDelegate):
-            myFormatDict [ n ] = lst.get('format', local_date_format())         #Populating date Format dictionary
-            myDataTypeDict[ n ] = datetime.date
-        elif lst["python_type"] == datetime.datetime or issubclass(lst['delegate'], delegates.DateTimeDelegate):
-            myDataTypeDict[ n ] = datetime.datetime
-            myFormatDict [ n ] = lst["format"]          #Populating date Format dictionary
-        elif lst["python_type"] == str:
-            if 'length' in lst:
-                myLengthDict [ n ] = lst["length"]          #Populating Column Length dictionary
-    ## Writing Data
-    row = 3
-    valueAddedInSize = 0
-    formatStr = '0'
-    for data in data_list:                       # iterating the data_list, having dictionary
-        cellStyle.num_format_str = '0'
-        for column, val in enumerate( data ): #for i in dictCounter:
-            valueAddedInSize = 0
-            if val != None:
-                # this is to handle fields of type code
-                if isinstance(val, list):
-                    val = '.'.join(val)
-                if not isinstance(val,(str,unicode,int,float,datetime.datetime,datetime.time,datetime.date,
-                                       ExcelFormula.Formula) ):
-                    val = unicode(val)
-                if myDataTypeDict.has_key(column) == True:
-                    if myLengthDict.get(column) != None:
-                        if len(val) > myLengthDict[ column ]:
-                            val = val[0:myLengthDict[ column ]]
-                    elif myDataTypeDict[ column ] == str:
-                        formatStr = '0'
-                    elif myDataTypeDict[ column ] == int:
-                        formatStr = '0'
-                    elif myDataTypeDict[ column ] == float:
-                        formatStr = '0.'
-                        for _j in range( 0 , myPrecisionDict[ column ]):
-                            formatStr += '0'
-                        valueAddedInSize = len(formatStr) # To fit the cell width + 1 (of dot(.))
-                    elif myDataTypeDict[ column ] == datetime.date or isinstance(header_delegates[column], delegates.DateDelegate):
-                        formatStr = myFormatDict[column]
-                        val = datetime.datetime( day = val.day, year = val.year, month = val.month)
-                    elif myDataTypeDict[ column ] == datetime.datetime:
-                        formatStr = myFormatDict[column]
-                    elif myDataTypeDict[ column ] == bool:
-                        formatStr = '0'
-                    else:
-                        formatStr = '0'
-                cellStyle.num_format_str = formatStr
-                bottomCellStyle.num_format_str = formatStr
-                rightCellStyle.num_format_str = formatStr
-                bottomrightCellStyle.num_format_str = formatStr
-                leftCellStyle.num_format_str = formatStr
-                bottomleftCellStyle.num_format_str = formatStr
-            elif val == None:
-                val = ' '
-            if row - 2  == len(data_list):
-                #we re at the bottom row
-                if column == 0:
-                    ws.write(row , column, val , bottomleftCellStyle)
-                elif column  == number_of_columns - 1:
-                    ws.write(row , column, val , bottomrightCellStyle)
-                else:
-                    ws.write(row , column, val , bottomCellStyle)
-            else:
-                if column == 0:
-                    ws.write(row , column, val , leftCellStyle)
-                elif column == number_of_columns - 1:
-                    ws.write(row , column, val , rightCellStyle)
-                else:
-                    ws.write(row , column, val , cellStyle)
-            if ws.col(column).width < (len(unicode( val )) )* 300:
-                ws.col(column).width = (len(unicode( val )) + valueAddedInSize )* 300
-            column = column + 1
-        row = row + 1
-    w.save(filename)
-
+    return export_data(XlsEngine(filename), title, headerList, data_list, progress, total, chunk_size)
@@ -0,0 +1,244 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+
+"""Export a query in parallel processes.
+
+The query is split in ranges of its primary key, each range is fetched and
+written to a part of the file by a process of a multiprocessing pool, after
+which the parts are merged in order into the exported file.  Each process
+creates its own database engine, with the url of the engine used by the
+query.  Connection arguments that are not part of the url are not passed
+to the processes.
+
+This is only possible when :
+
+ * the entity has a single integer primary key
+ * the query is not sorted, or sorted on the primary key, since the rows 
+   are exported ordered by primary key
+ * all exported fields are columns of the entity, as when the list_projection
+   attribute of the admin is used
+ * the export engine can write parts, eg. the xlsx, csv or columnar engines
+
+The data should not change during the export, since the partitions are 
+determined before the rows are fetched.
+
+Parallel exports are not available on windows, where the processes of the
+pool would import the application again, instead of being forked from it.
+"""
+
+import itertools
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+from camelot.view.export.engines import get_column_type
+
+LOGGER = logging.getLogger('camelot.view.export.parallel')
+
+# the number of rows written by each process
+partition_size = 50000
+# the number of rows fetched at once by each process
+chunk_size = 1000
+
+# the database engine of a worker process
+_engine_ = None
+
+def _initialize_worker(url):
+    global _engine_
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import NullPool
+    _engine_ = create_engine(url, poolclass=NullPool)
+
+def _export_partition(task):
+    """Fetch the rows of a partition and write them to a part, this function
+    runs in a worker process
+    :return: the number of rows written
+    """
+    engine_class, filename, columns, sql, params, types, offset = task
+    dialect = _engine_.dialect
+    processors = [column_type.dialect_impl(dialect).result_processor(dialect, None) for column_type in types]
+    engine = engine_class(filename)
+    engine.start_part(columns, offset)
+    try:
+        result = _engine_.execute(sql, params)
+        try:
+            while True:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+                # the first value of a row is the primary key
+                engine.write_rows([[(processor(value) if processor else value) for processor, value in zip(processors, row[1:])] for row in rows])
+        finally:
+            result.close()
+        engine.finish_part()
+    except Exception:
+        engine.abort()
+        raise
+    return engine.rows_written
+
+def get_export_processes():
+    """:return: the number of processes used for a parallel export, as
+    specified by settings.EXPORT_PROCESSES, 1 if not specified or when
+    running on windows"""
+    import settings
+    if sys.platform == 'win32':
+        return 1
+    return getattr(settings, 'EXPORT_PROCESSES', 1)
+
+def get_partition_key(admin):
+    """:return: the primary key column of the entity of the admin if a
+    query on this entity can be partitioned, None otherwise"""
+    from sqlalchemy import types
+    primary_key = admin.mapper.primary_key
+    if len(primary_key) == 1 and isinstance(primary_key[0].type, types.Integer):
+        return primary_key[0]
+    return None
+
+def can_export_query(admin, engine_class, columns, query):
+    """:return: True if the columns of a query on the entity of the admin can
+    be exported in parallel with an engine class"""
+    primary_key = get_partition_key(admin)
+    if not engine_class.parts or primary_key is None:
+        return False
+    # the rows are exported ordered by primary key, which should not 
+    # differ from the order of a serial export
+    order_by = query._order_by
+    if order_by == False and admin.mapper.order_by:
+        order_by = admin.mapper.order_by
+    if order_by and not (len(order_by) == 1 and primary_key.compare(order_by[0])):
+        return False
+    return admin.get_projection([name for name, _attributes in columns], list_projection=True) != None
+
+def get_partitions(query, primary_key, size):
+    """Split a query in ranges of its primary key
+    :return: a list of (first, last, rows, offset) tuples with the first and
+    the last key of each partition, the number of rows in the partition, and
+    the number of rows before the partition
+    """
+    partitions = []
+    first, last, rows, offset = None, None, 0, 0
+    for (key,) in query.order_by(None).order_by(primary_key).values(primary_key):
+        if rows == 0:
+            first = key
+        last = key
+        rows += 1
+        if rows >= size:
+            partitions.append((first, last, rows, offset))
+            offset += rows
+            rows = 0
+    if rows:
+        partitions.append((first, last, rows, offset))
+    return partitions
+
+def compile_partition(statement, primary_key, first, last, dialect):
+    """:return: the sql and the parameters to select the rows of a
+    partition, with the bind processors of the dialect applied"""
+    from sqlalchemy import and_
+    statement = statement.where(and_(primary_key >= first, primary_key <= last))
+    compiled = statement.compile(dialect=dialect)
+    params = dict()
+    for key, value in compiled.construct_params().items():
+        processor = compiled.binds[key].type.dialect_impl(dialect).bind_processor(dialect)
+        params[key] = processor(value) if processor else value
+    if compiled.positional:
+        params = tuple(params[key] for key in compiled.positiontup)
+    return unicode(compiled), params
+
+def simplify_columns(columns):
+    """:return: a copy of the columns with only the field attributes used by
+    the export engines, so they can be passed to a worker process"""
+    simple_columns = []
+    for name, attributes in columns:
+        simple_attributes = dict(name=unicode(attributes['name']),
+                                 python_type=get_column_type(attributes))
+        for key in ('precision', 'format'):
+            if attributes.get(key) != None:
+                simple_attributes[key] = attributes[key]
+        simple_columns.append((name, simple_attributes))
+    return simple_columns
+
+def export_query(engine, title, columns, admin, query, progress=None, total=None, processes=None):
+    """Export a query through an engine, with a pool of processes, the
+    query should fulfill the conditions checked by can_export_query
+    :param engine: an ExportEngine that can write parts
+    :param columns: a list of (field_name, field_attributes) tuples
+    :param admin: the admin of the entity that is queried
+    :param query: the query to export, the engine bound to its session is
+    used to find the url of the database
+    :param progress: a function that is called with the number of rows
+    written and the total number of rows, and returns False if the export
+    should be canceled
+    :param total: the total number of rows in the query, None if unknown
+    :param processes: the number of processes to use, by default the one
+    returned by get_export_processes
+    :return: True if the file was written, False if the export was canceled
+    """
+    primary_key = get_partition_key(admin)
+    projection = dict(admin.get_projection([name for name, _attributes in columns], list_projection=True))
+    selected = [primary_key] + [projection[name].__clause_element__() for name, _attributes in columns]
+    statement = query.order_by(None).statement.with_only_columns(selected).order_by(primary_key)
+    bind = query.session.get_bind(admin.mapper)
+    dialect = bind.dialect
+    types = [column.type for column in selected[1:]]
+    simple_columns = simplify_columns(columns)
+    directory = tempfile.mkdtemp()
+    pool = None
+    engine.start(title, columns)
+    try:
+        partitions = get_partitions(query, primary_key, partition_size)
+        rows = sum(partition[2] for partition in partitions)
+        if engine.max_rows != None and rows > engine.max_rows:
+            raise Exception('The %s format cannot contain more than %i rows'%(engine.suffix, engine.max_rows))
+        tasks = []
+        for i, (first, last, _rows, offset) in enumerate(partitions):
+            sql, params = compile_partition(statement, primary_key, first, last, dialect)
+            filename = os.path.join(directory, '%i%s'%(i, engine.suffix))
+            tasks.append((type(engine), filename, simple_columns, sql, params, types, offset))
+        LOGGER.info(u'export %s in %i partitions'%(title, len(tasks)))
+        pool = multiprocessing.Pool(processes or get_export_processes(), 
+                                    _initialize_worker, (str(bind.url),))
+        for task, part_rows in itertools.izip(tasks, pool.imap(_export_partition, tasks)):
+            engine.append_part(task[1], part_rows)
+            os.remove(task[1])
+            if progress and not progress(engine.rows_written, total):
+                LOGGER.info(u'export canceled : %s'%title)
+                pool.terminate()
+                engine.abort()
+                return False
+        pool.close()
+        engine.finish()
+    except Exception:
+        if pool:
+            pool.terminate()
+        engine.abort()
+        raise
+    finally:
+        if pool:
+            pool.join()
+        shutil.rmtree(directory, ignore_errors=True)
+    return True
@@ -22,83 +22,204 @@
 #
 #  ============================================================================
 
-"""Module containing the FIFO cache used in the collection proxy to store
+"""Module containing the LRU cache used in the collection proxy to store
 the data that is passed between the model and the gui thread"""
 
+import sys
+import threading
+
+def estimate_size( value ):
+    """Estimate the number of bytes used by a value in the cache, this
+    takes into account the value itself and, if it is a list, tuple, dict or
+    an object with __slots__, the elements it contains.  Other objects are
+    not inspected, so the estimate is meant to enforce a memory budget, not
+    to do exact bookkeeping.
+    """
+    size = sys.getsizeof( value )
+    if isinstance( value, (list, tuple) ):
+        size += sum( estimate_size( element ) for element in value )
+    elif isinstance( value, dict ):
+        size += sum( estimate_size( element ) for element in value.itervalues() )
+    elif hasattr( value, '__slots__' ):
+        size += sum( estimate_size( getattr( value, slot, None ) ) for slot in value.__slots__ )
+    return size
+
+class _Link( object ):
+    """An element of the doubly linked list that keeps track of the order
+    in which entries in the cache were used"""
+
+    __slots__ = ( 'previous', 'next', 'row', 'entity', 'value', 'size' )
+
+    def __init__( self, row = None, entity = None, value = None, size = 0 ):
+        self.previous = self
+        self.next = self
+        self.row = row
+        self.entity = entity
+        self.value = value
+        self.size = size
+
 class Fifo(object):
     """Fifo, is the actual cache containing a limited set of copies of row data
     so the data in Fifo, is always immediately accessible to the gui thread,
     with zero delay as you scroll down the table view, Fifo is filled and
     refilled with data queried from the database
-    
+
     the cache can be queried either by the row number or by object represented 
     by the row data.
+
+    When the cache is full, the least recently used row is removed.  Adding,
+    retrieving and removing rows are all O(1) operations, since the order of
+    use is kept in a doubly linked list.  The cache can be limited in the
+    number of rows it contains and in the estimated memory its rows use.
+
+    The cache keeps track of the number of hits, misses and evictions, those
+    are available through the hits, misses and evictions attributes.
     """
-    def __init__(self, max_entries):
+
+    def __init__(self, max_entries, max_size=None):
         """:param max_entries: the maximum entries that will be stored in the
-        cache, if more data is added, the oldest data gets removed"""
+        cache, if more data is added, the least recently used data gets removed
+        :param max_size: the maximum number of bytes the data in the cache
+        is estimated to use, None if there is no such limit
+        """
         self.max_entries = max_entries
-        self.entities = []
-        self.data_by_rows = dict()
-        self.rows_by_entity = dict()
-        
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # the root of the linked list, root.next is the least recently used
+        # link, root.previous the most recently used one
+        self._root = _Link()
+        self._links_by_row = dict()
+        self._links_by_entity = dict()
+        # the gui thread reorders the list when reading from the cache, while
+        # the model thread adds data to it
+        self._lock = threading.Lock()
+
     def __unicode__(self):
         return u','.join(unicode(e) for e in self.entities)
-    
+
+    def __len__(self):
+        return len(self._links_by_row)
+
+    @property
+    def entities(self):
+        """The entities in the cache, from least to most recently used"""
+        entities = []
+        link = self._root.next
+        while link is not self._root:
+            entities.append( link.entity )
+            link = link.next
+        return entities
+
+    def get_statistics(self):
+        """:return: a dictionary with the usage statistics of the cache"""
+        return dict( rows = len( self ),
+                     size = self.size,
+                     hits = self.hits,
+                     misses = self.misses,
+                     evictions = self.evictions )
+
+    def _unlink(self, link):
+        link.previous.next = link.next
+        link.next.previous = link.previous
+        del self._links_by_row[link.row]
+        del self._links_by_entity[link.entity]
+        self.size -= link.size
+
+    def _append(self, link):
+        """Put a link at the most recently used end of the list"""
+        root = self._root
+        last = root.previous
+        link.previous = last
+        link.next = root
+        last.next = link
+        root.previous = link
+
+    def _touch(self, link):
+        """Move a link to the most recently used end of the list"""
+        link.previous.next = link.next
+        link.next.previous = link.previous
+        self._append(link)
+
+    def _full(self):
+        if len(self._links_by_row) > self.max_entries:
+            return True
+        # always keep at least the most recent row in the cache, even if
+        # it exceeds the memory budget on its own
+        if self.max_size != None and self.size > self.max_size:
+            return len(self._links_by_row) > 1
+        return False
+
     def add_data(self, row, entity, value):
         """The entity might allready be on another row, and this row
         might allready contain an entity"""
-#        try:
-#            previous_entity = self.get_entity_at_row(row)
-#            self.delete_by_entity(previous_entity)
-#        except KeyError:
-#            pass
-        self.delete_by_entity(entity)
-        self.data_by_rows[row] = (entity, value)
-        self.rows_by_entity[entity] = row
-        self.entities.append(entity)
-        if len(self.entities)>self.max_entries:
-            entity = self.entities.pop(0)
-            self.delete_by_entity(entity)
-      
+        link = _Link( row, entity, value, estimate_size( value ) )
+        self._lock.acquire()
+        try:
+            for previous_link in ( self._links_by_entity.get( entity ),
+                                   self._links_by_row.get( row ) ):
+                if previous_link is not None and \
+                   self._links_by_row.get( previous_link.row ) is previous_link:
+                    self._unlink( previous_link )
+            self._links_by_row[row] = link
+            self._links_by_entity[entity] = link
+            self.size += link.size
+            self._append( link )
+            while self._full():
+                self._unlink( self._root.next )
+                self.evictions += 1
+        finally:
+            self._lock.release()
+
     def delete_by_row(self, row):
         """Remove the data and the reference to the object at row"""
-        (entity, _value_) = self.data_by_rows[row]
-        del self.data_by_rows[row]
-        del self.rows_by_entity[entity] 
+        self._lock.acquire()
+        try:
+            self._unlink( self._links_by_row[row] )
+        finally:
+            self._lock.release()
         return row
-    
+
     def delete_by_entity(self, entity):
         """Remove everything in the cache related to an entity instance
         returns the row at which the data was stored if the data was in the
         cache, return None otherwise"""
-        row = None
+        self._lock.acquire()
         try:
-            row = self.rows_by_entity[entity]
-            del self.data_by_rows[row]
-            del self.rows_by_entity[entity]      
-        except KeyError:
-            pass
-        try:
-            self.entities.remove(entity)
-        except ValueError:
-            pass
-        return row    
-    
+            link = self._links_by_entity.get( entity )
+            if link is None:
+                return None
+            self._unlink( link )
+            return link.row
+        finally:
+            self._lock.release()
+
     def has_data_at_row(self, row):
         """:return: True if there is data in the cache for the row, False if 
         there isn't"""
-        return row in self.data_by_rows
-    
+        return row in self._links_by_row
+
     def get_data_at_row(self, row):
-        """:return: the data at row"""
-        return self.data_by_rows[row][1]
-    
+        """:return: the data at row, and mark the row as recently used"""
+        self._lock.acquire()
+        try:
+            try:
+                link = self._links_by_row[row]
+            except KeyError:
+                self.misses += 1
+                raise
+            self.hits += 1
+            self._touch( link )
+            return link.value
+        finally:
+            self._lock.release()
+
     def get_row_by_entity(self, entity):
         """:return: the row at which an entity is stored"""
-        return self.rows_by_entity[entity]
-    
+        return self._links_by_entity[entity].row
+
     def get_entity_at_row(self, row):
         """:return: the entity that is stored at a row"""
-        return self.data_by_rows[row][0]
-
+        return self._links_by_row[row].entity
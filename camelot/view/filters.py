@@ -28,12 +28,13 @@ These structures can be transformed to QT forms.
 """
 
 import datetime
+import threading
 
 from PyQt4 import QtCore, QtGui
 from sqlalchemy import sql
 
 from camelot.view.controls.editors import DateEditor
-from camelot.view.model_thread import gui_function
+from camelot.view.model_thread import gui_function, post
 from camelot.core.utils import ugettext_lazy as _
 
 def structure_to_filter(structure):
@@ -45,9 +46,111 @@ def structure_to_filter(structure):
     if isinstance(structure, Filter):
         return structure
     return GroupBoxFilter(structure)
+
+class FilterOptions(list):
+    """The options of a filter, a list of tuples of the name of the option,
+    and a filter function to decorate a query.
+    
+    .. attribute:: complete
+    
+    False if the list only contains the options for the most frequent values,
+    because there are too many different values.
+    
+    .. attribute:: search
+    
+    a function to be called in the model thread with a text as its argument,
+    that returns the options for the most frequent values matching the text
+    """
+    
+    def __init__(self, options, complete=True, search=None):
+        super(FilterOptions, self).__init__(options)
+        self.complete = complete
+        self.search = search
+
+class FilterOptionsCache(QtCore.QObject):
+    """Cache of the names and options of filters, per admin.  The options are
+    removed from the cache when objects of the entities involved are updated,
+    created or deleted.
+    """
+    
+    def __init__(self):
+        from camelot.view.remote_signals import get_signal_handler
+        super(FilterOptionsCache, self).__init__()
+        self._lock = threading.Lock()
+        # key : (entities, name_and_options)
+        self._name_and_options = dict()
+        get_signal_handler().connect_signals(self)
+        
+    def get(self, key):
+        """:return: the name and options stored for key, None if they are not
+        in the cache"""
+        self._lock.acquire()
+        try:
+            entry = self._name_and_options.get(key)
+            if entry != None:
+                return entry[1]
+        finally:
+            self._lock.release()
+            
+    def set(self, key, entities, name_and_options):
+        """:param entities: the classes of the objects that determine the
+        options"""
+        self._lock.acquire()
+        try:
+            self._name_and_options[key] = (entities, name_and_options)
+        finally:
+            self._lock.release()
+            
+    def invalidate(self, entity):
+        """Remove the options that might have changed because objects of
+        class entity were updated, created or deleted"""
+        self._lock.acquire()
+        try:
+            for key, (entities, _name_and_options) in self._name_and_options.items():
+                for option_entity in entities:
+                    if issubclass(entity, option_entity) or issubclass(option_entity, entity):
+                        del self._name_and_options[key]
+                        break
+        finally:
+            self._lock.release()
+            
+    @QtCore.pyqtSlot(object, object)
+    def handle_entity_update(self, sender, entity):
+        self.invalidate(type(entity))
+        
+    @QtCore.pyqtSlot(object, object)
+    def handle_entity_delete(self, sender, entity):
+        self.invalidate(type(entity))
+        
+    @QtCore.pyqtSlot(object, object)
+    def handle_entity_create(self, sender, entity):
+        self.invalidate(type(entity))
+
+_filter_options_cache_ = []
+_filter_options_cache_lock_ = threading.Lock()
+
+def get_filter_options_cache():
+    """Get the filter options cache shared by all table views"""
+    _filter_options_cache_lock_.acquire()
+    try:
+        if not len(_filter_options_cache_):
+            _filter_options_cache_.append(FilterOptionsCache())
+        return _filter_options_cache_[-1]
+    finally:
+        _filter_options_cache_lock_.release()
   
 class Filter(object):
-    """Base class for filters"""
+    """Base class for filters
+    
+    .. attribute:: max_options
+    
+    the maximum number of options shown for the values of the attribute, if
+    there are more different values, the most frequent values are shown, and
+    the user can search for other values.  None if all values should be
+    shown, for filters rendered without a search box.
+    """
+    
+    max_options = 20
     
     def __init__(self, attribute, value_to_string=unicode):
         """
@@ -74,14 +177,29 @@ class Filter(object):
     def get_name_and_options(self, admin):
         """return a tuple of the name of the filter and a list of options that can be selected. 
         Each option is a tuple of the name of the option, and a filter function to
-        decorate a query
+        decorate a query.  The name and options are cached until objects of
+        the entities involved change.
         @return:  (filter_name, [(option_name, query_decorator), ...)
         """
-        from sqlalchemy.sql import select
-        from sqlalchemy import orm
+        cache = get_filter_options_cache()
+        key = (admin, self.attribute, self._value_to_string, self.max_options)
+        name_and_options = cache.get(key)
+        if name_and_options == None:
+            entities, name_and_options = self._get_name_and_options(admin)
+            cache.set(key, entities, name_and_options)
+        return name_and_options
+    
+    def _get_name_and_options(self, admin):
+        """Query the name and options of the filter, the number of rows for
+        each option is counted in the same query.
+        @return: (entities, (filter_name, FilterOptions))
+        """
+        from sqlalchemy.sql import select, operators
+        from sqlalchemy import orm, Unicode
         from elixir import session
         filter_names = []
         joins = []
+        entities = [admin.entity]
         table = admin.entity.table
         path = self.attribute.split('.')
         for field_name in path:
@@ -91,11 +209,13 @@ class Filter(object):
             if 'target' in attributes:
                 admin = attributes['admin']
                 joins.append(field_name)
+                entities.append(admin.entity)
                 if attributes['direction'] == orm.interfaces.MANYTOONE:
                     table = admin.entity.table.join(table)
                 else:
-                    table = admin.entity.table        col = getattr( admin.entity, field_name )
-        query = select([col], distinct=True, order_by=col.asc()).select_from(table)
+                    table = admin.entity.table
+        col = getattr( admin.entity, field_name )
+        count = sql.func.count()
           
         def create_decorator(col, attributes, value, joins):
           
@@ -108,42 +228,111 @@ class Filter(object):
                 return q.filter(col==value)
               
             return decorator
-      
-        options = [(_(self._value_to_string(value[0])), create_decorator(col, attributes, value[0], joins))
-                   for value in session.execute(query)]
-    
-        return (filter_names[0],[(_('all'), lambda q: q)] + options)
+        
+        def create_options(rows):
+            options = [(_('all'), lambda q: q)]
+            for value, value_count in rows:
+                option_name = u'%s (%i)'%(unicode(_(self._value_to_string(value))), value_count)
+                options.append((option_name, create_decorator(col, attributes, value, joins)))
+            return options
+        
+        def search(text):
+            query = select([col, count], 
+                           operators.ilike_op(sql.cast(col, Unicode), '%'+text+'%'),
+                           group_by=[col], 
+                           order_by=[count.desc(), col.asc()],
+                           limit=self.max_options).select_from(table)
+            return create_options(session.execute(query))
+        
+        if self.max_options == None:
+            query = select([col, count], group_by=[col]).select_from(table)
+            rows = list(session.execute(query))
+            rows.sort(key=lambda row:row[0])
+            return (entities, (filter_names[0], FilterOptions(create_options(rows))))
+        # query one more value, to know if there are too many values
+        query = select([col, count], 
+                       group_by=[col], 
+                       order_by=[count.desc(), col.asc()], 
+                       limit=self.max_options+1).select_from(table)
+        rows = list(session.execute(query))
+        complete = len(rows) <= self.max_options
+        if complete:
+            rows.sort(key=lambda row:row[0])
+        else:
+            rows = rows[:self.max_options]
+        options = FilterOptions(create_options(rows), complete, search)
+        return (entities, (filter_names[0], options))
 
 class FilterWidget(QtGui.QGroupBox):
     """A box containing a filter that can be applied on a table view, this filter is
-    based on the distinct values in a certain column"""
+    based on the distinct values in a certain column.  When not all values
+    can be shown, a search box is shown to search for other values.
+    
+    .. attribute:: search_delay
+    
+    the number of milliseconds to wait after the user stopped typing before
+    searching for values
+    """
   
     filter_changed_signal = QtCore.pyqtSignal()
+    search_delay = 300
     
     def __init__(self, name, choices, parent):
+        from camelot.view.controls.decorated_line_edit import DecoratedLineEdit
         QtGui.QGroupBox.__init__(self, unicode(name), parent)
         self.group = QtGui.QButtonGroup(self)
         self.item = name
         self.unique_values = []
         self.choices = None
+        layout = QtGui.QVBoxLayout()
+        self.search_input = None
+        if not getattr(choices, 'complete', True):
+            self.search_input = DecoratedLineEdit(self)
+            self.search_input.set_background_text(_('Search...'))
+            layout.addWidget(self.search_input)
+            self._search = choices.search
+            self.search_timer = QtCore.QTimer(self)
+            self.search_timer.setSingleShot(True)
+            self.search_timer.setInterval(self.search_delay)
+            self.search_timer.timeout.connect(self.post_search)
+            self.search_input.textEdited.connect(self.search_timer.start)
+        self.choices_layout = QtGui.QVBoxLayout()
+        layout.addLayout(self.choices_layout)
+        layout.addStretch()
+        self.setLayout(layout)
         self.setChoices(choices)
          
     @QtCore.pyqtSlot(bool)
     def emit_filter_changed(self, state):
         self.filter_changed_signal.emit()
+        
+    @QtCore.pyqtSlot()
+    def post_search(self):
+        text = unicode(self.search_input.user_input())
+        search = self._search
+        post(lambda:search(text), self.set_search_choices, affinity=self, 
+             supersede=(self, 'search'))
+        
+    @QtCore.pyqtSlot(object)
+    def set_search_choices(self, choices):
+        changed = self.group.checkedId() > 0
+        self.setChoices(choices)
+        if changed:
+            self.filter_changed_signal.emit()
     
     def setChoices(self, choices):
         self.choices = choices
-        layout = QtGui.QVBoxLayout()
+        for button in self.group.buttons():
+            self.group.removeButton(button)
+            self.choices_layout.removeWidget(button)
+            button.deleteLater()
         for i,name in enumerate([unicode(c[0]) for c in choices]):
             button = QtGui.QRadioButton(name, self)
-            layout.addWidget(button)
+            self.choices_layout.addWidget(button)
             self.group.addButton(button, i)
             if i==0:
                 button.setChecked(True)
             button.toggled.connect( self.emit_filter_changed )
-        layout.addStretch()
-        self.setLayout(layout)
     
     def decorate_query(self, query):
         checked = self.group.checkedId()
@@ -186,7 +375,10 @@ class GroupBoxFilterWidget(QtGui.QGroupBox):
         return query
 
 class ComboBoxFilter(Filter):
-    """Filter where the items are displayed in a QComboBox"""
+    """Filter where the items are displayed in a QComboBox, since the combo
+    box has no search box, all values are shown"""
+    
+    max_options = None
     
     @gui_function
     def render(self, parent, name, options):
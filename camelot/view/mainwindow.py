@@ -39,7 +39,7 @@ from camelot.view.action import ActionFactory
 from camelot.view.controls.navpane2 import NavigationPane
 #from camelot.view.controls.navpane3 import NavigationPane
 from camelot.view.controls.printer import Printer
-from camelot.view.model_thread import post
+from camelot.view.model_thread import post, get_model_thread, PRIORITY_LOW
 
 QT_MAJOR_VERSION = float('.'.join(str(QtCore.QT_VERSION_STR).split('.')[0:2]))
 
@@ -208,6 +208,14 @@ class MainWindow(QtGui.QMainWindow):
         self.exportToMailAct = ActionFactory.export_mail(self, slot=self.exportToMail)
         self.importFromFileAct = ActionFactory.import_file(self, slot=self.importFromFile)
         self.sessionRefreshAct = ActionFactory.refresh(self, slot=self.refresh_session)
+        self.modelThreadMonitorAct = None
+        if get_model_thread().profiler:
+            self.modelThreadMonitorAct = ActionFactory.create_action(
+                parent=self,
+                text=_('Model thread monitor'),
+                slot=self.model_thread_monitor,
+                tip=_('Show the tasks of the model thread that take the most time')
+            )
 
         self.app_actions = []
         for action in self.app_admin.get_actions():
@@ -236,6 +244,12 @@ class MainWindow(QtGui.QMainWindow):
         from camelot.core.orm import refresh_session
         refresh_session( session )
 
+    def model_thread_monitor(self):
+        from camelot.view.controls.model_thread_monitor import ModelThreadMonitor
+        TOP_LEVEL = None
+        self.monitor = ModelThreadMonitor(get_model_thread().profiler, TOP_LEVEL)
+        self.monitor.show()
+
     def help(self):
         #
         # Import WebKit as late as possible, since it's the largest
@@ -330,9 +344,20 @@ class MainWindow(QtGui.QMainWindow):
         wizard.exec_()
 
     def exportToExcel(self):
-        """creates an excel file from the view"""
+        """creates an excel file from the view, or a file in another format
+        chosen by its suffix"""
+        from camelot.view.controls.progress_dialog import ProgressDialog
+        from camelot.view.export.excel import ask_export_filename
         widget = self.activeMdiChild()
-        post(widget.export_to_excel)
+        filename = ask_export_filename(self, _('Export to spreadsheet'))
+        if not filename:
+            return
+        progress = ProgressDialog(_('Export to spreadsheet'), cancelable=True)
+        # the export uses the query and the proxy of the view, which belong
+        # to the session of the worker without affinity
+        post(lambda:widget.export_to_excel(progress.progress, filename),
+             progress.finished, progress.exception, priority=PRIORITY_LOW)
+        progress.exec_()
 
     def exportToWord(self):
         """Use windows COM to export the active child window to MS word,
@@ -385,6 +410,8 @@ class MainWindow(QtGui.QMainWindow):
 
         self.viewMenu = self.menuBar().addMenu(_('View'))
         addActions(self.viewMenu, (self.sessionRefreshAct,))
+        if self.modelThreadMonitorAct:
+            addActions(self.viewMenu, (self.modelThreadMonitorAct,))
         gotoMenu = self.viewMenu.addMenu(_('Go To'))
         addActions(gotoMenu, (
             self.viewFirstAct,
@@ -32,11 +32,40 @@ logger = logging.getLogger('camelot.view.model_thread')
 
 _model_thread_ = []
 
+#
+# The priorities of requests posted to the model thread, requests with a
+# lower value are handled first
+#
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
 
 class ModelThreadException(Exception):
     pass
 
 
+class TaskHandle(object):
+    """A handle to a request posted to the model thread, that can be used to
+    cancel the request as long as it is not being handled"""
+
+    def __init__(self, model_thread=None, entry=None):
+        """:param model_thread: the model thread to which the request was
+        posted, None if the request has been handled allready
+        :param entry: the entry of the request in the queue of the model thread
+        """
+        self._model_thread = model_thread
+        self._entry = entry
+
+    def cancel(self):
+        """Cancel the request, its response will not be called
+        :return: True if the request was cancelled, False if it was
+        allready being handled or cancelled"""
+        if self._model_thread == None:
+            return False
+        return self._model_thread.cancel(self._entry)
+
+
 def model_function(original_function):
     """Decorator to ensure a function is only called from within the model
     thread. If this function is called in another thread, an exception will be
@@ -47,7 +76,7 @@ def model_function(original_function):
         from no_thread_model_thread import NoThreadModelThread
         current_thread = QtCore.QThread.currentThread()
         model_thread = get_model_thread()
-        return (current_thread==model_thread) or isinstance(
+        return model_thread.is_model_thread(current_thread) or isinstance(
             model_thread, (NoThreadModelThread,)
         )
 
@@ -118,6 +147,7 @@ class AbstractModelThread(QtCore.QThread):
         self._setup_thread = setup_thread
         self._exit = False
         self._traceback = ''
+        self.profiler = None
         self.logger.debug('model thread constructed')
 
     def run(self):
@@ -133,7 +163,13 @@ class AbstractModelThread(QtCore.QThread):
     all work is done"""
         pass
 
-    def post(self, request, response=None, exception=None):
+    def is_model_thread(self, thread):
+        """:return: True if thread is a thread in which this model thread
+        handles requests"""
+        return thread == self
+
+    def post(self, request, response=None, exception=None, affinity=None,
+             priority=PRIORITY_NORMAL, supersede=None, coalesce=None):
         """Post a request to the model thread, request should be a function
         that takes no arguments. The request function will be called within the
         model thread. When the request is finished, on first occasion, the
@@ -144,14 +180,55 @@ class AbstractModelThread(QtCore.QThread):
         :param response: a slot that will be called with the result of the
         request function
         :param exception: a slot that will be called in case request throws an
-        exception"""
+        exception
+        :param affinity: requests with the same affinity are handled in the
+        order in which they were posted.  Requests without an affinity are
+        all handled in order by the same thread.  Only requests that do not 
+        exchange objects with other requests should have an affinity, since
+        each thread has its own session.  Only model threads that handle 
+        requests in parallel use the affinity.
+        :param priority: PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW,
+        requests with the same priority are handled in the order in which they
+        were posted
+        :param supersede: a key identifying the purpose of the request, if
+        a request with the same key is still waiting in the queue, it is
+        cancelled, eg. to only search for the last text a user typed
+        :param coalesce: a key identifying a request that should only be
+        done once, eg. (proxy, 'refresh_content').  If a request with the same
+        key is still waiting in the queue, the new request is merged into it :
+        the request in the queue is moved to the position of the new request,
+        and the new request and its response are dropped.  So all requests
+        posted with the same key should have the same request and response.
+        :return: a TaskHandle to cancel the request"""
         raise NotImplemented
 
+    def cancel(self, entry):
+        """Cancel a request, use the cancel method of the TaskHandle returned
+        by post instead of calling this method directly
+        :return: True if the request was cancelled"""
+        return False
+
     def busy(self):
         """Return True or False indicating wether either the model or the gui
         thread is doing something"""
         return False
 
+    def enable_profiler(self, profiler=None):
+        """Record the timing of all tasks handled by this model thread, and
+        of the sql statements they execute, if the engine was created with
+        the proxy of camelot.view.model_thread.profiler.create_sql_timing_proxy
+        :param profiler: the ModelThreadProfiler to use, None to create one
+        :return: the profiler used"""
+        from profiler import ModelThreadProfiler
+        self.profiler = profiler or ModelThreadProfiler()
+        self.profiler.install_sql_timing()
+        return self.profiler
+
+    def get_task_statistics(self):
+        """:return: a dictionary with counters of the tasks used to handle
+        requests, to detect leaking tasks"""
+        return dict()
+
 
 def construct_model_thread(*args, **kwargs):
     import settings
@@ -159,9 +236,16 @@ def construct_model_thread(*args, **kwargs):
         logger.info('running without threads')
         from no_thread_model_thread import NoThreadModelThread
         _model_thread_.insert(0, NoThreadModelThread(*args, **kwargs))
+    elif getattr(settings, 'MODEL_THREADS', 1) > 1:
+        logger.info('running with %s model threads'%settings.MODEL_THREADS)
+        from model_thread_pool import ModelThreadPool
+        _model_thread_.insert(0, ModelThreadPool(*args, workers=settings.MODEL_THREADS, **kwargs))
     else:
         from signal_slot_model_thread import SignalSlotModelThread
         _model_thread_.insert(0, SignalSlotModelThread(*args, **kwargs))
+    if getattr(settings, 'MODEL_THREAD_PROFILER', False):
+        logger.info('profiling the model thread')
+        _model_thread_[0].enable_profiler()
 
 
 def has_model_thread():
@@ -172,8 +256,11 @@ def get_model_thread():
     return _model_thread_[0]
 
 
-def post(request, response=None, exception=None):
-    """Post a request and a response to the default model thread"""
+def post(request, response=None, exception=None, affinity=None,
+         priority=PRIORITY_NORMAL, supersede=None, coalesce=None):
+    """Post a request and a response to the default model thread
+    :return: a TaskHandle to cancel the request"""
     mt = get_model_thread()
-    mt.post(request, response, exception)
+    return mt.post(request, response, exception, affinity=affinity,
+                   priority=priority, supersede=supersede, coalesce=coalesce)
 
@@ -0,0 +1,168 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""A model thread that distributes the tasks posted to it over a pool of
+worker threads.
+
+Every worker runs in its own thread, and thus has its own session, since the
+elixir session is scoped to the thread.  Objects loaded in the session of one
+worker should never be used by another worker.  Since proxies, views and 
+editors pass objects to each other, all tasks are handled by the first 
+worker, in the order in which they were posted, unless they are posted with
+an explicit affinity.
+
+Tasks with an explicit affinity are routed to a worker by their affinity, all
+tasks with the same affinity are handled by the same worker, while tasks with
+a different affinity might run in parallel.  Only tasks that do not exchange
+objects with other tasks should be posted with an affinity, such as exports
+or queries that return plain values.
+
+The number of workers is set with the MODEL_THREADS setting.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger('camelot.view.model_thread.model_thread_pool')
+
+from PyQt4 import QtCore
+
+from camelot.view.model_thread import AbstractModelThread, gui_function, \
+                                      setup_model, PRIORITY_NORMAL
+from camelot.view.model_thread.signal_slot_model_thread import SignalSlotModelThread
+
+class ModelThreadPool( AbstractModelThread ):
+    """A model thread implementation that distributes the tasks over a
+    number of SignalSlotModelThreads, the pool itself does not run any
+    tasks.
+    """
+
+    def __init__( self, setup_thread = setup_model, workers = 2 ):
+        """
+        :param setup_thread: function to be called at startup of the first
+        worker, the other workers only start handling tasks when it has
+        finished
+        :param workers: the number of worker threads
+        """
+        super(ModelThreadPool, self).__init__( setup_thread )
+        self._setup_finished = threading.Event()
+        self._busy_workers = set()
+        self._busy_workers_lock = threading.Lock()
+        self._workers = [ SignalSlotModelThread( self._setup_first_worker ) ]
+        for _i in range( workers - 1 ):
+            self._workers.append( SignalSlotModelThread( self._setup_finished.wait ) )
+        for worker in self._workers:
+            worker.thread_busy_signal.connect( self._create_worker_busy( worker ) )
+        self._workers[0].setup_exception_signal.connect( self.setup_exception_signal )
+
+    def _setup_first_worker( self ):
+        try:
+            self._setup_thread()
+        finally:
+            self._setup_finished.set()
+
+    def _create_worker_busy( self, worker ):
+
+        def worker_busy( busy_state ):
+            self._busy_workers_lock.acquire()
+            try:
+                was_busy = len( self._busy_workers ) > 0
+                if busy_state:
+                    self._busy_workers.add( worker )
+                else:
+                    self._busy_workers.discard( worker )
+                is_busy = len( self._busy_workers ) > 0
+            finally:
+                self._busy_workers_lock.release()
+            if is_busy != was_busy:
+                self.thread_busy_signal.emit( is_busy )
+
+        return worker_busy
+
+    @property
+    def workers( self ):
+        """The worker threads of this pool"""
+        return self._workers
+
+    def start( self ):
+        for worker in self._workers:
+            worker.start()
+
+    def isRunning( self ):
+        return self._workers[0].isRunning()
+
+    def quit( self ):
+        for worker in self._workers:
+            worker.quit()
+
+    def wait( self, *args ):
+        return all( [ worker.wait( *args ) for worker in self._workers ] )
+
+    def traceback( self ):
+        return self._workers[0].traceback()
+
+    def is_model_thread( self, thread ):
+        for worker in self._workers:
+            if worker == thread:
+                return True
+        return False
+
+    def get_worker( self, affinity = None ):
+        """:return: the worker that handles the tasks with an affinity"""
+        if affinity is None:
+            return self._workers[0]
+        return self._workers[ hash( affinity ) % len( self._workers ) ]
+
+    def post( self, request, response = None, exception = None, affinity = None,
+              priority = PRIORITY_NORMAL, supersede = None, coalesce = None ):
+        return self.get_worker( affinity ).post( request, response, exception,
+                                                 priority = priority,
+                                                 supersede = supersede,
+                                                 coalesce = coalesce )
+
+    def enable_profiler( self, profiler = None ):
+        profiler = super(ModelThreadPool, self).enable_profiler( profiler )
+        for worker in self._workers:
+            worker.profiler = profiler
+        return profiler
+
+    def get_task_statistics( self ):
+        """:return: the task statistics of all workers summed"""
+        statistics = dict()
+        for worker in self._workers:
+            for key, value in worker.get_task_statistics().items():
+                statistics[key] = statistics.get( key, 0 ) + value
+        return statistics
+
+    def busy( self ):
+        for worker in self._workers:
+            if worker.busy():
+                return True
+        return False
+
+    @gui_function
+    def wait_on_work( self ):
+        app = QtCore.QCoreApplication.instance()
+        while self.busy():
+            app.processEvents()
@@ -32,6 +32,7 @@ logger = logging.getLogger('camelot.view.model_thread.no_thread_model_thread')
 
 from PyQt4 import QtCore
 from signal_slot_model_thread import AbstractModelThread, setup_model
+from camelot.view.model_thread import TaskHandle, PRIORITY_NORMAL
 from camelot.view.controls.exception import register_exception
 
 class NoThreadModelThread( AbstractModelThread ):
@@ -48,7 +49,8 @@ class NoThreadModelThread( AbstractModelThread ):
             name, trace = register_exception(logger, 'Exception when setting up the NoThreadModelThread', e)
             self.setup_exception_signal.emit(name, trace)
 
-    def post( self, request, response = None, exception = None ):
+    def post( self, request, response = None, exception = None, affinity = None,
+              priority = PRIORITY_NORMAL, supersede = None, coalesce = None ):
         try:
             result = request()
             response( result )
@@ -62,6 +64,8 @@ class NoThreadModelThread( AbstractModelThread ):
                 sio.close()
                 exception_info = (e, traceback_print)
                 exception(exception_info)
+        # the request has been handled, so it cannot be cancelled
+        return TaskHandle()
 
     def wait_on_work(self):
         app = QtCore.QCoreApplication.instance()
@@ -0,0 +1,275 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""Profiler for the tasks handled by the model thread.
+
+For each task, the profiler records its name, the code that posted it, the
+time it waited in the queue, the time it took to run and the time spent in
+sql statements.  Rolling percentiles of those times are kept for each task
+name, and the recorded tasks can be exported as a Chrome trace event file,
+to be inspected with chrome://tracing.
+
+Profiling is enabled with the MODEL_THREAD_PROFILER setting.  The time spent
+in sql statements is only recorded for engines created with the proxy returned
+by create_sql_timing_proxy, eg. in the ENGINE function of the settings ::
+
+    def ENGINE():
+        from sqlalchemy import create_engine
+        from camelot.view.model_thread.profiler import create_sql_timing_proxy
+        return create_engine('sqlite:///model-data.sqlite',
+                             proxy=create_sql_timing_proxy())
+"""
+
+from collections import deque
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger('camelot.view.model_thread.profiler')
+
+# the profilers that record the time spent in sql statements
+_sql_profilers_ = []
+
+def create_sql_timing_proxy():
+    """:return: a sqlalchemy ConnectionProxy that reports the time spent in
+    each sql statement to the profilers that installed sql timing, to be
+    passed as the proxy argument of create_engine"""
+    from sqlalchemy.interfaces import ConnectionProxy
+
+    class SQLTimingProxy(ConnectionProxy):
+
+        def cursor_execute(self, execute, cursor, statement, parameters, context, executemany):
+            if not _sql_profilers_:
+                return execute(cursor, statement, parameters, context)
+            started = time.time()
+            try:
+                return execute(cursor, statement, parameters, context)
+            finally:
+                duration = time.time() - started
+                for profiler in _sql_profilers_:
+                    profiler.sql_executed(duration)
+
+    return SQLTimingProxy()
+
+def percentile(sorted_values, percent):
+    """:return: the value below which percent of the sorted values are,
+    None if there are no values"""
+    if not sorted_values:
+        return None
+    index = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+def get_poster(skip_directory=os.path.dirname(__file__)):
+    """:return: a string describing the code that posted the current task,
+    being the first function on the stack outside the model thread package"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if os.path.dirname(code.co_filename) != skip_directory:
+            return u'%s:%s %s'%(os.path.basename(code.co_filename),
+                                frame.f_lineno,
+                                code.co_name)
+        frame = frame.f_back
+    return u''
+
+class TaskRecord(object):
+    """The times recorded for a single task, all times are in seconds"""
+
+    __slots__ = ('name', 'poster', 'thread', 'posted', 'started', 'finished',
+                 'sql_time', 'sql_statements')
+
+    def __init__(self, name, poster, posted, started, thread):
+        self.name = name
+        self.poster = poster
+        self.thread = thread
+        self.posted = posted
+        self.started = started
+        self.finished = None
+        self.sql_time = 0.0
+        self.sql_statements = 0
+
+    @property
+    def queue_time(self):
+        return self.started - self.posted
+
+    @property
+    def run_time(self):
+        return (self.finished or self.started) - self.started
+
+class ModelThreadProfiler(object):
+    """Keeps the records and statistics of the tasks handled by one or more
+    model threads.  Its methods can be called from any thread.
+
+    .. attribute:: max_records
+
+    the number of most recent tasks that are kept for the trace export
+
+    .. attribute:: window
+
+    the number of most recent tasks of each name used to calculate the
+    percentiles
+    """
+
+    max_records = 10000
+    window = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=self.max_records)
+        # name : (count, deque of run times, deque of sql times)
+        self._statistics = dict()
+        self._queue_times = deque(maxlen=self.window)
+        self._current = threading.local()
+        self.started = time.time()
+
+    def task_started(self, name, poster, posted):
+        """Called in the model thread when a task starts running
+        :return: the TaskRecord of the task"""
+        record = TaskRecord(name, poster, posted, time.time(),
+                            threading.currentThread().getName())
+        self._current.record = record
+        return record
+
+    def task_finished(self, record):
+        """Called in the model thread when a task has finished"""
+        record.finished = time.time()
+        self._current.record = None
+        self._lock.acquire()
+        try:
+            self._records.append(record)
+            self._queue_times.append(record.queue_time)
+            try:
+                count, run_times, sql_times = self._statistics[record.name]
+            except KeyError:
+                count, run_times, sql_times = 0, deque(maxlen=self.window), deque(maxlen=self.window)
+            run_times.append(record.run_time)
+            sql_times.append(record.sql_time)
+            self._statistics[record.name] = (count + 1, run_times, sql_times)
+        finally:
+            self._lock.release()
+
+    def sql_executed(self, duration):
+        """Called when an sql statement has been executed, to add its duration
+        to the task running in the current thread"""
+        record = getattr(self._current, 'record', None)
+        if record is not None:
+            record.sql_time += duration
+            record.sql_statements += 1
+
+    def get_summary(self):
+        """:return: a list with a dictionary for each task name with the
+        number of tasks and the percentiles of their run time and sql time,
+        the task with the slowest 90th percentile first"""
+        self._lock.acquire()
+        try:
+            statistics = [(name, count, sorted(run_times), sorted(sql_times))
+                          for name, (count, run_times, sql_times) in self._statistics.items()]
+        finally:
+            self._lock.release()
+        summary = []
+        for name, count, run_times, sql_times in statistics:
+            summary.append(dict(name = name,
+                                count = count,
+                                p50 = percentile(run_times, 50),
+                                p90 = percentile(run_times, 90),
+                                p99 = percentile(run_times, 99),
+                                max = run_times[-1],
+                                sql_p90 = percentile(sql_times, 90)))
+        summary.sort(key=lambda task_summary:task_summary['p90'], reverse=True)
+        return summary
+
+    def get_queue_time_percentiles(self):
+        """:return: a dictionary with the 50th, 90th and 99th percentile of
+        the time tasks waited in the queue"""
+        self._lock.acquire()
+        try:
+            queue_times = sorted(self._queue_times)
+        finally:
+            self._lock.release()
+        return dict(p50 = percentile(queue_times, 50),
+                    p90 = percentile(queue_times, 90),
+                    p99 = percentile(queue_times, 99))
+
+    def get_slowest_tasks(self, number=20):
+        """:return: the number slowest of the recent TaskRecords"""
+        self._lock.acquire()
+        try:
+            records = list(self._records)
+        finally:
+            self._lock.release()
+        records.sort(key=lambda record:record.run_time, reverse=True)
+        return records[:number]
+
+    def get_trace_events(self):
+        """:return: a list of Chrome trace events, with for each recorded
+        task an event for the time waiting in the queue and an event for the
+        time running"""
+        self._lock.acquire()
+        try:
+            records = list(self._records)
+        finally:
+            self._lock.release()
+        pid = os.getpid()
+        events = []
+        for record in records:
+            args = dict(poster = record.poster,
+                        sql_time = record.sql_time,
+                        sql_statements = record.sql_statements)
+            events.append(dict(name = record.name,
+                               cat = 'queue',
+                               ph = 'X',
+                               ts = int((record.posted - self.started) * 1000000),
+                               dur = int(record.queue_time * 1000000),
+                               pid = pid,
+                               tid = 'queue',
+                               args = args))
+            events.append(dict(name = record.name,
+                               cat = 'task',
+                               ph = 'X',
+                               ts = int((record.started - self.started) * 1000000),
+                               dur = int(record.run_time * 1000000),
+                               pid = pid,
+                               tid = record.thread,
+                               args = args))
+        return events
+
+    def export_chrome_trace(self, filename):
+        """Write the recorded tasks to a file in the Chrome trace event
+        format"""
+        import json
+        trace_file = open(filename, 'w')
+        try:
+            json.dump(dict(traceEvents = self.get_trace_events(),
+                           displayTimeUnit = 'ms'),
+                      trace_file)
+        finally:
+            trace_file.close()
+
+    def install_sql_timing(self):
+        """Measure the time spent in sql statements executed through the
+        engines created with the proxy of create_sql_timing_proxy"""
+        if self not in _sql_profilers_:
+            _sql_profilers_.append(self)
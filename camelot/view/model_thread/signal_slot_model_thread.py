@@ -26,17 +26,26 @@ Created on Sep 9, 2009
 
 @author: tw55413
 '''
+import heapq
 import logging
 import sys
+import time
 logger = logging.getLogger('camelot.view.model_thread.signal_slot_model_thread')
 
 from PyQt4 import QtCore
+import sip
 
-from camelot.view.model_thread import AbstractModelThread, gui_function, setup_model
+from camelot.view.model_thread import AbstractModelThread, gui_function, \
+                                      setup_model, TaskHandle, PRIORITY_NORMAL
+from camelot.view.model_thread.profiler import get_poster
 from camelot.core.threading import synchronized
 from camelot.view.controls.exception import register_exception
 
 class Task(QtCore.QObject):
+    """A request to be executed in the model thread.  Once its response has
+    been delivered, a task is cleared and either reused for another request,
+    or deleted within the thread it belongs to.
+    """
 
     finished = QtCore.pyqtSignal(object)
     exception = QtCore.pyqtSignal(object)
@@ -45,13 +54,47 @@ class Task(QtCore.QObject):
         QtCore.QObject.__init__(self)
         self._request = request
         self._name = name
+        self._profiler = None
+        self._poster = None
+        self._posted = None
+
+    def set_request(self, request, name=''):
+        """Reuse a cleared task for a new request"""
+        self._request = request
+        self._name = name
+
+    def set_profiler(self, profiler, poster):
+        """Record the execution of this task with a profiler
+        :param poster: a description of the code that posted the task"""
+        self._profiler = profiler
+        self._poster = poster
+        self._posted = time.time()
 
     def clear(self):
-        """clear this tasks references to other objects"""
+        """clear this tasks references to other objects, and disconnect its
+        signals, so it can be reused"""
         self._request = None
         self._name = None
+        self._profiler = None
+        self._poster = None
+        for signal in (self.finished, self.exception):
+            try:
+                signal.disconnect()
+            except TypeError:
+                # the signal was not connected
+                pass
 
     def execute(self):
+        if self._profiler:
+            record = self._profiler.task_started(self._name, self._poster, self._posted)
+            try:
+                self._execute()
+            finally:
+                self._profiler.task_finished(record)
+        else:
+            self._execute()
+
+    def _execute(self):
         logger.debug('executing %s' % (self._name))
         try:
             result = self._request()
@@ -68,10 +111,12 @@ class Task(QtCore.QObject):
 class TaskHandler(QtCore.QObject):
     """A task handler is an object that handles tasks that appear in a queue,
     when its handle_task method is called, it will sequentially handle all tasks
-    that are in the queue.
+    that are in the queue.  Each handled task is emitted through the
+    task_handled_signal.
     """
 
     task_handler_busy_signal = QtCore.pyqtSignal(bool)
+    task_handled_signal = QtCore.pyqtSignal(object)
 
     def __init__(self, queue):
         """:param queue: the queue from which to pop a task when handle_task
@@ -79,7 +124,6 @@ class TaskHandler(QtCore.QObject):
         QtCore.QObject.__init__(self)
         self._mutex = QtCore.QMutex()
         self._queue = queue
-        self._tasks_done = []
         self._busy = False
         logger.debug("TaskHandler created.")
 
@@ -95,13 +139,7 @@ class TaskHandler(QtCore.QObject):
         task = self._queue.pop()
         while task:
             task.execute()
-            # we keep track of the tasks done to prevent them being garbage collected
-            # apparently when they are garbage collected, they are recycled, but their
-            # signal slot connections seem to survive this recycling.
-            # @todo: this should be investigated in more detail, since we are causing
-            #        a deliberate memory leak here
-            task.clear()
-            self._tasks_done.append(task)
+            self.task_handled_signal.emit( task )
             task = self._queue.pop()
         self.task_handler_busy_signal.emit( False )
         self._busy = False
@@ -112,9 +150,14 @@ class SignalSlotModelThread( AbstractModelThread ):
 
     there is no explicit model thread verification on these methods,
     since this model thread might not be THE model thread.
+
+    Tasks that have been cancelled, or whose response has been delivered,
+    are retired : they are cleared and kept to be reused for new requests.
+    When more than max_retained_tasks are kept, the others are deleted.
     """
 
     task_available = QtCore.pyqtSignal()
+    max_retained_tasks = 50
 
     def __init__( self, setup_thread = setup_model ):
         """
@@ -125,7 +168,19 @@ class SignalSlotModelThread( AbstractModelThread ):
         super(SignalSlotModelThread, self).__init__( setup_thread )
         self._task_handler = None
         self._mutex = QtCore.QMutex()
+        # a heap of [priority, sequence, task, key] entries, the task is set
+        # to None when it is cancelled or handled, the key is the supersede
+        # or coalesce key of the request
         self._request_queue = []
+        self._sequence = 0
+        # the entries in the queue, for each supersede or coalesce key
+        self._keyed_entries = dict()
+        # tasks that have been retired and can be reused
+        self._retained_tasks = []
+        self._tasks_created = 0
+        self._tasks_recycled = 0
+        self._tasks_deleted = 0
+        self._tasks_coalesced = 0
         self._connected = False
         self._setup_busy = True
 
@@ -133,6 +188,7 @@ class SignalSlotModelThread( AbstractModelThread ):
         self.logger.debug( 'model thread started' )
         self._task_handler = TaskHandler(self)
         self._task_handler.task_handler_busy_signal.connect(self._thread_busy, QtCore.Qt.QueuedConnection)
+        self._task_handler.task_handled_signal.connect(self._task_handled, QtCore.Qt.QueuedConnection)
         self._thread_busy(True)
         try:
             self._setup_thread()
@@ -152,18 +208,51 @@ class SignalSlotModelThread( AbstractModelThread ):
     def _thread_busy(self, busy_state):
         self.thread_busy_signal.emit( busy_state )
 
+    @QtCore.pyqtSlot( object )
+    def _task_handled(self, task):
+        # the response of a task is queued in the gui thread, disconnecting
+        # the signals of the task before it is delivered would drop the
+        # response, so the task is only retired by this slot, which runs in
+        # the gui thread after the events the task emitted
+        self.retire( task )
+
     @synchronized
-    def post( self, request, response = None, exception = None ):
+    def post( self, request, response = None, exception = None, affinity = None,
+              priority = PRIORITY_NORMAL, supersede = None, coalesce = None ):
         if not self._connected and self._task_handler:
             # creating this connection in the model thread throws QT exceptions
             self.task_available.connect( self._task_handler.handle_task, QtCore.Qt.QueuedConnection )
             self._connected = True
+        assert supersede == None or coalesce == None
+        if coalesce != None:
+            coalesced_entry = self._keyed_entries.get( coalesce, None )
+            if coalesced_entry and coalesced_entry[2] != None:
+                # merge with the request in the queue, but move it to the
+                # position of the new request, since it might depend on the
+                # requests posted in between
+                task = coalesced_entry[2]
+                coalesced_entry[2] = None
+                self.logger.debug( 'coalesce %s'%task._name )
+                self._tasks_coalesced += 1
+                entry = [priority, self._sequence, task, coalesce]
+                self._sequence += 1
+                self._keyed_entries[coalesce] = entry
+                heapq.heappush( self._request_queue, entry )
+                return TaskHandle( self, entry )
         # response should be a slot method of a QObject
         if response:
             name = '%s -> %s.%s'%(request.__name__, response.im_self.__class__.__name__, response.__name__)
         else:
             name = request.__name__
-        task = Task(request, name=name)
+        if self._retained_tasks:
+            task = self._retained_tasks.pop()
+            task.set_request(request, name=name)
+            self._tasks_recycled += 1
+        else:
+            task = Task(request, name=name)
+            self._tasks_created += 1
+        if self.profiler:
+            task.set_profiler(self.profiler, get_poster())
         # QObject::connect is a thread safe function
         if response:
             assert response.im_self != None
@@ -175,16 +264,82 @@ class SignalSlotModelThread( AbstractModelThread ):
             task.exception.connect( exception, QtCore.Qt.QueuedConnection )
         # task.moveToThread(self)
         # only put the task in the queue when it is completely set up
-        self._request_queue.append(task)
+        key = supersede
+        if key == None:
+            key = coalesce
+        entry = [priority, self._sequence, task, key]
+        self._sequence += 1
+        if supersede != None:
+            superseded_entry = self._keyed_entries.get( supersede, None )
+            if superseded_entry:
+                self._cancel( superseded_entry )
+        if key != None:
+            self._keyed_entries[key] = entry
+        heapq.heappush( self._request_queue, entry )
         #print 'task created --->', id(task)
         self.task_available.emit()
+        return TaskHandle( self, entry )
+
+    def _remove_key( self, entry ):
+        key = entry[3]
+        if key != None and self._keyed_entries.get( key, None ) is entry:
+            del self._keyed_entries[key]
+
+    def _cancel( self, entry ):
+        task = entry[2]
+        if task == None:
+            return False
+        self.logger.debug( 'cancel %s'%task._name )
+        entry[2] = None
+        self._remove_key( entry )
+        self._retire( task )
+        return True
+
+    def _retire( self, task ):
+        task.clear()
+        if len( self._retained_tasks ) < self.max_retained_tasks:
+            self._retained_tasks.append( task )
+        else:
+            # the task belongs to the thread in which it was created, so it
+            # should be deleted by that thread, after the events it emitted
+            # have been handled
+            sip.transferto( task, None )
+            task.deleteLater()
+            self._tasks_deleted += 1
+
+    @synchronized
+    def retire( self, task ):
+        """Retire a task whose response has been delivered, to reuse or
+        delete it"""
+        self._retire( task )
+
+    @synchronized
+    def get_task_statistics( self ):
+        """:return: a dictionary with the number of tasks created, reused
+        and deleted, the number of live tasks that are waiting or executing
+        and the number of retained tasks, waiting to be reused"""
+        retained = len( self._retained_tasks )
+        return dict( created = self._tasks_created,
+                     recycled = self._tasks_recycled,
+                     deleted = self._tasks_deleted,
+                     coalesced = self._tasks_coalesced,
+                     retained = retained,
+                     live = self._tasks_created - self._tasks_deleted - retained )
+
+    @synchronized
+    def cancel( self, entry ):
+        return self._cancel( entry )
 
     @synchronized
     def pop( self ):
         """Pop a task from the queue, return None if the queue is empty"""
-        if len(self._request_queue):
-            task = self._request_queue.pop(0)
-            return task
+        while len(self._request_queue):
+            entry = heapq.heappop( self._request_queue )
+            task = entry[2]
+            if task != None:
+                entry[2] = None
+                self._remove_key( entry )
+                return task
 
     @synchronized
     def busy( self ):
@@ -34,17 +34,20 @@ logger = logging.getLogger( 'camelot.view.proxy.collection_proxy' )
 
 import datetime
 import itertools
+import operator
 
-from PyQt4.QtCore import Qt, QThread
+from PyQt4.QtCore import Qt
 from PyQt4 import QtGui, QtCore
 import sip
 
 from camelot.view.art import Icon
 from camelot.view.fifo import Fifo
+from camelot.view.proxy.read_ahead import ReadAheadPolicy, rows_to_ranges
+from camelot.view.proxy.row_mapper import SortingRowMapper
 from camelot.view.controls import delegates
 from camelot.view.remote_signals import get_signal_handler
 from camelot.view.model_thread import gui_function, \
-                                      model_function, post
+                                      model_function, post, PRIORITY_LOW
 
 from camelot.core.files.storage import StoredImage
 
@@ -108,41 +111,122 @@ def strip_data_from_object( obj, columns ):
             row_data.append( field_value )
     return row_data
 
-@model_function
-def stripped_data_to_unicode( stripped_data, obj, static_field_attributes, dynamic_field_attributes ):
-    """Extract for each field in the row data a 'visible' form of
-    data"""
+def _list_to_unicode( field_data ):
+    return u'.'.join( [unicode( e ) for e in field_data] )
 
-    row_data = []
+def _datetime_to_unicode( field_data ):
+    if field_data.year >= 1900:
+        return field_data.strftime( '%d/%m/%Y %H:%M' )
+    return u''
+
+def _date_to_unicode( field_data ):
+    if field_data.year >= 1900:
+        return field_data.strftime( '%d/%m/%Y' )
+    return u''
+
+def _image_to_unicode( field_data ):
+    return field_data.checkout_thumbnail(100, 100)
 
-    for field_data, static_attributes, dynamic_attributes in zip( stripped_data, static_field_attributes, dynamic_field_attributes ):
-        unicode_data = u''
-        choices = dynamic_attributes.get( 'choices', static_attributes.get('choices', None))
-        if 'unicode_format' in static_attributes:
-            unicode_format = static_attributes['unicode_format']
+#
+# the function to convert a value to its 'visible' form, for each type of
+# value encountered, filled as new types are encountered
+#
+_value_to_unicode_ = { unicode: unicode,
+                       str: unicode,
+                       int: unicode,
+                       float: unicode,
+                       bool: unicode,
+                       list: _list_to_unicode,
+                       datetime.datetime: _datetime_to_unicode,
+                       datetime.date: _date_to_unicode, }
+
+def _type_to_unicode( value_type ):
+    """:return: the function to convert values of type value_type to a
+    'visible' form"""
+    # datetime should come before date since datetime is a subtype of date
+    for base_type, function in ( ( list, _list_to_unicode ),
+                                 ( datetime.datetime, _datetime_to_unicode ),
+                                 ( datetime.date, _date_to_unicode ),
+                                 ( StoredImage, _image_to_unicode ) ):
+        if issubclass( value_type, base_type ):
+            return function
+    return unicode
+
+def value_to_unicode( field_data ):
+    """:return: a 'visible' form of a value without choices or a
+    unicode_format"""
+    if field_data is None:
+        return u''
+    value_type = type( field_data )
+    try:
+        function = _value_to_unicode_[value_type]
+    except KeyError:
+        function = _type_to_unicode( value_type )
+        _value_to_unicode_[value_type] = function
+    return function( field_data )
+
+def _choice_to_unicode( choices, field_data ):
+    unicode_data = field_data
+    for key, value in choices:
+        if key == field_data:
+            unicode_data = value
+    return unicode_data
+
+def create_column_formatter( static_attributes ):
+    """Compile the static field attributes of a column into a function that
+    converts the data of a field to its 'visible' form.
+
+    :param static_attributes: the static field attributes of the column
+    :return: a function that takes the field data and the dynamic field
+    attributes of the field, and returns its 'visible' form
+    """
+    if 'unicode_format' in static_attributes:
+        unicode_format = static_attributes['unicode_format']
+
+        def format_field( field_data, dynamic_attributes ):
             if field_data != None:
-                unicode_data = unicode_format( field_data )
-        elif choices:
-            unicode_data = field_data
-            for key, value in choices:
-                if key == field_data:
-                    unicode_data = value
-        elif isinstance( field_data, list ):
-            unicode_data = u'.'.join( [unicode( e ) for e in field_data] )
-        elif isinstance( field_data, datetime.datetime ):
-            # datetime should come before date since datetime is a subtype of date
-            if field_data.year >= 1900:
-                unicode_data = field_data.strftime( '%d/%m/%Y %H:%M' )
-        elif isinstance( field_data, datetime.date ):
-            if field_data.year >= 1900:
-                unicode_data = field_data.strftime( '%d/%m/%Y' )
-        elif isinstance( field_data, StoredImage):
-            unicode_data = field_data.checkout_thumbnail(100, 100)
-        elif field_data != None:
-            unicode_data = unicode( field_data )
-        row_data.append( unicode_data )
+                return unicode_format( field_data )
+            return u''
+
+        return format_field
+    static_choices = static_attributes.get( 'choices', None )
+    if callable( static_choices ):
+        static_choices = None
+    choices_dict = None
+    if static_choices:
+        try:
+            # the last choice with a key wins, as with a lookup in the list
+            choices_dict = dict( static_choices )
+        except TypeError:
+            pass
 
-    return row_data
+    def format_field( field_data, dynamic_attributes ):
+        if 'choices' in dynamic_attributes:
+            choices = dynamic_attributes['choices']
+            if choices:
+                return _choice_to_unicode( choices, field_data )
+        elif choices_dict != None:
+            try:
+                return choices_dict.get( field_data, field_data )
+            except TypeError:
+                return field_data
+        elif static_choices:
+            return _choice_to_unicode( static_choices, field_data )
+        return value_to_unicode( field_data )
+
+    return format_field
+
+@model_function
+def stripped_data_to_unicode( stripped_data, obj, static_field_attributes, dynamic_field_attributes, formatters = None ):
+    """Extract for each field in the row data a 'visible' form of
+    data
+    
+    :param formatters: the functions created by create_column_formatter for
+    each field, if they were created allready
+    """
+    if formatters == None:
+        formatters = [create_column_formatter( static_attributes ) for static_attributes in static_field_attributes]
+    return [formatter( field_data, dynamic_attributes ) for formatter, field_data, dynamic_attributes in zip( formatters, stripped_data, dynamic_field_attributes )]
 
 from camelot.view.proxy import ValueLoading
 
@@ -150,17 +234,33 @@ class EmptyRowData( object ):
     def __getitem__( self, column ):
         return ValueLoading
 
-empty_row_data = EmptyRowData()
+empty_values = EmptyRowData()
 
-class SortingRowMapper( dict ):
-    """Class mapping rows of a collection 1:1 without sorting
-    and filtering, unless a mapping has been defined explicitly"""
+class RowData( object ):
+    """The cached data of a single row, the entity itself is kept by
+    the cache.
 
-    def __getitem__(self, row):
-        try:
-            return super(SortingRowMapper, self).__getitem__(row)
-        except KeyError:
-            return row
+    .. attribute:: edit
+
+    a list with the values to be used in an editor, one for each column
+
+    .. attribute:: display
+
+    a list with the unicode representations of the values, one for each column
+
+    .. attribute:: attributes
+
+    a list with the dynamic field attributes, one dictionary for each column
+    """
+
+    __slots__ = ( 'edit', 'display', 'attributes' )
+
+    def __init__( self, edit, display, attributes ):
+        self.edit = edit
+        self.display = display
+        self.attributes = attributes
+
+empty_row_data = RowData( empty_values, empty_values, empty_values )
 
 class CollectionProxy( QtCore.QAbstractTableModel ):
     """The CollectionProxy contains a limited copy of the data in the actual
@@ -171,6 +271,9 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
 
     * header_icon : the icon to be used in the vertical header
 
+    * max_fetch_gap : the maximum number of rows between two ranges of rows
+      under request, for which both ranges are fetched as a single range
+
     """
 
     _header_font = QtGui.QApplication.font()
@@ -178,13 +281,15 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
     _header_font_required.setBold( True )
 
     header_icon = Icon( 'tango/16x16/places/folder.png' )
+    max_fetch_gap = 10
 
     item_delegate_changed_signal = QtCore.pyqtSignal()
     row_changed_signal = QtCore.pyqtSignal(int)
 
     @gui_function
     def __init__( self, admin, collection_getter, columns_getter,
-                 max_number_of_rows = 10, edits = None, flush_changes = True ):
+                 max_number_of_rows = 10, edits = None, flush_changes = True,
+                 max_cache_rows = None, max_cache_size = None ):
         """@param admin: the admin interface for the items in the collection
 
         @param collection_getter: a function that takes no arguments and returns
@@ -196,6 +301,13 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
         @param columns_getter: a function that takes no arguments and returns the
         columns that will be cached in the proxy. This function will be called
         inside the model thread.
+
+        @param max_cache_rows: the maximum number of rows to keep in the cache,
+        defaults to 10 times max_number_of_rows
+
+        @param max_cache_size: the maximum number of bytes the cached rows are
+        estimated to use, defaults to None, meaning only the number of rows
+        is limited.  Use this for tables with a lot of columns.
         """
         super(CollectionProxy, self).__init__()
         from camelot.view.model_thread import get_model_thread
@@ -220,14 +332,27 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
         self.mt = get_model_thread()
         # Set database connection and load data
         self._rows = 0
+        # the fingerprint of the query of which the number of rows is
+        # kept in the row count cache, if any
+        self._row_count_key = None
         self._columns = []
+        self._column_formatters = ( self._columns, [] )
         self._static_field_attributes = []
         self.max_number_of_rows = max_number_of_rows
-        self.display_cache = Fifo( 10 * self.max_number_of_rows )
-        self.edit_cache = Fifo( 10 * self.max_number_of_rows )
-        self.attributes_cache = Fifo( 10 * self.max_number_of_rows )
+        self.max_cache_rows = max_cache_rows or 10 * self.max_number_of_rows
+        self.max_cache_size = max_cache_size
+        self._create_cache()
         # The rows in the table for which a cache refill is under request
         self.rows_under_request = set()
+        # The rows that will probably become visible soon, those are fetched
+        # with a low priority
+        self.rows_to_prefetch = set()
+        # True if a request to extend the cache or to prefetch rows has been
+        # posted, but the rows to get have not yet been determined by the 
+        # model thread
+        self._extend_cache_requested = False
+        self._prefetch_requested = False
+        self._read_ahead = ReadAheadPolicy( maximal_page_size = self.max_cache_rows / 2 )
         self._update_requests = list()
         # The rows that have unflushed changes
         self.unflushed_rows = set()
@@ -250,6 +375,14 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
         post( self.getRowCount, self.setRowCount )
         self.logger.debug( 'initialization finished' )
 
+    def _create_cache(self):
+        """Create a new, empty cache for the row data"""
+        self.cache = Fifo( self.max_cache_rows, self.max_cache_size )
+
+    def get_cache_statistics(self):
+        """:return: a dictionary with the usage statistics of the cache"""
+        return self.cache.get_statistics()
+
     def get_validator(self):
         return self.validator
 
@@ -276,9 +409,11 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
 
     @model_function
     def getRowCount( self ):
+        collection = self.collection_getter()
+        rows = self._sort_and_filter.update( collection )
         # make sure we don't count an object twice if it is twice
         # in the list, since this will drive the cache nuts
-        rows = len( set( self.collection_getter() ) )
+        rows = len( set( collection[self._sort_and_filter[row]] for row in xrange( rows ) ) )
         return rows
 
     @gui_function
@@ -304,16 +439,22 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
 
     @gui_function
     def refresh( self ):
-        post( self.getRowCount, self._refresh_content )
+        self._sort_and_filter.invalidate_keys()
+        self._post_refresh_content()
+
+    def _post_refresh_content( self ):
+        """Count the rows in the model thread and refresh the content, the
+        requests to do so that are still waiting are merged"""
+        post( self.getRowCount, self._refresh_content,
+              coalesce = ( self, 'refresh_content' ) )
 
     @QtCore.pyqtSlot(int)
     @gui_function
     def _refresh_content(self, rows ):
-        self.display_cache = Fifo( 10 * self.max_number_of_rows )
-        self.edit_cache = Fifo( 10 * self.max_number_of_rows )
-        self.attributes_cache = Fifo( 10 * self.max_number_of_rows )
+        self._create_cache()
         locker = QtCore.QMutexLocker(self._mutex)
         self.rows_under_request = set()
+        self.rows_to_prefetch = set()
         self.unflushed_rows = set()
         locker.unlock()
         self.setRowCount( rows )
@@ -330,9 +471,7 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
     @gui_function
     def handleRowUpdate( self, row ):
         """Handles the update of a row when this row might be out of date"""
-        self.display_cache.delete_by_row( row )
-        self.edit_cache.delete_by_row( row )
-        self.attributes_cache.delete_by_row( row )
+        self.cache.delete_by_row( row )
         self.dataChanged.emit( self.index( row, 0 ),
                                self.index( row, self.column_count ) )
 
@@ -343,8 +482,9 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
         self.logger.debug( '%s %s received entity update signal' % \
                      ( self.__class__.__name__, self.admin.get_verbose_name() ) )
         if sender != self:
+            self._sort_and_filter.invalidate_keys()
             try:
-                row = self.display_cache.get_row_by_entity(entity)
+                row = self.cache.get_row_by_entity(self._cache_key(entity))
             except KeyError:
                 self.logger.debug( 'entity not in cache' )
                 return
@@ -412,6 +552,10 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
         """
         self.logger.debug( 'setColumns' )
         self.column_count = len( columns )
+        # the columns and their formatters are replaced at once, since the
+        # model thread might be using them
+        self._column_formatters = ( columns,
+                                    [create_column_formatter( c[1] ) for c in columns] )
         self._columns = columns
 
         delegate_manager = delegates.DelegateManager()
@@ -513,22 +657,42 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
 
     @gui_function
     def sort( self, column, order ):
-        """reimplementation of the QAbstractItemModel its sort function"""
+        """reimplementation of the QAbstractItemModel its sort function, the
+        sort is stable, so the previous sort order is kept for objects that
+        have the same value in the sorted column"""
 
         def create_sort(column, order):
 
             def sort():
-                unsorted_collection = [(i,o) for i,o in enumerate(self.collection_getter())]
-                key = lambda item:getattr(item[1], self._columns[column][0])
-                unsorted_collection.sort(key=key, reverse=order)
-                for j,(i,_o) in enumerate(unsorted_collection):
-                    self._sort_and_filter[j] = i
-                return len(unsorted_collection)
+                field_name = self._columns[column][0]
+                self._sort_and_filter.sort( field_name,
+                                            operator.attrgetter( field_name ),
+                                            bool( order ) )
+                return self.getRowCount()
 
             return sort
 
         post(create_sort(column, order), self._refresh_content)
 
+    @gui_function
+    def set_filter( self, row_filter ):
+        """Only show the objects in the collection for which a filter returns
+        True.  The filter is applied to the objects in memory, within the model
+        thread.
+        :param row_filter: a function that takes an object and returns True
+        if it should be shown, or None to show all objects
+        """
+
+        def create_set_filter(row_filter):
+
+            def set_filter():
+                self._sort_and_filter.filter = row_filter
+                return self.getRowCount()
+
+            return set_filter
+
+        post(create_set_filter(row_filter), self._refresh_content)
+
     @gui_function
     def data( self, index, role ):
         """:return: the data at index for the specified role
@@ -546,10 +710,9 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
             return QtCore.QVariant()
         if role in (Qt.EditRole, Qt.DisplayRole):
             if role == Qt.EditRole:
-                cache = self.edit_cache
+                data = self._get_row_data( index.row() ).edit
             else:
-                cache = self.display_cache
-            data = self._get_row_data( index.row(), cache )
+                data = self._get_row_data( index.row() ).display
             value = data[index.column()]
             if isinstance( value, DelayedProxy ):
                 value = value()
@@ -569,7 +732,7 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
             return QtCore.QVariant(self._get_field_attribute_value(index, 'background_color') or QtGui.QColor('White'))
         elif role == Qt.UserRole:
             field_attributes = ProxyDict(self._static_field_attributes[index.column()])
-            dynamic_field_attributes = self._get_row_data( index.row(), self.attributes_cache )[index.column()]
+            dynamic_field_attributes = self._get_row_data( index.row() ).attributes[index.column()]
             if dynamic_field_attributes != ValueLoading:
                 field_attributes.update( dynamic_field_attributes )
             return QtCore.QVariant(field_attributes)
@@ -581,7 +744,7 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
         try:
             return self._static_field_attributes[index.column()][field_attribute]
         except KeyError:
-            value = self._get_row_data( index.row(), self.attributes_cache )[index.column()]
+            value = self._get_row_data( index.row() ).attributes[index.column()]
             if value == ValueLoading:
                 return None
             return value.get(field_attribute, None)
@@ -595,6 +758,7 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
         update_requests = [u for u in self._update_requests]
         self._update_requests = []
         locker.unlock()
+        self._sort_and_filter.invalidate_keys()
         #
         # Handle the requests
         #
@@ -738,97 +902,131 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
             flags = flags | Qt.ItemIsEditable
         return flags
 
-    def _add_data(self, columns, row, obj):
+    def _add_data(self, columns, row, obj, dynamic_field_attributes=None):
         """Add data from object o at a row in the cache
         :param columns: the columns of which to strip data
         :param row: the row in the cache into which to add data
         :param obj: the object from which to strip the data
+        :param dynamic_field_attributes: the dynamic field attributes of the
+        object, if they have been computed allready
         """
         row_data = strip_data_from_object( obj, columns )
 
-        dynamic_field_attributes = list(self.admin.get_dynamic_field_attributes( obj, (c[0] for c in columns)))
+        if dynamic_field_attributes == None:
+            dynamic_field_attributes = list(self.admin.get_dynamic_field_attributes( obj, (c[0] for c in columns)))
+        formatted_columns, formatters = self._column_formatters
+        if formatted_columns is not columns:
+            formatters = None
         static_field_attributes = self.admin.get_static_field_attributes( (c[0] for c in columns) )
-        unicode_row_data = stripped_data_to_unicode( row_data, obj, static_field_attributes, dynamic_field_attributes )
+        unicode_row_data = stripped_data_to_unicode( row_data, obj, static_field_attributes, dynamic_field_attributes, formatters )
         locker = QtCore.QMutexLocker( self._mutex )
-        self.edit_cache.add_data( row, obj, row_data )
-        self.display_cache.add_data( row, obj, unicode_row_data )
-        self.attributes_cache.add_data(row, obj, dynamic_field_attributes )
+        self.cache.add_data( row, self._cache_key( obj ), RowData( row_data,
+                                                unicode_row_data,
+                                                dynamic_field_attributes ) )
         locker.unlock()
         self.row_changed_signal.emit( row )
 
+    def _cache_key(self, obj):
+        """:return: the key under which the data of an object is stored in
+        the cache, this is the object itself"""
+        return obj
+
+    def _add_rows(self, columns, rows_and_objects):
+        """Add data from multiple objects to the cache, the dynamic field
+        attributes of all objects are computed at once
+        :param columns: the columns of which to strip data
+        :param rows_and_objects: a list of (row, obj) tuples
+        """
+        if not rows_and_objects:
+            return
+        objects_field_attributes = self.admin.get_dynamic_field_attributes_of_objects( [obj for _row, obj in rows_and_objects],
+                                                                                        [c[0] for c in columns] )
+        for (row, obj), dynamic_field_attributes in zip( rows_and_objects, objects_field_attributes ):
+            self._add_data( columns, row, obj, dynamic_field_attributes )
+
     def _skip_row(self, row, obj):
         """:return: True if the object obj is allready in the cache, but at a
         different row then row.  If this is the case, this object should not
         be put in the cache at row, and this row should be skipped alltogether.
         """
         try:
-            return self.edit_cache.get_row_by_entity(obj)!=row
+            return self.cache.get_row_by_entity(self._cache_key(obj))!=row
         except KeyError:
             pass
         return False
 
-    def _offset_and_limit_rows_to_get( self ):
-        """From the current set of rows to get, find the first
-        continuous range of rows that should be fetched.
-        :return: (offset, limit)
+    def _ranges_of_rows_to_get( self, prefetch = False ):
+        """From the current set of rows to get, find the ranges of rows that
+        should be fetched.  Ranges that are close to each other are merged
+        into one range, since fetching a few rows too much is cheaper than
+        an additional query.
+        
+        :param prefetch: True if the rows to prefetch should be fetched
+            instead of the rows under request
+        :return: a list of (offset, limit) tuples
         """
-        offset, limit, previous_length, i = 0, 0, 0, 0
+        locker = QtCore.QMutexLocker(self._mutex)
         #
-        # wait for a while until the rows under request don't change any
-        # more
+        # from now on, new rows under request need a new request to
+        # extend the cache
         #
-        locker = QtCore.QMutexLocker(self._mutex)
-        while previous_length != len(self.rows_under_request):
-            previous_length = len(self.rows_under_request)
-            locker.unlock()
-            QThread.msleep(5)
-            locker.relock()
+        if prefetch:
+            self._prefetch_requested = False
+            rows_to_get = self.rows_to_prefetch
+        else:
+            self._extend_cache_requested = False
+            rows_to_get = self.rows_under_request
         #
         # now filter out all rows that have been put in the cache
         # the gui thread didn't know about
         #
-        rows_to_get = self.rows_under_request
         rows_allready_there = set()
         for row in rows_to_get:
-            if self.edit_cache.has_data_at_row(row):
+            if self.cache.has_data_at_row(row):
                 rows_allready_there.add(row)
         rows_to_get.difference_update( rows_allready_there )
-        #
-        # see if there is anything left to do
-        #
-        if rows_to_get:
-            rows_to_get = list(rows_to_get)
-            locker.unlock()
-            rows_to_get.sort()
-            offset = rows_to_get[0]
-            #
-            # find first discontinuity
-            #
-            for i in range(offset, rows_to_get[-1]+1):
-                if rows_to_get[i-offset] != i:
-                    break
-            limit = i - offset + 1
-        return (offset, limit)
+        rows_to_get = list( rows_to_get )
+        locker.unlock()
+        return rows_to_ranges( rows_to_get, self.max_fetch_gap )
 
     @model_function
-    def _extend_cache( self ):
-        """Extend the cache around the rows under request"""
-        offset, limit = self._offset_and_limit_rows_to_get()
-        if limit:
+    def _extend_cache( self, prefetch = False ):
+        """Extend the cache around the rows under request, all ranges of
+        rows are fetched within a single request
+        
+        :param prefetch: True if the rows to prefetch should be fetched
+            instead of the rows under request
+        :return: a list of (offset, limit) tuples with the ranges of rows
+        that were fetched
+        """
+        ranges = self._ranges_of_rows_to_get( prefetch )
+        if ranges:
             columns = self.getColumns()
-            collection = self.collection_getter()
-            skipped_rows = 0
-            for i in range(offset, min(offset + limit + 1, self._rows)):
-                object_found = False
-                while not object_found:
-                    unsorted_row = self._sort_and_filter[i]
-                    obj = collection[unsorted_row+skipped_rows]
-                    if self._skip_row(i, obj):
-                        skipped_rows = skipped_rows + 1
-                    else:
-                        self._add_data(columns, i, obj)
-                        object_found = True
-        return ( offset, limit )
+            for offset, limit in ranges:
+                self._extend_cache_range( columns, offset, limit )
+        return ranges
+
+    @model_function
+    def _extend_cache_range( self, columns, offset, limit ):
+        """Put a range of rows of the collection in the cache
+        :param columns: the columns of which to strip data
+        :param offset: the first row to put in the cache
+        :param limit: the number of rows to put in the cache
+        """
+        collection = self.collection_getter()
+        skipped_rows = 0
+        rows_and_objects = []
+        for i in range(offset, min(offset + limit, self._rows)):
+            object_found = False
+            while not object_found:
+                unsorted_row = self._sort_and_filter[i+skipped_rows]
+                obj = collection[unsorted_row]
+                if self._skip_row(i, obj):
+                    skipped_rows = skipped_rows + 1
+                else:
+                    rows_and_objects.append( (i, obj) )
+                    object_found = True
+        self._add_rows(columns, rows_and_objects)
 
     @model_function
     def _get_object( self, sorted_row_number ):
@@ -838,7 +1036,7 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
         try:
             # first try to get the primary key out of the cache, if it's not
             # there, query the collection_getter
-            return self.edit_cache.get_entity_at_row( sorted_row_number )
+            return self.cache.get_entity_at_row( sorted_row_number )
         except KeyError:
             pass
         try:
@@ -847,29 +1045,74 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
             pass
         return None
 
-    @QtCore.pyqtSlot(tuple)
-    def _cache_extended( self, interval ):
-        offset, limit = interval
+    def _request_extend_cache( self ):
+        """Post a request to extend the cache, unless such a request is
+        allready waiting to be handled.  This method should be called while
+        the mutex is locked."""
+        if not self._extend_cache_requested:
+            self._extend_cache_requested = True
+            post( self._extend_cache, self._cache_extended )
+
+    @model_function
+    def _prefetch_cache( self ):
+        return self._extend_cache( prefetch = True )
+
+    def _request_prefetch_cache( self ):
+        """Post a low priority request to prefetch rows, so the speculative
+        fetches never delay the rows that are visible.  This method should 
+        be called while the mutex is locked."""
+        if not self._prefetch_requested:
+            self._prefetch_requested = True
+            post( self._prefetch_cache, self._cache_extended, 
+                  priority = PRIORITY_LOW )
+
+    @QtCore.pyqtSlot(list)
+    def _cache_extended( self, ranges ):
+        locker = QtCore.QMutexLocker(self._mutex)
+        for offset, limit in ranges:
+            rows_extended = set( range( offset, offset + limit ) )
+            self.rows_under_request.difference_update( rows_extended )
+            self.rows_to_prefetch.difference_update( rows_extended )
+        if self.rows_under_request:
+            self._request_extend_cache()
+        if self.rows_to_prefetch:
+            self._request_prefetch_cache()
+        locker.unlock()
+
+    @gui_function
+    def set_viewport( self, first_row, last_row ):
+        """Inform the proxy about the rows that are visible in the view, this
+        information is used to fetch the rows that will become visible when
+        the user continues to scroll in the same direction.
+
+        :param first_row: the first visible row
+        :param last_row: the last visible row
+        """
+        self._read_ahead.viewport_changed( first_row, last_row )
+        offset, limit = self._read_ahead.rows_to_prefetch( self._rows )
         locker = QtCore.QMutexLocker(self._mutex)
-        self.rows_under_request.difference_update( set( range( offset, offset + limit + 1) ) )
+        self.rows_to_prefetch = set( row for row in range( offset, offset + limit )
+                                     if not self.cache.has_data_at_row( row ) )
+        self.rows_to_prefetch.difference_update( self.rows_under_request )
+        if self.rows_to_prefetch:
+            self._request_prefetch_cache()
         locker.unlock()
 
-    def _get_row_data( self, row, cache ):
+    def _get_row_data( self, row ):
         """Get the data which is to be visualized at a certain row of the
         table, if needed, post a refill request the cache to get the object
         and its neighbours in the cache, meanwhile, return an empty object
         :param row: the row of the table for which to get the data
-        :param cache: the cache out of which to get row data
-        :return: row_data
+        :return: a RowData object
         """
         try:
-            return cache.get_data_at_row( row )
+            return self.cache.get_data_at_row( row )
         except KeyError:
             if row not in self.rows_under_request:
                 locker = QtCore.QMutexLocker(self._mutex)
                 self.rows_under_request.add( row )
+                self._request_extend_cache()
                 locker.unlock()
-                post( self._extend_cache, self._cache_extended )
             return empty_row_data
 
     @model_function
@@ -915,9 +1158,7 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
             #
             # remove the entity from the cache
             #
-            self.display_cache.delete_by_entity( obj )
-            self.attributes_cache.delete_by_entity( obj )
-            self.edit_cache.delete_by_entity( obj )
+            self.cache.delete_by_entity( self._cache_key( obj ) )
             #
             # if needed, delete the objects
             #
@@ -930,7 +1171,7 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
                 self.admin.flush( obj )
         for depending_obj in depending_objects:
             self.rsh.sendEntityUpdate( self, depending_obj )
-        post( self.getRowCount, self._refresh_content )
+        self._post_refresh_content()
 
     @gui_function
     def remove_rows( self, rows, delete = True ):
@@ -964,31 +1205,40 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
             def copy_function():
                 o = self._get_object(row)
                 new_object = self.admin.copy( o )
-                self.insertEntityInstance(self.getRowCount(), new_object)
+                self.insertEntityInstance(None, new_object)
 
             return copy_function
 
         post( create_copy_function( row ) )
         return True
 
+    @model_function
+    def _get_row_of_object( self, o ):
+        """:return: the row of an object in the collection, None if it is
+        filtered out"""
+        # with a sort or a filter active, the object is not necessarily
+        # in the last row
+        collection = self.collection_getter()
+        self._sort_and_filter.update( collection )
+        return self._sort_and_filter.get_row( collection.index( o ) )
+
     @model_function
     def insertEntityInstance( self, row, o ):
         """Insert object o into this collection, set the possible defaults and flush
         the object if possible/needed
         :param o: the object to be added to the collection
-        :return: the row at which the object was inserted
+        :return: the row at which the object was inserted, None if the object
+        is filtered out
         """
         self.append( o )
         # defaults might depend on object being part of a collection
         self.admin.set_defaults( o )
-        row = self.getRowCount() - 1
-        self.unflushed_rows.add( row )
+        row = self._get_row_of_object( o )
+        if row != None:
+            self.unflushed_rows.add( row )
         if self.flush_changes and not len( self.validator.objectValidity( o ) ):
             self.admin.flush( o )
-            try:
-                self.unflushed_rows.remove( row )
-            except KeyError:
-                pass
+            self.unflushed_rows.discard( row )
         for depending_obj in self.admin.get_depending_objects( o ):
             self.rsh.sendEntityUpdate( self, depending_obj )
 # TODO : it's not because an object is added to this list, that it was created
@@ -1000,7 +1250,7 @@ class CollectionProxy( QtCore.QAbstractTableModel ):
 #                       authentication = getCurrentAuthentication())
 #      elixir.session.flush([history])
 #      self.rsh.sendEntityCreate(self, o)
-        post( self.getRowCount, self._refresh_content )
+        self._post_refresh_content()
         return row
 
     @gui_function
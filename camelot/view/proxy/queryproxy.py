@@ -24,30 +24,174 @@
 
 """Proxies representing the results of a query"""
 
+import bisect
 import logging
 logger = logging.getLogger('camelot.view.proxy.queryproxy')
 
+from PyQt4 import QtCore
+
 from collection_proxy import CollectionProxy, strip_data_from_object
+from row_count import get_row_count_cache, estimate_row_count, query_fingerprint
 from camelot.view.model_thread import model_function, gui_function, post
 
+class ObjectKey(object):
+    """The key of a persistent object in the cache, used instead of the
+    object itself when only some of the columns of the objects are selected.
+    Keys of the same object are equal.
+    """
+
+    def __init__(self, identity):
+        """:param identity: a tuple with the primary key of the object"""
+        self.identity = identity
+
+    def __eq__(self, other):
+        return isinstance(other, ObjectKey) and self.identity == other.identity
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.identity)
+
+    def __unicode__(self):
+        return u','.join(unicode(value) for value in self.identity)
+
+class ProjectedObject(ObjectKey):
+    """The values of some columns of a persistent object, available as
+    attributes, as selected from the database without loading the object"""
+
+    def __init__(self, identity, values):
+        """:param values: a list of (key, value) tuples"""
+        super(ProjectedObject, self).__init__(identity)
+        self.__dict__.update(values)
+
+class KeysetIndex(object):
+    """A sparse index from row numbers to the values of the columns by which
+    the query is ordered, for the object at that row.  Those rows are used
+    as anchors, to seek to a row by filtering on the values of the ordering
+    columns instead of skipping all rows before it with an OFFSET.
+    
+    The ordering of the query should be unique, so it should end with the
+    primary key columns.
+    """
+
+    def __init__(self, ordering, nulls_last=False):
+        """:param ordering: a list of (column, getter, descending) tuples,
+        one for each column by which the query is ordered, where getter is
+        a function that returns the value of the column for an object and
+        descending is True if the query is sorted descending on the column
+        :param nulls_last: True if the database sorts NULL values after all
+        other values in an ascending order, as PostgreSQL and Oracle do, 
+        False if it sorts them before all other values, as SQLite and MySQL
+        do
+        """
+        self.ordering = ordering
+        self.nulls_last = nulls_last
+        self._keys = dict()
+        self._rows = []
+
+    def add(self, row, obj):
+        """Use the object at row as an anchor"""
+        key = tuple(getter(obj) for _column, getter, _descending in self.ordering)
+        if row not in self._keys:
+            bisect.insort(self._rows, row)
+        self._keys[row] = key
+
+    def nearest_anchor(self, offset):
+        """:return: the anchor row closest to offset and before offset, None
+        if there is no such anchor"""
+        i = bisect.bisect_left(self._rows, offset)
+        if i > 0:
+            return self._rows[i-1]
+
+    def _after(self, key):
+        """:return: a clause that selects the rows after the row with the
+        given key in the ordering"""
+        from sqlalchemy.sql import and_, or_
+        clauses = []
+        for i, (column, _getter, descending) in enumerate(self.ordering):
+            # comparing with None results in an IS NULL clause
+            equal = [c == k for (c, _g, _d), k in zip(self.ordering[:i], key[:i])]
+            after = self._after_value(column, key[i], descending)
+            if after is not None:
+                clauses.append(and_(*(equal + [after])))
+        return or_(*clauses)
+
+    def _after_value(self, column, value, descending):
+        """:return: a clause that selects the values of a column after value 
+        in the ordering, None if there are no such values"""
+        from sqlalchemy.sql import or_
+        # the rows after the anchor have larger values when sorted 
+        # ascending, and NULL is larger than any value if nulls_last
+        nulls_after = (self.nulls_last != descending)
+        if value == None:
+            if nulls_after:
+                return None
+            return column != None
+        if descending:
+            after = column < value
+        else:
+            after = column > value
+        if nulls_after:
+            return or_(after, column == None)
+        return after
+
+    def seek(self, query, offset):
+        """Filter a query to start at the anchor closest to offset
+        :return: (query, offset) the filtered query and the offset to use
+        within the filtered query
+        """
+        anchor = self.nearest_anchor(offset)
+        if anchor == None:
+            return query, offset
+        return query.filter(self._after(self._keys[anchor])), offset - anchor - 1
 
 class QueryTableProxy(CollectionProxy):
     """The QueryTableProxy contains a limited copy of the data in the Elixir
     model, which is fetched from the database to be used as the model for a
     QTableView
+
+    the QueryTableProxy has some class attributes that can be overwritten when
+    subclassing it :
+
+    * keyset_pagination : if True, the query is sorted on the primary key in
+      addition to the sort order requested by the user, and rows are fetched
+      by seeking from rows allready fetched instead of using an OFFSET, which
+      gets slow for rows far from the start of large tables.  This is only
+      possible if the query is sorted on columns of the entity itself.
+
+    * export_chunk_size : the number of objects read at once from the
+      database when all data is exported, so not all objects need to be
+      in memory at the same time.
     """
 
+    keyset_pagination = False
+    export_chunk_size = 1000
+
     def __init__(self, admin, query_getter, columns_getter,
-                 max_number_of_rows=10, edits=None):
-        """@param query_getter: a model_thread function that returns a query, can be None at construction time and set later"""
+                 max_number_of_rows=10, edits=None, **kwargs):
+        """@param query_getter: a model_thread function that returns a query, can be None at construction time and set later
+        
+        Additional keyword arguments, such as the size of the cache, are passed
+        to the CollectionProxy"""
         logger.debug('initialize query table')
         self._query_getter = query_getter
         self._sort_decorator = None
+        # [(column, getter, descending)] of the user requested sort order,
+        # None if keyset pagination is not possible with this sort order
+        self._sort_ordering = []
+        # None if the keyset index has not been created yet, False if it
+        # cannot be used with the current query
+        self._keyset_index = None
+        # True if the number of rows is an estimate, and the exact number
+        # of rows is being counted
+        self._row_count_estimated = False
         #rows appended to the table which have not yet been flushed to the
         #database, and as such cannot be a result of the query
         self._appended_rows = []
         super(QueryTableProxy, self).__init__(admin, lambda: [],
-                                              columns_getter, max_number_of_rows=max_number_of_rows, edits=None)
+                                              columns_getter, max_number_of_rows=max_number_of_rows, edits=None,
+                                              **kwargs)
 
 #    def default_sort_decorator(self):
 #        """Create a function that sorts a query, by default we sort a query by the
@@ -64,14 +208,82 @@ class QueryTableProxy(CollectionProxy):
 #            class_attribute = list(property._calculated_foreign_keys)[0]         
         
     def get_query_getter(self):
-        if not self._sort_decorator or self._query_getter==None:
+        if self._query_getter==None:
+            return None
+        if not self._sort_decorator and not self.keyset_pagination:
             return self._query_getter
         else:
             
             def sorted_query_getter():
-                return self._sort_decorator(self._query_getter())
+                query = self._query_getter()
+                if self._sort_decorator:
+                    query = self._sort_decorator(query)
+                if self.keyset_pagination:
+                    query = self._order_by_primary_key(query)
+                return query
             
             return sorted_query_getter
+
+    def _order_by_primary_key(self, query):
+        """Make the ordering of a query unique by ordering on the primary key
+        after the existing ordering"""
+        mapper = self.admin.mapper
+        if not query._order_by and mapper.order_by:
+            # keep the default ordering of the mapper, which would otherwise
+            # be replaced
+            query = query.order_by(*mapper.order_by)
+        return query.order_by(*mapper.primary_key)
+
+    def _column_ordering(self, column, descending=False):
+        """:return: a (column, getter, descending) tuple for a column of the
+        mapped table, None if no getter can be made for the column"""
+        from sqlalchemy import schema
+        from sqlalchemy.orm.exc import UnmappedColumnError
+        if not isinstance(column, schema.Column):
+            return None
+        try:
+            property = self.admin.mapper.get_property_by_column(column)
+        except UnmappedColumnError:
+            return None
+        
+        def create_getter(key):
+            return lambda o:getattr(o, key)
+        
+        return (column, create_getter(property.key), descending)
+
+    @model_function
+    def _get_keyset_index(self):
+        """:return: the KeysetIndex for the current query and sort order, or
+        None if keyset pagination cannot be used"""
+        if not self.keyset_pagination or self._query_getter==None:
+            return None
+        if self._keyset_index == None:
+            self._keyset_index = False
+            mapper = self.admin.mapper
+            ordering = []
+            if self._query_getter()._order_by:
+                # the query has an ordering of its own, that cannot be
+                # used to seek
+                return None
+            if self._sort_decorator:
+                if self._sort_ordering == None:
+                    return None
+                ordering.extend(self._sort_ordering)
+            elif mapper.order_by:
+                for column in mapper.order_by:
+                    column_ordering = self._column_ordering(column)
+                    if column_ordering == None:
+                        return None
+                    ordering.append(column_ordering)
+            for column in mapper.primary_key:
+                column_ordering = self._column_ordering(column)
+                if column_ordering == None:
+                    return None
+                ordering.append(column_ordering)
+            dialect = self._query_getter().session.get_bind(mapper).dialect
+            self._keyset_index = KeysetIndex(ordering, 
+                                             nulls_last=dialect.name in ('postgresql', 'oracle'))
+        return self._keyset_index or None
     
     @model_function
     def _clean_appended_rows(self):
@@ -82,13 +294,72 @@ class QueryTableProxy(CollectionProxy):
                 flushed_rows.append(o)
         for o in flushed_rows:
             self._appended_rows.remove(o)
+            # the flushed row is now part of the query
+            get_row_count_cache().adjust(self._row_count_key, 1)
 
     @model_function
-    def getRowCount(self):
+    def _get_cached_row_count(self):
+        """:return: the number of rows in the query as it is in the row count
+        cache, None if it is not in the cache"""
         self._clean_appended_rows()
+        # rows might have been inserted or deleted, so the anchors are no
+        # longer valid
+        self._keyset_index = None
         if not self._query_getter:
             return 0
-        return self.get_query_getter()().count() + len(self._appended_rows)
+        query = self.get_query_getter()()
+        self._row_count_key = query_fingerprint(query)
+        count = get_row_count_cache().get(self._row_count_key)
+        if count != None:
+            return count + len(self._appended_rows)
+
+    @model_function
+    def getRowCount(self):
+        count = self._get_cached_row_count()
+        if count != None:
+            return count
+        query = self.get_query_getter()()
+        count = query.count()
+        get_row_count_cache().set(self.admin.entity, self._row_count_key, count)
+        return count + len(self._appended_rows)
+
+    @model_function
+    def get_estimated_row_count(self):
+        """:return: the number of rows as it is in the row count cache, or an
+        estimate of the number of rows based on the database statistics, None
+        if neither is available"""
+        count = self._get_cached_row_count()
+        if count != None:
+            return count
+        count = estimate_row_count(self.get_query_getter()(), self.admin.mapper)
+        if count != None:
+            return count + len(self._appended_rows)
+
+    @gui_function
+    def refresh(self):
+        """Refresh the content, if no number of rows is readily available, an
+        estimate of the number of rows is used until the rows are counted"""
+        post(self.get_estimated_row_count, self._row_count_estimate,
+             coalesce=(self, 'estimate_row_count'))
+        post(self.getRowCount, self._row_count_exact,
+             coalesce=(self, 'row_count_exact'))
+
+    @QtCore.pyqtSlot(object)
+    @gui_function
+    def _row_count_estimate(self, rows):
+        if rows != None:
+            self._row_count_estimated = True
+            self._refresh_content(rows)
+
+    @QtCore.pyqtSlot(int)
+    @gui_function
+    def _row_count_exact(self, rows):
+        if self._row_count_estimated:
+            self._row_count_estimated = False
+            if rows != self._rows:
+                self.setRowCount(rows)
+        else:
+            self._refresh_content(rows)
 
     @gui_function
     def setQuery(self, query_getter):
@@ -144,6 +415,10 @@ class QueryTableProxy(CollectionProxy):
                 #  If it specifies an order_by option we have to join the related table, 
                 #  else we use the foreing key as sort field, without joining
                 join = None
+                descending = bool(order)
+                sort_ordering = None
+                if isinstance(property, orm.properties.ColumnProperty):
+                    sort_ordering = self._column_ordering(property.columns[0], descending)
                 if isinstance(property, orm.properties.PropertyLoader):
                     target = property._get_target()
                     if target:
@@ -158,6 +433,7 @@ class QueryTableProxy(CollectionProxy):
                                 class_attribute = list(property._foreign_keys)[0]
                             else:                             
                                 class_attribute = list(property._calculated_foreign_keys)[0]                    
+                            sort_ordering = self._column_ordering(class_attribute, descending)
                     
                 def create_sort_decorator(class_attribute, order, join):
                                         
@@ -173,6 +449,11 @@ class QueryTableProxy(CollectionProxy):
                 
                 
                 self._sort_decorator = create_sort_decorator(class_attribute, order, join)
+                if sort_ordering != None:
+                    self._sort_ordering = [sort_ordering]
+                else:
+                    self._sort_ordering = None
+                self._keyset_index = None
                 return self._rows
                     
             return set_sort_decorator
@@ -186,51 +467,130 @@ class QueryTableProxy(CollectionProxy):
             self._appended_rows.append(o)
         self._rows = self._rows + 1
 
+    @model_function
+    def _get_row_of_object(self, o):
+        # appended objects are shown after the rows of the query
+        return self.getRowCount() - 1
+
     def remove(self, o):
         if o in self._appended_rows:
             self._appended_rows.remove(o)
+        else:
+            get_row_count_cache().adjust(self._row_count_key, -1)
         self._rows = self._rows - 1
 
     @model_function
     def getData(self):
-        """Generator for all the data queried by this proxy"""
+        """Generator for all the data queried by this proxy, the objects
+        are read in chunks of export_chunk_size, with a server side cursor
+        when the database supports it"""
         if self._query_getter:
-            for _i,o in enumerate(self.get_query_getter()().all()):
-                yield strip_data_from_object(o, self.getColumns())
+            columns = self.getColumns()
+            options = self.admin.get_loader_options([c[0] for c in columns],
+                                                    streaming=True)
+            query = self.get_query_getter()().options(*options)
+            # without stream_results, psycopg2 buffers the complete result
+            # on the client
+            query = query.execution_options(stream_results=True)
+            for o in query.yield_per(self.export_chunk_size):
+                yield strip_data_from_object(o, columns)
 
     @model_function
-    def _get_collection_range( self, offset, limit ):
+    def _get_collection_range( self, offset, limit, projection = None, options = () ):
         """Get the objects in a certain range of the collection
+        :param projection: a list of (key, attribute) tuples as returned by
+        the get_projection method of the admin, to select only those
+        attributes instead of complete objects
+        :param options: a list of query options to apply when complete
+        objects are selected, as returned by the get_loader_options method of
+        the admin
         :return: an iterator over the objects in the collection, starting at 
         offset, until limit
         """
-        query = self.get_query_getter()().offset(offset).limit(limit)
-        return query.all()
+        query = self.get_query_getter()()
+        keyset_index = self._get_keyset_index()
+        if keyset_index:
+            query, query_offset = keyset_index.seek(query, offset)
+        else:
+            query_offset = offset
+        query = query.offset(query_offset).limit(limit)
+        if projection:
+            objects = self._get_projected_objects(query, projection, keyset_index)
+        else:
+            objects = query.options(*options).all()
+        if keyset_index and objects:
+            keyset_index.add(offset + len(objects) - 1, objects[-1])
+        return objects
                     
     @model_function
-    def _extend_cache(self):
+    def _get_projected_objects(self, query, projection, keyset_index=None):
+        """:return: a list of ProjectedObjects with the values of the
+        attributes in the projection, and those needed for the keyset index"""
+        mapper = self.admin.mapper
+        projection = list(projection)
+        keys = set(key for key, _attribute in projection)
+        if keyset_index:
+            for column, _getter, _descending in keyset_index.ordering:
+                key = mapper.get_property_by_column(column).key
+                if key not in keys:
+                    keys.add(key)
+                    projection.append((key, getattr(self.admin.entity, key)))
+        primary_key_length = len(mapper.primary_key)
+        projected_objects = []
+        for values in query.values(*[attribute for _key, attribute in projection]):
+            values = tuple(values)
+            identity = values[:primary_key_length]
+            projected_objects.append(ProjectedObject(identity, zip((key for key, _attribute in projection), values)))
+        return projected_objects
+
+    def _cache_key(self, obj):
+        """:return: the key under which the data of an object is stored in
+        the cache, when the admin uses list projection, this is an ObjectKey
+        for persistent objects"""
+        from sqlalchemy.orm.attributes import instance_state
+        if not self.admin.list_projection or isinstance(obj, ObjectKey):
+            return obj
+        # use the identity key of the object, since reading the primary key
+        # attributes might cause a query
+        identity_key = instance_state(obj).key
+        if identity_key == None:
+            return obj
+        return ObjectKey(tuple(identity_key[1]))
+
+    @model_function
+    def _extend_cache(self, prefetch=False):
         """Extend the cache around the rows under request"""
         if self._query_getter:
-            offset, limit = self._offset_and_limit_rows_to_get()
-            if limit:
-                columns = self.getColumns()
-                for i, obj in enumerate( self._get_collection_range(offset, limit) ):
-                    row = i + offset
-                    try:
-                        previous_obj = self.edit_cache.get_entity_at_row(row)
-                        if previous_obj != obj:
-                            continue
-                    except KeyError:
-                        pass
-                    self._add_data(columns, i+offset, obj)
-                rows_in_query = (self._rows - len(self._appended_rows))
-                # Verify if rows that have not yet been flushed have been 
-                # requested
-                if offset+limit >= rows_in_query:
-                    for row in range(max(rows_in_query, offset), min(offset+limit, self._rows)):
-                        obj = self._get_object(row)
-                        self._add_data(columns, row, obj)                
-            return (offset, limit)
+            return super(QueryTableProxy, self)._extend_cache(prefetch)
+        # without a query there is nothing to fetch, but the rows should no
+        # longer be under request
+        return self._ranges_of_rows_to_get(prefetch)
+
+    @model_function
+    def _extend_cache_range(self, columns, offset, limit):
+        """Put a range of rows of the query in the cache"""
+        field_names = [c[0] for c in columns]
+        projection = self.admin.get_projection(field_names)
+        options = []
+        if not projection:
+            options = self.admin.get_loader_options(field_names)
+        rows_and_objects = []
+        for i, obj in enumerate( self._get_collection_range(offset, limit, projection, options) ):
+            row = i + offset
+            try:
+                previous_obj = self.cache.get_entity_at_row(row)
+                if previous_obj != self._cache_key(obj):
+                    continue
+            except KeyError:
+                pass
+            rows_and_objects.append((row, obj))
+        rows_in_query = (self._rows - len(self._appended_rows))
+        # Verify if rows that have not yet been flushed have been 
+        # requested
+        if offset+limit >= rows_in_query:
+            for row in range(max(rows_in_query, offset), min(offset+limit, self._rows)):
+                rows_and_objects.append((row, self._get_object(row)))
+        self._add_rows(columns, rows_and_objects)
 
     @model_function
     def _get_object(self, row):
@@ -243,18 +603,22 @@ class QueryTableProxy(CollectionProxy):
             # first try to get the primary key out of the cache, if it's not
             # there, query the collection_getter
             try:
-                return self.edit_cache.get_entity_at_row(row)
+                obj = self.cache.get_entity_at_row(row)
+                if isinstance(obj, ObjectKey):
+                    # only the key of the object is in the cache, load the
+                    # complete object
+                    from elixir import session
+                    obj = session.query(self.admin.entity).get(obj.identity)
+                return obj
             except KeyError:
                 pass
-            # momentary hack for list error that prevents forms to be closed
             if self._query_getter:
-                res = self.get_query_getter()().offset(row)
-                if isinstance(res, list):
-                    res = res[0]
                 # @todo: remove this try catch and find out why it 
                 # sometimes fails
                 try:
-                    return res.limit(1).first()
+                    objects = self._get_collection_range(row, 1)
+                    if objects:
+                        return objects[0]
                 except:
                     pass
 
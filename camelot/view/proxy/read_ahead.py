@@ -0,0 +1,139 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""Policy to decide which rows a proxy should fetch in advance, before
+they become visible in the view, and how to group the rows to fetch into
+ranges.
+
+The policy is informed by the view about the rows that are visible, and
+derives from that the direction and the speed with which the user
+scrolls.  The faster the user scrolls, the more rows are fetched ahead
+of the visible rows.
+"""
+
+import time
+
+def rows_to_ranges( rows, max_gap = 0 ):
+    """Group row numbers into ranges of consecutive rows, so they can be
+    fetched with as few queries as possible.
+
+    :param rows: an iterable over row numbers
+    :param max_gap: the maximum number of rows not in rows that are included
+        in a range to merge two ranges into one range
+    :return: a sorted list of (offset, limit) tuples
+    """
+    ranges = []
+    for row in sorted( set( rows ) ):
+        if ranges:
+            offset, limit = ranges[-1]
+            if row - ( offset + limit ) <= max_gap:
+                ranges[-1] = ( offset, row - offset + 1 )
+                continue
+        ranges.append( ( row, 1 ) )
+    return ranges
+
+class ReadAheadPolicy( object ):
+    """Keeps track of the position of the viewport of a view on a proxy and
+    decides which rows should be fetched in the background.
+
+    .. attribute:: read_ahead_time
+
+    the number of seconds of scrolling at the current speed for which rows
+    should be available in advance
+
+    .. attribute:: smoothing
+
+    weight of the previous speed when calculating the new speed, a value
+    between 0 and 1, the higher the value, the slower the policy reacts to
+    changes in speed
+    """
+
+    read_ahead_time = 1.0
+    smoothing = 0.5
+
+    def __init__( self, minimal_page_size = 10, maximal_page_size = 500 ):
+        """:param minimal_page_size: the minimum number of rows to fetch ahead
+        :param maximal_page_size: the maximum number of rows to fetch ahead,
+        this should be smaller than the number of rows in the cache, to
+        prevent the fetched rows from pushing the visible rows out of the cache
+        """
+        self.minimal_page_size = minimal_page_size
+        self.maximal_page_size = max( minimal_page_size, maximal_page_size )
+        self.first_row = None
+        self.last_row = None
+        self.direction = 1
+        self.speed = 0.0
+        self._timestamp = None
+
+    def viewport_changed( self, first_row, last_row, timestamp = None ):
+        """Inform the policy about the rows that are currently visible
+        :param first_row: the first visible row
+        :param last_row: the last visible row
+        :param timestamp: the time at which the viewport changed, defaults
+        to the current time
+        """
+        if timestamp == None:
+            timestamp = time.time()
+        if self.first_row != None:
+            moved = first_row - self.first_row
+            if moved:
+                self.direction = cmp( moved, 0 )
+            visible_rows = last_row - first_row + 1
+            elapsed = timestamp - self._timestamp
+            if abs( moved ) > max( self.page_size(), visible_rows ):
+                # the user jumped to a different position, so there is
+                # no scroll speed to take into account
+                self.speed = 0.0
+            elif elapsed > 0:
+                instant_speed = abs( moved ) / elapsed
+                self.speed = self.smoothing * self.speed + \
+                             ( 1 - self.smoothing ) * instant_speed
+        self.first_row = first_row
+        self.last_row = last_row
+        self._timestamp = timestamp
+
+    def page_size( self ):
+        """:return: the number of rows that should be fetched ahead"""
+        visible_rows = 0
+        if self.first_row != None:
+            visible_rows = self.last_row - self.first_row + 1
+        page_size = visible_rows + int( self.speed * self.read_ahead_time )
+        return min( max( page_size, self.minimal_page_size ),
+                    self.maximal_page_size )
+
+    def rows_to_prefetch( self, row_count ):
+        """:param row_count: the total number of rows in the proxy
+        :return: (offset, limit) the range of rows that should be fetched in
+        the direction of scrolling, limit is 0 if nothing should be fetched
+        """
+        if self.first_row == None:
+            return ( 0, 0 )
+        page_size = self.page_size()
+        if self.direction >= 0:
+            offset = self.last_row + 1
+            limit = min( page_size, row_count - offset )
+        else:
+            offset = max( self.first_row - page_size, 0 )
+            limit = self.first_row - offset
+        return ( offset, max( limit, 0 ) )
@@ -0,0 +1,161 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""Cache and estimates of the number of rows returned by queries.
+
+Counting the rows of a query on a large table is often the slowest query
+an application does.  The counts are cached per query, and adjusted when
+rows are added or removed through a proxy.  When no count is available, an
+estimate can be made from the statistics of the database, to be shown
+while the exact count is running.
+"""
+
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger('camelot.view.proxy.row_count')
+
+def query_fingerprint(query):
+    """:return: a hashable object that identifies the sql and the
+    parameters of a query"""
+    compiled = query.statement.compile()
+    parameters = tuple(sorted((key, repr(value)) for key, value in compiled.params.items()))
+    return (unicode(compiled), parameters)
+
+class RowCountCache(object):
+    """Cache of the number of rows of queries, identified by their
+    fingerprint.
+
+    .. attribute:: max_age
+
+    the number of seconds a count remains valid, to take into account
+    changes to the database made by other applications
+    """
+
+    max_age = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # fingerprint : (entity, count, timestamp)
+        self._counts = dict()
+
+    def get(self, fingerprint, timestamp=None):
+        """:return: the cached count, or None if the count is not in the
+        cache or too old"""
+        if timestamp == None:
+            timestamp = time.time()
+        self._lock.acquire()
+        try:
+            try:
+                _entity, count, created = self._counts[fingerprint]
+            except KeyError:
+                return None
+            if timestamp - created > self.max_age:
+                del self._counts[fingerprint]
+                return None
+            return count
+        finally:
+            self._lock.release()
+
+    def set(self, entity, fingerprint, count, timestamp=None):
+        """Store the count of a query
+        :param entity: the class of the objects returned by the query
+        """
+        if timestamp == None:
+            timestamp = time.time()
+        self._lock.acquire()
+        try:
+            self._counts[fingerprint] = (entity, count, timestamp)
+        finally:
+            self._lock.release()
+
+    def adjust(self, fingerprint, difference):
+        """Adjust the count of a query when rows have been added to or
+        removed from it"""
+        self._lock.acquire()
+        try:
+            if fingerprint in self._counts:
+                entity, count, created = self._counts[fingerprint]
+                self._counts[fingerprint] = (entity, max(count + difference, 0), created)
+        finally:
+            self._lock.release()
+
+    def invalidate(self, entity, keep=None):
+        """Remove the counts that might have changed because objects of
+        class entity have been created or deleted
+        :param keep: the fingerprint of a query whose count should be kept,
+        because it has been adjusted
+        """
+        self._lock.acquire()
+        try:
+            for fingerprint, (query_entity, _count, _created) in self._counts.items():
+                if fingerprint != keep and issubclass(entity, query_entity):
+                    del self._counts[fingerprint]
+        finally:
+            self._lock.release()
+
+_row_count_cache_ = RowCountCache()
+
+def get_row_count_cache():
+    """Get the row count cache shared by all proxies"""
+    return _row_count_cache_
+
+_explain_rows_ = re.compile(r'rows=(\d+)')
+
+def estimate_row_count(query, mapper):
+    """Estimate the number of rows of a query, using the statistics of the
+    database, without counting them.
+    
+    On SQLite, this uses the sqlite_stat1 table, filled by ANALYZE, and is only
+    possible for queries on a whole table.  On PostgreSQL, this uses the
+    estimate of the query planner.
+    
+    :param query: the query of which to estimate the number of rows
+    :param mapper: the mapper of the entity queried
+    :return: the estimated number of rows, None if no estimate can be made
+    """
+    from sqlalchemy import sql
+    session = query.session
+    try:
+        connection = session.connection(mapper=mapper)
+        dialect = connection.dialect.name
+        if dialect == 'sqlite':
+            if query.whereclause is not None or query._from_obj or \
+               (mapper.inherits and mapper.single):
+                return None
+            statement = sql.text('select stat from sqlite_stat1 where tbl=:table')
+            row = connection.execute(statement, table=mapper.local_table.name).fetchone()
+            if row:
+                return int(row[0].split()[0])
+        elif dialect == 'postgresql':
+            compiled = query.statement.compile(dialect=connection.dialect)
+            row = connection.execute('EXPLAIN ' + unicode(compiled), compiled.params).fetchone()
+            match = _explain_rows_.search(row[0])
+            if match:
+                return int(match.group(1))
+    except Exception, e:
+        logger.debug('could not estimate the number of rows', exc_info=e)
+    return None
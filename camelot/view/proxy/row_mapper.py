@@ -0,0 +1,132 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""Mapping between the rows of a sorted and filtered view on a collection
+and the rows of the collection itself"""
+
+from array import array
+
+class SortingRowMapper( object ):
+    """Class mapping rows of a collection 1:1 without sorting
+    and filtering, unless sort keys or a filter have been set.
+
+    The mapping is kept as a permutation index in an array, that is rebuilt
+    with the update method.  The sort is stable, and takes into account
+    multiple sort keys, the key that was sorted on last being the most
+    significant.  The sort key of each object is only computed once, until
+    the keys are invalidated.
+    """
+
+    def __init__( self ):
+        # tuple with the permutation index, None if rows map 1:1, and the
+        # number of rows in the collection when the index was built
+        self._index = ( None, 0 )
+        # list of ( name, key, descending ) tuples, the most significant
+        # sort key first
+        self._sort_keys = []
+        # dict mapping the name of each sort key to a dict with the key of
+        # each object
+        self._key_cache = dict()
+        self.filter = None
+
+    def __getitem__( self, row ):
+        index, source_rows = self._index
+        if index is None:
+            return row
+        if row < len( index ):
+            return index[row]
+        # rows that were added to the collection after the index was built
+        return row - len( index ) + source_rows
+
+    def get_row( self, source_row ):
+        """:return: the row to which a row of the collection is mapped, None
+        if the row is filtered out"""
+        index, source_rows = self._index
+        if index is None:
+            return source_row
+        if source_row >= source_rows:
+            return source_row - source_rows + len( index )
+        try:
+            return index.index( source_row )
+        except ValueError:
+            return None
+
+    def sort( self, name, key, descending = False ):
+        """Make a key the most significant sort key, the index is only
+        sorted on the next update.
+        :param name: the name of the sort key, used to cache the keys
+        :param key: a function that returns the sort key of an object
+        :param descending: True if the key should be sorted descending
+        """
+        sort_keys = [ sort_key for sort_key in self._sort_keys if sort_key[0] != name ]
+        sort_keys.insert( 0, ( name, key, descending ) )
+        self._sort_keys = sort_keys
+
+    def clear_sort( self ):
+        """Remove all sort keys"""
+        self._sort_keys = []
+
+    def invalidate_keys( self ):
+        """Remove the cached sort keys, for when the objects in the collection
+        have changed"""
+        self._key_cache = dict()
+
+    def _get_keys( self, name, key, objects ):
+        """:return: a list with the sort key of each object"""
+        key_cache = self._key_cache.setdefault( name, dict() )
+        keys = []
+        for obj in objects:
+            try:
+                keys.append( key_cache[obj] )
+            except KeyError:
+                obj_key = key( obj )
+                key_cache[obj] = obj_key
+                keys.append( obj_key )
+            except TypeError:
+                # unhashable objects
+                keys.append( key( obj ) )
+        return keys
+
+    def update( self, collection ):
+        """Rebuild the index for the objects in the collection
+        :return: the number of rows in the sorted and filtered collection
+        """
+        source_rows = len( collection )
+        row_filter = self.filter
+        sort_keys = self._sort_keys
+        if row_filter is None and not sort_keys:
+            self._index = ( None, source_rows )
+            return source_rows
+        if row_filter is None:
+            rows = range( source_rows )
+        else:
+            rows = [ row for row in xrange( source_rows ) if row_filter( collection[row] ) ]
+        # sorting is stable, so sorting on the least significant key first
+        # results in a sort on all keys
+        for name, key, descending in reversed( sort_keys ):
+            keys = self._get_keys( name, key, ( collection[row] for row in rows ) )
+            order = sorted( xrange( len( rows ) ), key = keys.__getitem__, reverse = descending )
+            rows = [ rows[i] for i in order ]
+        self._index = ( array( 'l', rows ), source_rows )
+        return len( rows )
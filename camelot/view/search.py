@@ -24,8 +24,13 @@
 
 """
 Helper functions to search through a collection of entities
+
+Which columns to search, and how to search each of them, is analyzed once
+per admin and kept in a SearchPlan.  When the user enters a text, the plan
+only needs to convert the text and bind it in the clauses.
 """
 import logging
+import threading
 
 LOGGER = logging.getLogger('camelot.view.search')
 
@@ -34,80 +39,72 @@ from sqlalchemy.sql import operators
 
 import camelot.types
 
-def create_entity_search_query_decorator(admin, text):
-    """create a query decorator to search through a collection of entities
-    @param admin: the admin interface of the entity
-    @param text: the text to search for
-    @return: a function that can be applied to a query to make the query filter
-    only the objects related to the requested text or None if no such decorator
-    could be build
-    """
-    from elixir import entities
-    from sqlalchemy import orm, sql
+def _search_text(c, value):
+    return operators.ilike_op(c, value)
+
+def _search_code(c, codes):
+    from sqlalchemy import sql
+    arg = c.like(['%'] + codes + ['%'])
+    arg = sql.or_(arg, c.like(['%'] + codes))
+    return sql.or_(arg, c.like(codes + ['%']))
+
+def _search_equal(c, value):
+    return (c==value)
+
+def _search_like(c, value):
+    return c.like(value)
+
+def _text_converter(text):
+    return '%'+text+'%'
+
+def _virtual_address_converter(text):
+    return ('%', '%'+text+'%')
+
+def _int_converter(text):
     from camelot.view import utils
+    return utils.int_from_string(text)
 
-    if len(text.strip()):
-        from sqlalchemy import Unicode, or_
-        # arguments for the where clause
-        args = []
-        # join conditions : list of join entities
-        joins = []
+def _date_converter(text):
+    from camelot.view import utils
+    return utils.date_from_string(text)
 
-        def append_column(c):
-            """add column c to the where clause using a clause that
-            is relevant for that type of column"""
-            arg = None
-            if issubclass(c.type.__class__, camelot.types.Color):
-                pass
-            elif issubclass(c.type.__class__, camelot.types.File):
-                pass
-            elif issubclass(c.type.__class__, camelot.types.Code):
-                codes = text.split(c.type.separator)
-                arg = c.like(['%'] + codes + ['%'])
-                arg = sql.or_(arg, c.like(['%'] + codes))
-                arg = sql.or_(arg, c.like(codes + ['%']))
-            elif issubclass(c.type.__class__, camelot.types.VirtualAddress):
-                arg = c.like(('%', '%'+text+'%'))
-            elif issubclass(c.type.__class__, camelot.types.Image):
-                pass
-            elif issubclass(c.type.__class__, sqlalchemy.types.Integer):
-                try:
-                    arg = (c==utils.int_from_string(text))
-                except Exception, utils.ParsingError:
-                    pass
-            elif issubclass(c.type.__class__, sqlalchemy.types.Date):
-                try:
-                    arg = (c==utils.date_from_string(text))
-                except Exception, utils.ParsingError:
-                    pass
-            elif issubclass(c.type.__class__, sqlalchemy.types.Float):
-                try:
-                    float_value = utils.float_from_string(text)
-                    precision = c.type.precision
-                    if isinstance(precision, (tuple)):
-                        precision = precision[1]
-                    delta = 0.1**precision
-                    arg = sql.and_(c>=float_value-delta, c<=float_value+delta)
-                except Exception, utils.ParsingError:
-                    pass
-            elif issubclass(c.type.__class__, (Unicode, )) or \
-                            (hasattr(c.type, 'impl') and \
-                             issubclass(c.type.impl.__class__, (Unicode, ))):
-                LOGGER.debug('look in column : %s'%c.name)
-                arg = operators.ilike_op(c, '%'+text+'%')
-
-            if arg is not None:
-                arg = sql.and_(c != None, arg)
-                args.append(arg)
+def _float_converter(text):
+    from camelot.view import utils
+    return utils.float_from_string(text)
+
+class SearchPlan(object):
+    """The columns that are searched for an admin, with for each of them a
+    converter to convert the search text to a value and a comparator to
+    build a clause that compares the column with this value.
+    """
 
+    def __init__(self, admin):
+        from elixir import entities
+        from sqlalchemy import orm
+        from sqlalchemy.orm.exc import UnmappedColumnError
+        self.list_search = tuple(admin.list_search)
+        self.search_all_fields = admin.search_all_fields
+        # list of ( column, converter, comparator, is text )
+        self.columns = []
+        # join conditions : list of join entities
+        self.joins = []
+        # the attribute names to follow from an object to the value of each
+        # text column, None if the value cannot be reached from the object
+        self.text_paths = []
+        self._code_converters = dict()
         if admin.search_all_fields:
             search_tables = set([admin.entity.table])
             for entity in entities:
                 if issubclass(admin.entity, entity):
                     search_tables.add(entity.table)
+            mapper = orm.class_mapper(admin.entity)
             for table in search_tables:
                 for column in table._columns:
-                    append_column(column)
+                    try:
+                        path = [mapper.get_property_by_column(column).key]
+                    except UnmappedColumnError:
+                        path = None
+                    self.append_column(column, path)
 
         for column_name in admin.list_search:
             path = column_name.split('.')
@@ -116,11 +113,122 @@ def create_entity_search_query_decorator(admin, text):
                 mapper = orm.class_mapper(target)
                 property = mapper.get_property(path_segment, resolve_synonyms=True)
                 if isinstance(property, orm.properties.PropertyLoader):
-                    joins.append(getattr(target, path_segment))
+                    self.joins.append(getattr(target, path_segment))
                     target = property._get_target().class_
                 else:
-                    append_column(property.columns[0])
-                    #args.append(property.columns[0].like('%'+text+'%'))
+                    self.append_column(property.columns[0], path)
+
+    def is_valid(self, admin):
+        """:return: False if the plan should be created again, because the
+        fields to search of the admin changed"""
+        return self.list_search == tuple(admin.list_search) and \
+               self.search_all_fields == admin.search_all_fields
+
+    def _get_code_converter(self, separator):
+        if separator not in self._code_converters:
+            self._code_converters[separator] = lambda text:text.split(separator)
+        return self._code_converters[separator]
+
+    def append_column(self, c, path=None):
+        """add column c to the plan with a converter and a comparator that is
+        relevant for that type of column
+        :param path: the list of attribute names to follow from an object to
+        the value of the column"""
+        from sqlalchemy import Unicode, sql
+        column_type = c.type.__class__
+        if issubclass(column_type, camelot.types.Color):
+            pass
+        elif issubclass(column_type, camelot.types.File):
+            pass
+        elif issubclass(column_type, camelot.types.Code):
+            self.columns.append((c, self._get_code_converter(c.type.separator), _search_code, False))
+        elif issubclass(column_type, camelot.types.VirtualAddress):
+            self.columns.append((c, _virtual_address_converter, _search_like, False))
+        elif issubclass(column_type, camelot.types.Image):
+            pass
+        elif issubclass(column_type, sqlalchemy.types.Integer):
+            self.columns.append((c, _int_converter, _search_equal, False))
+        elif issubclass(column_type, sqlalchemy.types.Date):
+            self.columns.append((c, _date_converter, _search_equal, False))
+        elif issubclass(column_type, sqlalchemy.types.Float):
+            precision = c.type.precision
+            if isinstance(precision, (tuple)):
+                precision = precision[1]
+            delta = 0.1**precision
+
+            def search_float(c, float_value):
+                return sql.and_(c>=float_value-delta, c<=float_value+delta)
+
+            self.columns.append((c, _float_converter, search_float, False))
+        elif issubclass(column_type, (Unicode, )) or \
+                        (hasattr(c.type, 'impl') and \
+                         issubclass(c.type.impl.__class__, (Unicode, ))):
+            LOGGER.debug('look in column : %s'%c.name)
+            self.columns.append((c, _text_converter, _search_text, True))
+            self.text_paths.append(path)
+
+    def matches_text_only(self, text):
+        """:return: True if only the text columns are searched for text, and
+        the values of all of them can be reached from an object.  In that case
+        the objects that match text are those for which a search string
+        returned by get_search_strings contains text."""
+        if '%' in text or '_' in text or None in self.text_paths:
+            return False
+        for _c, converter, _comparator, is_text in self.columns:
+            if is_text:
+                continue
+            try:
+                if converter(text) is not None:
+                    return False
+            except Exception:
+                pass
+        return True
+
+    def get_search_strings(self, obj):
+        """:return: a list with the lower case values of the text columns of
+        obj that are searched"""
+        strings = []
+        for path in self.text_paths:
+            targets = [obj]
+            for path_segment in path or []:
+                values = []
+                for target in targets:
+                    value = getattr(target, path_segment, None)
+                    if isinstance(value, (list, set)):
+                        values.extend(value)
+                    elif value is not None:
+                        values.append(value)
+                targets = values
+            for value in targets:
+                if value:
+                    strings.append(unicode(value).lower())
+        return strings
+
+    def create_query_decorator(self, text, indexed_columns=(), index_clause=None):
+        """create a query decorator to search for text, see
+        create_entity_search_query_decorator"""
+        from sqlalchemy import or_, sql
+        if not len(text.strip()):
+            return None
+        # arguments for the where clause
+        args = []
+        if index_clause is not None:
+            args.append(index_clause)
+        # the converted text for each converter, None if the text could not
+        # be converted
+        values = dict()
+        for c, converter, comparator, is_text in self.columns:
+            if is_text and (c.table.name, c.name) in indexed_columns:
+                continue
+            if converter not in values:
+                try:
+                    values[converter] = converter(text)
+                except Exception:
+                    values[converter] = None
+            value = values[converter]
+            if value is None:
+                continue
+            args.append(sql.and_(c != None, comparator(c, value)))
 
         def create_query_decorator(joins, args):
             """Bind the join and args to a query decorator function"""
@@ -140,5 +248,52 @@ def create_entity_search_query_decorator(admin, text):
 
             return query_decorator
 
-        return create_query_decorator(joins, args)
+        return create_query_decorator(self.joins, args)
+
+_search_plans_ = dict()
+_search_plans_lock_ = threading.Lock()
 
+def get_search_plan(admin):
+    """:return: the SearchPlan of an admin, the plan is created again when
+    the list_search or search_all_fields attributes of the admin changed"""
+    _search_plans_lock_.acquire()
+    try:
+        plan = _search_plans_.get(admin)
+        if plan is None or not plan.is_valid(admin):
+            plan = SearchPlan(admin)
+            _search_plans_[admin] = plan
+        return plan
+    finally:
+        _search_plans_lock_.release()
+
+def create_entity_search_query_decorator(admin, text, indexed_columns=(),
+                                         index_clause=None):
+    """create a query decorator to search through a collection of entities
+    @param admin: the admin interface of the entity
+    @param text: the text to search for
+    @param indexed_columns: the (table name, column name) tuples of the text
+    columns that are searched through a full text index instead of through
+    a like clause
+    @param index_clause: the clause to search through the full text index
+    @return: a function that can be applied to a query to make the query filter
+    only the objects related to the requested text or None if no such decorator
+    could be build
+    """
+    return get_search_plan(admin).create_query_decorator(text, 
+                                                         indexed_columns,
+                                                         index_clause)
+
+def get_search_strings(admin, obj):
+    """The texts of an object that are searched by the query decorator of
+    create_entity_search_query_decorator, to be able to search through
+    objects that have allready been loaded without querying the database.
+    
+    Only the texts of the searched text columns are returned, matches on 
+    numbers, dates or codes are not taken into account, see the
+    matches_text_only method of the SearchPlan.
+    
+    @param admin: the admin interface of the entity
+    @param obj: the object to search
+    @return: a list of lower case unicode strings
+    """
+    return get_search_plan(admin).get_search_strings(obj)
@@ -0,0 +1,420 @@
+#  ============================================================================
+#
+#  Copyright (C) 2007-2010 Conceptive Engineering bvba. All rights reserved.
+#  www.conceptive.be / project-camelot@conceptive.be
+#
+#  This file is part of the Camelot Library.
+#
+#  This file may be used under the terms of the GNU General Public
+#  License version 2.0 as published by the Free Software Foundation
+#  and appearing in the file license.txt included in the packaging of
+#  this file.  Please review this information to ensure GNU
+#  General Public Licensing requirements will be met.
+#
+#  If you are unsure which license is appropriate for your use, please
+#  visit www.python-camelot.com or contact project-camelot@conceptive.be
+#
+#  This file is provided AS IS with NO WARRANTY OF ANY KIND, INCLUDING THE
+#  WARRANTY OF DESIGN, MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  For use of this library in commercial applications, please contact
+#  project-camelot@conceptive.be
+#
+#  ============================================================================
+
+"""Backends that search through the objects of an entity when the user
+enters a text in the search box of a table view or in a many2one editor.
+
+By default, the text is searched with like clauses on all searched columns,
+which cannot use an index.  When the full_text_search attribute of the
+EntityAdmin is set, the text columns of the entity are searched through a
+full text index, using a backend that depends on the database :
+
+ * SQLite : an FTS5 virtual table, kept up to date by triggers
+ * PostgreSQL : an index on the tsvector of the text columns
+ * other databases, or SQLite without FTS5 : an inverted index in memory,
+   kept up to date when objects are flushed or deleted through the admin
+
+A full text index matches the words in the text with the beginning of the
+words in the columns, instead of matching any part of the columns.  Only the
+text columns of the table of the entity itself are indexed, other columns are
+still searched with the default clauses.
+"""
+
+import logging
+import re
+import threading
+import time
+
+import sqlalchemy.types
+from sqlalchemy import sql
+
+import camelot.types
+from camelot.view.search import create_entity_search_query_decorator
+
+logger = logging.getLogger('camelot.view.search_backend')
+
+_word_expression_ = re.compile(r'\w+', re.UNICODE)
+
+def split_words(text):
+    """:return: the list of lower case words in a text"""
+    return _word_expression_.findall(unicode(text).lower())
+
+def is_text(column_type):
+    """:return: True if the column type contains text that is searched
+    with a like clause by the default search"""
+    if isinstance(column_type, (camelot.types.Code, camelot.types.Color, 
+                                camelot.types.File, camelot.types.Image,
+                                camelot.types.VirtualAddress)):
+        return False
+    return isinstance(column_type, sqlalchemy.types.Unicode) or \
+           isinstance(getattr(column_type, 'impl', None), sqlalchemy.types.Unicode)
+
+class SearchBackend(object):
+    """Search with like clauses on all searched columns, this is the backend
+    used when no full text index is used.  Subclasses search the text
+    columns through a full text index.
+    """
+
+    def __init__(self, admin):
+        self.admin = admin
+        self.table = admin.entity.table
+
+    def setup(self):
+        """Prepare the backend to be used, this method is called in the
+        model thread, before the backend is used.
+        
+        :return: False if the backend cannot be used with this database
+        """
+        return True
+
+    def get_primary_key_column(self):
+        """:return: the integer primary key column of the table, or None
+        if the table has no such primary key"""
+        columns = list(self.table.primary_key.columns)
+        if len(columns) == 1 and isinstance(columns[0].type, sqlalchemy.types.Integer):
+            return columns[0]
+
+    def get_indexed_columns(self):
+        """:return: the list of text columns of the table that are searched"""
+        columns = []
+        if self.admin.search_all_fields:
+            columns.extend(self.table.columns)
+        else:
+            for field_name in self.admin.list_search:
+                if '.' not in field_name and field_name in self.table.columns:
+                    columns.append(self.table.columns[field_name])
+        return [c for c in columns if is_text(c.type)]
+
+    def get_attribute_name(self, column):
+        """:return: the name of the attribute mapped to a column"""
+        from sqlalchemy import orm
+        for property in self.admin.mapper.iterate_properties:
+            if isinstance(property, orm.properties.ColumnProperty) and \
+               column is property.columns[0]:
+                return property.key
+
+    def create_index_clause(self, words):
+        """:param words: a list of lower case words
+        :return: a clause to select the rows that contain words starting with
+        each of the words, through the full text index, or None if there is
+        no full text index"""
+        return None
+
+    def create_query_decorator(self, text):
+        """:return: a function that can be applied to a query to make the
+        query filter only the objects related to text, or None if no such
+        decorator could be build"""
+        words = split_words(text)
+        index_clause = None
+        if len(words):
+            index_clause = self.create_index_clause(words)
+        if index_clause is None:
+            return create_entity_search_query_decorator(self.admin, text)
+        indexed_columns = set((c.table.name, c.name) for c in self.get_indexed_columns())
+        return create_entity_search_query_decorator(self.admin, 
+                                                    text, 
+                                                    indexed_columns,
+                                                    index_clause)
+
+    def update(self, obj):
+        """Update the index after obj was flushed"""
+        pass
+
+    def remove(self, obj):
+        """Update the index after obj was deleted"""
+        pass
+
+class SQLiteSearchBackend(SearchBackend):
+    """Search through an FTS5 virtual table, with the table of the entity as
+    its external content.  The virtual table and the triggers to keep it
+    up to date are created when the backend is used for the first time.
+    
+    When the searched columns change, the virtual table and its triggers
+    should be dropped, so they are created again.
+    """
+
+    def __init__(self, admin):
+        super(SQLiteSearchBackend, self).__init__(admin)
+        self.index_name = '%s_fts'%self.table.name
+
+    def setup(self):
+        table_name = self.table.name
+        index_name = self.index_name
+        primary_key = self.get_primary_key_column().name
+        columns = [c.name for c in self.get_indexed_columns()]
+        column_list = ', '.join(columns)
+        new_values = ', '.join('new.%s'%c for c in columns)
+        old_values = ', '.join('old.%s'%c for c in columns)
+        connection = self.table.bind.connect()
+        try:
+            exists = connection.execute(sql.text("select name from sqlite_master where name=:name"),
+                                        name=index_name).fetchone()
+            if exists:
+                return True
+            transaction = connection.begin()
+            try:
+                connection.execute("CREATE VIRTUAL TABLE %s USING fts5(%s, content='%s', content_rowid='%s')"%(index_name, column_list, table_name, primary_key))
+                connection.execute("CREATE TRIGGER %s_insert AFTER INSERT ON %s BEGIN "
+                                   "INSERT INTO %s(rowid, %s) VALUES (new.%s, %s); END"%(index_name, table_name, index_name, column_list, primary_key, new_values))
+                connection.execute("CREATE TRIGGER %s_delete AFTER DELETE ON %s BEGIN "
+                                   "INSERT INTO %s(%s, rowid, %s) VALUES ('delete', old.%s, %s); END"%(index_name, table_name, index_name, index_name, column_list, primary_key, old_values))
+                connection.execute("CREATE TRIGGER %s_update AFTER UPDATE ON %s BEGIN "
+                                   "INSERT INTO %s(%s, rowid, %s) VALUES ('delete', old.%s, %s); "
+                                   "INSERT INTO %s(rowid, %s) VALUES (new.%s, %s); END"%(index_name, table_name, index_name, index_name, column_list, primary_key, old_values, index_name, column_list, primary_key, new_values))
+                connection.execute("INSERT INTO %s(%s) VALUES ('rebuild')"%(index_name, index_name))
+                transaction.commit()
+            except Exception, e:
+                transaction.rollback()
+                logger.warn('could not create full text index %s'%index_name, exc_info=e)
+                return False
+            logger.info('created full text index %s'%index_name)
+            return True
+        finally:
+            connection.close()
+
+    def create_index_clause(self, words):
+        # quote each word, and search for it as a prefix
+        match = u' '.join(u'"%s"*'%word.replace('"', '""') for word in words)
+        rowids = sql.select([sql.column('rowid')], 
+                            sql.literal_column(self.index_name).op('MATCH')(match),
+                            from_obj=[sql.table(self.index_name)])
+        return self.get_primary_key_column().in_(rowids)
+
+class PostgreSQLSearchBackend(SearchBackend):
+    """Search through the tsvector of the text columns, using an expression
+    index on this tsvector, which is created when the backend is used for
+    the first time.
+
+    .. attribute:: configuration
+    
+    the text search configuration used to build the tsvector, defaults to
+    'simple', which does no stemming, since names and codes are searched
+    more often than documents.
+    """
+
+    configuration = 'simple'
+
+    def __init__(self, admin):
+        super(PostgreSQLSearchBackend, self).__init__(admin)
+        self.index_name = '%s_fts'%self.table.name
+
+    def get_document(self, column_names):
+        """:return: the sql of the tsvector of the text columns, the same
+        sql should be used in the index and in the query to use the index"""
+        return "to_tsvector('%s'::regconfig, %s)"%(self.configuration,
+                                                   " || ' ' || ".join("coalesce(%s, '')"%c for c in column_names))
+
+    def setup(self):
+        columns = [c.name for c in self.get_indexed_columns()]
+        connection = self.table.bind.connect()
+        try:
+            exists = connection.execute(sql.text("select indexname from pg_indexes where indexname=:name"),
+                                        name=self.index_name).fetchone()
+            if exists:
+                return True
+            transaction = connection.begin()
+            try:
+                connection.execute('CREATE INDEX %s ON %s USING gin(%s)'%(self.index_name, 
+                                                                          self.table.name, 
+                                                                          self.get_document(columns)))
+                transaction.commit()
+            except Exception, e:
+                transaction.rollback()
+                logger.warn('could not create full text index %s'%self.index_name, exc_info=e)
+                return False
+            logger.info('created full text index %s'%self.index_name)
+            return True
+        finally:
+            connection.close()
+
+    def create_index_clause(self, words):
+        columns = ['%s.%s'%(self.table.name, c.name) for c in self.get_indexed_columns()]
+        # search for each word as a prefix
+        query = u' & '.join(u'%s:*'%word for word in words)
+        document = sql.literal_column(self.get_document(columns))
+        return document.op('@@')(sql.func.to_tsquery(sql.literal_column("'%s'::regconfig"%self.configuration), query))
+
+class InvertedIndexSearchBackend(SearchBackend):
+    """Search through an inverted index in memory, that maps each word in the
+    text columns to the primary keys of the rows that contain the word.  The
+    index is build when it is used for the first time, and is updated when
+    objects are flushed or deleted through the admin.
+    
+    .. attribute:: max_age
+    
+    the number of seconds after which the index is build again, to take into
+    account changes to the database made by other applications
+    
+    .. attribute:: max_keys
+    
+    the maximum number of primary keys in the IN clause that selects the
+    matching rows, when more rows match, the like clauses are used instead,
+    since SQLite allows at most 999 parameters in a query and Oracle at most
+    1000 items in an IN clause
+    """
+
+    max_age = 600
+    max_keys = 500
+
+    def __init__(self, admin):
+        super(InvertedIndexSearchBackend, self).__init__(admin)
+        self._lock = threading.Lock()
+        self._built = None
+        # word : set of primary keys
+        self._words = dict()
+        # primary key : words
+        self._rows = dict()
+        self._sorted_words = None
+
+    def _add(self, primary_key, values):
+        words = set()
+        for value in values:
+            if value:
+                words.update(split_words(value))
+        self._rows[primary_key] = words
+        for word in words:
+            primary_keys = self._words.get(word)
+            if primary_keys == None:
+                primary_keys = self._words[word] = set()
+                self._sorted_words = None
+            primary_keys.add(primary_key)
+
+    def _remove(self, primary_key):
+        for word in self._rows.pop(primary_key, ()):
+            primary_keys = self._words[word]
+            primary_keys.discard(primary_key)
+            if not primary_keys:
+                del self._words[word]
+                self._sorted_words = None
+
+    def build(self, rows, timestamp=None):
+        """Build the index
+        :param rows: an iterator over tuples with the primary key as the first
+        element, and the texts as the other elements
+        """
+        if timestamp == None:
+            timestamp = time.time()
+        self._lock.acquire()
+        try:
+            self._words = dict()
+            self._rows = dict()
+            self._sorted_words = None
+            for row in rows:
+                self._add(row[0], row[1:])
+            self._built = timestamp
+        finally:
+            self._lock.release()
+
+    def _build_from_table(self):
+        if self._built == None or time.time() - self._built > self.max_age:
+            columns = [self.get_primary_key_column()] + self.get_indexed_columns()
+            logger.debug('build inverted index of %s'%self.table.name)
+            self.build(self.table.bind.execute(sql.select(columns)))
+
+    def search(self, words):
+        """:return: the set of primary keys of the rows that contain words
+        starting with each of the words"""
+        import bisect
+        self._lock.acquire()
+        try:
+            if self._sorted_words == None:
+                self._sorted_words = sorted(self._words.keys())
+            result = None
+            for word in words:
+                primary_keys = set()
+                i = bisect.bisect_left(self._sorted_words, word)
+                while i < len(self._sorted_words) and self._sorted_words[i].startswith(word):
+                    primary_keys.update(self._words[self._sorted_words[i]])
+                    i += 1
+                if result == None:
+                    result = primary_keys
+                else:
+                    result.intersection_update(primary_keys)
+                if not result:
+                    break
+            return result or set()
+        finally:
+            self._lock.release()
+
+    def create_index_clause(self, words):
+        self._build_from_table()
+        primary_key_column = self.get_primary_key_column()
+        primary_keys = self.search(words)
+        if not primary_keys:
+            return (primary_key_column == None)
+        if len(primary_keys) > self.max_keys:
+            return None
+        return primary_key_column.in_(list(primary_keys))
+
+    def _get_primary_key(self, obj):
+        return getattr(obj, self.get_attribute_name(self.get_primary_key_column()))
+
+    def update(self, obj):
+        if self._built == None:
+            return
+        primary_key = self._get_primary_key(obj)
+        values = []
+        for column in self.get_indexed_columns():
+            attribute_name = self.get_attribute_name(column)
+            if attribute_name:
+                values.append(getattr(obj, attribute_name))
+        self._lock.acquire()
+        try:
+            self._remove(primary_key)
+            self._add(primary_key, values)
+        finally:
+            self._lock.release()
+
+    def remove(self, obj):
+        if self._built == None:
+            return
+        primary_key = self._get_primary_key(obj)
+        self._lock.acquire()
+        try:
+            self._remove(primary_key)
+        finally:
+            self._lock.release()
+
+_backends_ = {'sqlite':[SQLiteSearchBackend, InvertedIndexSearchBackend],
+              'postgresql':[PostgreSQLSearchBackend, InvertedIndexSearchBackend],}
+
+def create_search_backend(admin):
+    """Create the search backend for an admin, depending on its 
+    full_text_search attribute and on the database used.  This function
+    should be called within the model thread.
+    
+    :return: a SearchBackend
+    """
+    backend = SearchBackend(admin)
+    if not admin.full_text_search:
+        return backend
+    if backend.get_primary_key_column() is None or not len(backend.get_indexed_columns()):
+        logger.warn('no full text search possible for %s'%admin.get_verbose_name())
+        return backend
+    dialect = admin.entity.table.bind.dialect.name
+    for backend_class in _backends_.get(dialect, [InvertedIndexSearchBackend]):
+        full_text_backend = backend_class(admin)
+        if full_text_backend.setup():
+            return full_text_backend
+    return backend
@@ -225,6 +225,10 @@ class RowDataAdminDecorator(object):
             else:
                 yield {'background_color':None}
 
+    def get_dynamic_field_attributes_of_objects(self, objects, field_names):
+        field_names = list(field_names)
+        return [list(self.get_dynamic_field_attributes(obj, field_names)) for obj in objects]
+
     def new_field_attributes(self, i, original_field_attributes, original_field):
         from camelot.view.controls import delegates
 